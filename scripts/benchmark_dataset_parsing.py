@@ -0,0 +1,161 @@
+import argparse
+import pathlib
+import random
+import re
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.datatools import (
+    load_mcts_dataset,
+    load_nmcts_dataset,
+    parse_mcts_datapoint,
+    parse_nmcts_datapoint,
+)
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_lines", type=int, default=20_000)
+    parser.add_argument("--num_files", type=int, default=8)
+    parser.add_argument("--num_workers", type=int, default=4)
+    parser.add_argument("--num_repeats", type=int, default=3)
+    parser.add_argument("--random_seed", type=int, default=0)
+    args = parser.parse_args()
+    return args
+
+
+def parse_mcts_datapoint_regex(line: str) -> dict:
+    """Regex-based parser, the previous implementation of parse_mcts_datapoint."""
+    match = re.match("evaluatedState{(.*?)}", line)
+    if match is None:
+        raise RuntimeError("cannot parse datapoint")
+    evaluated_state_values = match.group(1).split(" ")
+    state = bytearray(map(int, evaluated_state_values[0]))
+    num_visits = int(evaluated_state_values[1])
+    num_wins = int(evaluated_state_values[2])
+    num_losses = int(evaluated_state_values[4])
+    value = (num_wins - num_losses) / num_visits
+    match = re.match(".*evaluatedActions{(.*?)}", line)
+    if match is None:
+        raise RuntimeError("cannot parse datapoint")
+    evaluated_actions_values = match.group(1).split(",")
+    num_actions = len(evaluated_actions_values)
+    actions_index = np.zeros(num_actions, dtype=np.int32)
+    actions_probability = np.zeros(num_actions, dtype=np.float32)
+    actions_value = np.zeros(num_actions, dtype=np.float32)
+    for i, evaluated_action_values in enumerate(evaluated_actions_values):
+        evaluated_action_values = list(map(int, evaluated_action_values.split(" ")))
+        actions_index[i] = evaluated_action_values[1]
+        actions_probability[i] = evaluated_action_values[2]
+        actions_value[i] = (evaluated_action_values[3] - evaluated_action_values[5]) / evaluated_action_values[2]
+    actions_probability = actions_probability / actions_probability.sum()
+    return {"state": state, "value": value, "actions": (actions_index, actions_probability, actions_value)}
+
+
+def parse_nmcts_datapoint_regex(line: str) -> dict:
+    """Regex-based parser, the previous implementation of parse_nmcts_datapoint."""
+    match = re.match("evaluatedState{(.*?)}", line)
+    if match is None:
+        raise RuntimeError("cannot parse datapoint")
+    evaluated_state_values = match.group(1).split(" ")
+    state = bytearray(map(int, evaluated_state_values[0]))
+    value = float(evaluated_state_values[2])
+    match = re.match(".*evaluatedActions{(.*?)}", line)
+    if match is None:
+        raise RuntimeError("cannot parse datapoint")
+    evaluated_actions_values = match.group(1).split(",")
+    num_actions = len(evaluated_actions_values)
+    actions_index = np.zeros(num_actions, dtype=np.int32)
+    actions_probability = np.zeros(num_actions, dtype=np.float32)
+    actions_value = np.zeros(num_actions, dtype=np.float32)
+    for i, evaluated_action_values in enumerate(evaluated_actions_values):
+        evaluated_action_values = evaluated_action_values.split(" ")
+        actions_index[i] = int(evaluated_action_values[1])
+        actions_probability[i] = int(evaluated_action_values[2])
+        actions_value[i] = float(evaluated_action_values[3])
+    actions_probability = actions_probability / actions_probability.sum()
+    return {"state": state, "value": value, "actions": (actions_index, actions_probability, actions_value)}
+
+
+def generate_lines(num_lines: int, dataset_type: str) -> List[str]:
+    """Synthetic datapoints: positions of random games with random evaluations."""
+    lines = []
+    uttt = UltimateTicTacToe()
+    while len(lines) < num_lines:
+        if uttt.is_terminated():
+            uttt = UltimateTicTacToe()
+        state = "".join(map(str, uttt.state))
+        evaluated_actions = []
+        for action in uttt.get_legal_actions():
+            num_visits = random.randint(1, 100_000)
+            if dataset_type == "mcts":
+                num_wins = random.randint(0, num_visits)
+                num_draws = random.randint(0, num_visits - num_wins)
+                num_losses = num_visits - num_wins - num_draws
+                evaluated_actions.append(
+                    f"{action.symbol} {action.index} {num_visits} {num_wins} {num_draws} {num_losses}"
+                )
+            elif dataset_type == "nmcts":
+                evaluated_actions.append(f"{action.symbol} {action.index} {num_visits} {round(random.uniform(-1, 1), 6)}")
+        if dataset_type == "mcts":
+            evaluated_state = f"{state} 1000000 400000 200000 400000"
+        elif dataset_type == "nmcts":
+            evaluated_state = f"{state} 10000 {round(random.uniform(-1, 1), 6)}"
+        lines.append(f"evaluatedState{{{evaluated_state}}} evaluatedActions{{{','.join(evaluated_actions)}}}")
+        uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=False)
+    return lines
+
+
+def run_parser(parse_datapoint: Callable[[str], dict], lines: List[str]) -> float:
+    start = time.perf_counter()
+    for line in lines:
+        parse_datapoint(line)
+    elapsed = time.perf_counter() - start
+    return len(lines) / elapsed
+
+
+def run_loader(load_dataset: Callable, dirpath: pathlib.Path, num_lines: int, num_workers: int) -> float:
+    start = time.perf_counter()
+    load_dataset(dirpath, num_workers=num_workers)
+    elapsed = time.perf_counter() - start
+    return num_lines / elapsed
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    random.seed(args.random_seed)
+    for dataset_type, parsers, load_dataset in [
+        ("mcts", [parse_mcts_datapoint_regex, parse_mcts_datapoint], load_mcts_dataset),
+        ("nmcts", [parse_nmcts_datapoint_regex, parse_nmcts_datapoint], load_nmcts_dataset),
+    ]:
+        lines = generate_lines(num_lines=args.num_lines, dataset_type=dataset_type)
+        for line in lines:
+            expected, datapoint = [parse_datapoint(line) for parse_datapoint in parsers]
+            assert datapoint["state"] == expected["state"] and datapoint["value"] == expected["value"]
+            for array, expected_array in zip(datapoint["actions"], expected["actions"]):
+                assert (array == expected_array).all()
+
+        for parse_datapoint in parsers:
+            lines_per_sec = max(run_parser(parse_datapoint, lines) for _ in range(args.num_repeats))
+            print(f"{parse_datapoint.__name__}: {lines_per_sec:.1f} lines/sec")
+
+        with tempfile.TemporaryDirectory() as dirpath:
+            dirpath = pathlib.Path(dirpath)
+            for i in range(args.num_files):
+                with open(dirpath / f"depth{i:02}.txt", "w") as f:
+                    f.write("".join(f"{line}\n" for line in lines[i::args.num_files]))
+            for num_workers in sorted({1, args.num_workers}):
+                lines_per_sec = max(
+                    run_loader(load_dataset, dirpath, len(lines), num_workers) for _ in range(args.num_repeats)
+                )
+                print(f"{load_dataset.__name__}(num_workers={num_workers}): {lines_per_sec:.1f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
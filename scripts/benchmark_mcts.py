@@ -0,0 +1,70 @@
+import argparse
+import random
+import time
+
+import utttpy.selfplay.monte_carlo_tree_search as monte_carlo_tree_search
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.monte_carlo_tree_search import MonteCarloTreeSearch
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_simulations", type=int, default=10_000)
+    parser.add_argument("--exploration_strength", type=float, default=1.0)
+    parser.add_argument("--num_repeats", type=int, default=3)
+    parser.add_argument("--random_seed", type=int, default=0)
+    args = parser.parse_args()
+    return args
+
+
+def run_mcts(
+    num_simulations: int,
+    exploration_strength: float,
+    tree_storage: str,
+    random_seed: int,
+) -> float:
+    random.seed(random_seed)
+    mcts = MonteCarloTreeSearch(
+        uttt=UltimateTicTacToe(),
+        num_simulations=num_simulations,
+        exploration_strength=exploration_strength,
+        tree_storage=tree_storage,
+    )
+    start = time.perf_counter()
+    mcts.run()
+    elapsed = time.perf_counter() - start
+    return num_simulations / elapsed
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    default_min_num_children = monte_carlo_tree_search.VECTORIZED_UCT_MIN_NUM_CHILDREN
+    # nodes is the previous default, arrays with vectorized UCT on wide nodes the current one:
+    configs = [
+        ("nodes", default_min_num_children, "scalar UCT"),
+        ("arrays", 82, "scalar UCT"),
+        ("arrays", default_min_num_children, "vectorized UCT"),
+    ]
+    # configs take turns in each repeat, so that slow periods of the machine affect all of them:
+    simulations_per_sec = {config: 0.0 for config in configs}
+    for _ in range(args.num_repeats):
+        for config in configs:
+            tree_storage, min_num_children, uct = config
+            monte_carlo_tree_search.VECTORIZED_UCT_MIN_NUM_CHILDREN = min_num_children
+            simulations_per_sec[config] = max(
+                simulations_per_sec[config],
+                run_mcts(
+                    num_simulations=args.num_simulations,
+                    exploration_strength=args.exploration_strength,
+                    tree_storage=tree_storage,
+                    random_seed=args.random_seed,
+                ),
+            )
+    monte_carlo_tree_search.VECTORIZED_UCT_MIN_NUM_CHILDREN = default_min_num_children
+    for (tree_storage, min_num_children, uct), value in simulations_per_sec.items():
+        print(f"tree_storage={tree_storage} ({uct}): {value:.1f} simulations/sec")
+
+if __name__ == "__main__":
+    main()
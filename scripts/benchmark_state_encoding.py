@@ -0,0 +1,92 @@
+import argparse
+import random
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from utttpy.game.constants import X_STATE_VALUE, O_STATE_VALUE
+from utttpy.game.helpers import row_index, col_index, get_state_ndarray_4x9x9, get_states_ndarray_Nx4x9x9
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_games", type=int, default=100)
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--num_repeats", type=int, default=5)
+    parser.add_argument("--random_seed", type=int, default=0)
+    args = parser.parse_args()
+    return args
+
+
+def get_state_ndarray_4x9x9_loop(uttt: UltimateTicTacToe) -> np.ndarray:
+    """Cell by cell encoding, the previous implementation of get_state_ndarray_4x9x9."""
+    array = np.zeros(shape=(4, 9, 9), dtype=np.int8)
+    if uttt.is_next_symbol_X():
+        x_i, o_i = 0, 1
+    elif uttt.is_next_symbol_O():
+        x_i, o_i = 1, 0
+    for s_i, s_v in enumerate(uttt.state[0:81]):
+        if s_v == X_STATE_VALUE:
+            array[x_i, row_index(s_i), col_index(s_i)] = 1
+        elif s_v == O_STATE_VALUE:
+            array[o_i, row_index(s_i), col_index(s_i)] = 1
+    if uttt.is_next_symbol_X():
+        array[2].fill(1)
+    elif uttt.is_next_symbol_O():
+        array[2].fill(-1)
+    for l_i in uttt.get_legal_indexes():
+        array[3, row_index(l_i), col_index(l_i)] = 1
+    return array
+
+
+def generate_uttts(num_games: int) -> List[UltimateTicTacToe]:
+    uttts = []
+    for _ in range(num_games):
+        uttt = UltimateTicTacToe()
+        while not uttt.is_terminated():
+            uttts.append(uttt.clone())
+            uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=False)
+    return uttts
+
+
+def run_encoder(encoder: Callable, uttts: List[UltimateTicTacToe]) -> float:
+    start = time.perf_counter()
+    for uttt in uttts:
+        encoder(uttt)
+    elapsed = time.perf_counter() - start
+    return len(uttts) / elapsed
+
+
+def run_batch_encoder(states: np.ndarray, batch_size: int) -> float:
+    out = np.empty(shape=(batch_size, 4, 9, 9), dtype=np.int8)
+    start = time.perf_counter()
+    for i in range(0, len(states) - batch_size + 1, batch_size):
+        get_states_ndarray_Nx4x9x9(states=states[i:i + batch_size], out=out)
+    elapsed = time.perf_counter() - start
+    return (len(states) // batch_size * batch_size) / elapsed
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    random.seed(args.random_seed)
+    uttts = generate_uttts(num_games=args.num_games)
+    for uttt in uttts:
+        assert (get_state_ndarray_4x9x9(uttt) == get_state_ndarray_4x9x9_loop(uttt)).all()
+
+    for encoder in [get_state_ndarray_4x9x9_loop, get_state_ndarray_4x9x9]:
+        encodes_per_sec = max(run_encoder(encoder=encoder, uttts=uttts) for _ in range(args.num_repeats))
+        print(f"{encoder.__name__}: {encodes_per_sec:.1f} encodes/sec")
+
+    states = np.array([list(uttt.state) for uttt in uttts], dtype=np.uint8)
+    encodes_per_sec = max(
+        run_batch_encoder(states=states, batch_size=args.batch_size) for _ in range(args.num_repeats)
+    )
+    print(f"get_states_ndarray_Nx4x9x9 (batch_size={args.batch_size}): {encodes_per_sec:.1f} encodes/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import pathlib
+import random
+import tempfile
+import time
+from typing import Dict
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.datatools import (
+    convert_dataset_to_binary,
+    encode_binary_dataset,
+    load_binary_dataset,
+    load_mcts_dataset,
+    parse_mcts_datapoint,
+)
+from utttpy.selfplay.training import ndarray_batch_generator
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_datapoints", type=int, default=50_000)
+    parser.add_argument("--batch_size", type=int, default=2048)
+    parser.add_argument("--num_batches", type=int, default=20)
+    parser.add_argument("--random_seed", type=int, default=0)
+    args = parser.parse_args()
+    return args
+
+
+def write_dataset(dirpath: pathlib.Path, num_datapoints: int) -> None:
+    """Synthetic mcts dataset: positions of random games with random evaluations, one depth file per depth."""
+    lines = {}
+    uttt = UltimateTicTacToe()
+    depth = 0
+    for _ in range(num_datapoints):
+        if uttt.is_terminated():
+            uttt = UltimateTicTacToe()
+            depth = 0
+        evaluated_actions = []
+        for action in uttt.get_legal_actions():
+            num_visits = random.randint(1, 1000)
+            num_wins = random.randint(0, num_visits)
+            num_losses = num_visits - num_wins
+            evaluated_actions.append(f"{action.symbol} {action.index} {num_visits} {num_wins} 0 {num_losses}")
+        state = "".join(map(str, uttt.state))
+        lines.setdefault(depth, []).append(
+            f"evaluatedState{{{state} 1000 400 200 400}} evaluatedActions{{{','.join(evaluated_actions)}}}"
+        )
+        uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=False)
+        depth += 1
+    for depth, depth_lines in lines.items():
+        with open(dirpath / f"depth{depth:02}.txt", "w") as f:
+            f.write("".join(f"{line}\n" for line in depth_lines))
+
+
+def run_batches(dataset: Dict[str, object], batch_size: int, num_batches: int) -> float:
+    ndarray_batch_iterator = ndarray_batch_generator(dataset=dataset, batch_size=batch_size)
+    next(ndarray_batch_iterator)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        next(ndarray_batch_iterator)
+    elapsed = time.perf_counter() - start
+    return num_batches * batch_size / elapsed
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    random.seed(args.random_seed)
+    with tempfile.TemporaryDirectory() as dirpath:
+        dirpath = pathlib.Path(dirpath)
+        write_dataset(dirpath=dirpath, num_datapoints=args.num_datapoints)
+        convert_dataset_to_binary(
+            input_dirpath=dirpath,
+            output_dirpath=dirpath / "binary",
+            parse_datapoint=parse_mcts_datapoint,
+        )
+        encode_binary_dataset(dirpath / "binary")
+        datasets = {
+            "text": load_mcts_dataset(dirpath),
+            "binary": load_binary_dataset(dirpath / "binary"),
+            "encoded": load_binary_dataset(dirpath / "binary", encoded=True),
+        }
+        for dataset_format, dataset in datasets.items():
+            datapoints_per_sec = run_batches(
+                dataset=dataset,
+                batch_size=args.batch_size,
+                num_batches=args.num_batches,
+            )
+            print(f"ndarray_batch_generator(dataset_format={dataset_format}): {datapoints_per_sec:.1f} datapoints/sec")
+
+
+if __name__ == "__main__":
+    main()
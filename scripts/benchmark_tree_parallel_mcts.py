@@ -0,0 +1,86 @@
+import argparse
+import random
+import time
+from typing import List
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.evaluation_uttt_states import EVALUATION_UTTT_STATES
+from utttpy.selfplay.monte_carlo_tree_search import MonteCarloTreeSearch
+from utttpy.selfplay.tree_parallel_monte_carlo_tree_search import TreeParallelMonteCarloTreeSearch
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_simulations", type=int, default=20_000)
+    parser.add_argument("--exploration_strength", type=float, default=1.0)
+    parser.add_argument(
+        "--num_workers_list",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16],
+        help="workers share one tree of at most --capacity nodes, leaves are not expanded once it is full",
+    )
+    parser.add_argument("--virtual_loss", type=int, default=1)
+    parser.add_argument("--capacity", type=int, default=1 << 20)
+    parser.add_argument("--num_positions", type=int, default=8)
+    parser.add_argument("--random_seed", type=int, default=0)
+    args = parser.parse_args()
+    return args
+
+
+def best_index(mcts: MonteCarloTreeSearch) -> int:
+    evaluated_actions = mcts.get_evaluated_actions()
+    return max(evaluated_actions, key=lambda evaluated_action: evaluated_action["num_visits"])["index"]
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    uttts = [
+        UltimateTicTacToe(state=bytearray(map(int, uttt_state)))
+        for uttt_state in EVALUATION_UTTT_STATES[: args.num_positions]
+    ]
+
+    reference_best_indexes = []
+    for uttt in uttts:
+        random.seed(args.random_seed)
+        mcts = MonteCarloTreeSearch(
+            uttt=uttt.clone(),
+            num_simulations=args.num_simulations,
+            exploration_strength=args.exploration_strength,
+            tree_storage="arrays",
+        )
+        mcts.run()
+        reference_best_indexes.append(best_index(mcts))
+
+    for num_workers in args.num_workers_list:
+        best_indexes: List[int] = []
+        elapsed = 0.0
+        for uttt in uttts:
+            random.seed(args.random_seed)
+            mcts = TreeParallelMonteCarloTreeSearch(
+                uttt=uttt.clone(),
+                num_simulations=args.num_simulations,
+                exploration_strength=args.exploration_strength,
+                num_workers=num_workers,
+                virtual_loss=args.virtual_loss,
+                capacity=args.capacity,
+            )
+            start = time.perf_counter()
+            mcts.run()
+            elapsed += time.perf_counter() - start
+            best_indexes.append(best_index(mcts))
+        simulations_per_sec = len(uttts) * args.num_simulations / elapsed
+        num_agreements = sum(
+            best_index == reference_best_index
+            for best_index, reference_best_index in zip(best_indexes, reference_best_indexes)
+        )
+        print(
+            f"num_workers={num_workers}: {simulations_per_sec:.1f} simulations/sec,"
+            f" best move agreement {num_agreements}/{len(uttts)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import random
+import time
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.game.ultimate_tic_tac_toe_bitboard import UltimateTicTacToeBitboard
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_games", type=int, default=10_000)
+    parser.add_argument("--num_repeats", type=int, default=3)
+    parser.add_argument("--random_seed", type=int, default=0)
+    args = parser.parse_args()
+    return args
+
+
+def play_random_games(uttt_cls: type, num_games: int, random_seed: int, execute_kwargs: dict) -> float:
+    random.seed(random_seed)
+    start = time.perf_counter()
+    for _ in range(num_games):
+        uttt = uttt_cls()
+        while not uttt.is_terminated():
+            actions = uttt.get_legal_actions()
+            action = random.choice(actions)
+            uttt.execute(action, verify=False, **execute_kwargs)
+    elapsed = time.perf_counter() - start
+    return num_games / elapsed
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    configs = [
+        (UltimateTicTacToe, {}),
+        (UltimateTicTacToe, {"record_undo": False}),
+        (UltimateTicTacToeBitboard, {}),
+    ]
+    # configs take turns in each repeat, so that slow periods of the machine affect all of them:
+    games_per_sec = [0.0] * len(configs)
+    for _ in range(args.num_repeats):
+        for i, (uttt_cls, execute_kwargs) in enumerate(configs):
+            games_per_sec[i] = max(
+                games_per_sec[i],
+                play_random_games(
+                    uttt_cls=uttt_cls,
+                    num_games=args.num_games,
+                    random_seed=args.random_seed,
+                    execute_kwargs=execute_kwargs,
+                ),
+            )
+    for (uttt_cls, execute_kwargs), value in zip(configs, games_per_sec):
+        kwargs = ", ".join(f"{key}={value}" for key, value in execute_kwargs.items())
+        print(f"{uttt_cls.__name__}({kwargs}): {value:.1f} games/sec")
+
+if __name__ == "__main__":
+    main()
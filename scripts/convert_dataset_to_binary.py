@@ -0,0 +1,53 @@
+import argparse
+import pathlib
+
+from utttpy.paths import (
+    UTTT_DATASET_STAGE1_PATH,
+    UTTT_DATASET_STAGE2_PATH,
+    UTTT_DATASET_STAGE1_BINARY_PATH,
+    UTTT_DATASET_STAGE2_BINARY_PATH,
+)
+from utttpy.selfplay.datatools import (
+    convert_dataset_to_binary,
+    encode_binary_dataset,
+    parse_mcts_datapoint,
+    parse_nmcts_datapoint,
+)
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, choices=["stage1-mcts", "stage2-nmcts"], required=True)
+    parser.add_argument("--input_dirpath", type=pathlib.Path, default=None)
+    parser.add_argument("--output_dirpath", type=pathlib.Path, default=None)
+    parser.add_argument("--encode", action="store_true")
+    args = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    if args.dataset == "stage1-mcts":
+        input_dirpath = args.input_dirpath or UTTT_DATASET_STAGE1_PATH
+        output_dirpath = args.output_dirpath or UTTT_DATASET_STAGE1_BINARY_PATH
+        parse_datapoint = parse_mcts_datapoint
+    elif args.dataset == "stage2-nmcts":
+        input_dirpath = args.input_dirpath or UTTT_DATASET_STAGE2_PATH
+        output_dirpath = args.output_dirpath or UTTT_DATASET_STAGE2_BINARY_PATH
+        parse_datapoint = parse_nmcts_datapoint
+
+    convert_dataset_to_binary(
+        input_dirpath=input_dirpath,
+        output_dirpath=output_dirpath,
+        parse_datapoint=parse_datapoint,
+    )
+
+    if args.encode:
+        # encoded arrays are used by training scripts with --dataset_format encoded:
+        encode_binary_dataset(output_dirpath)
+
+
+if __name__ == "__main__":
+    main()
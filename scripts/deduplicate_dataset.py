@@ -0,0 +1,38 @@
+import argparse
+import pathlib
+
+from utttpy.selfplay.deduplication import deduplicate_dataset
+
+
+def run_argparse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset_type", type=str, choices=["mcts", "nmcts"], required=True)
+    parser.add_argument("--input_dirpath", type=pathlib.Path, required=True)
+    parser.add_argument("--output_dirpath", type=pathlib.Path, required=True)
+    parser.add_argument("--symmetric", action="store_true")
+    args = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    args = run_argparse()
+    print(args)
+
+    report = deduplicate_dataset(
+        input_dirpath=args.input_dirpath,
+        output_dirpath=args.output_dirpath,
+        dataset_type=args.dataset_type,
+        symmetric=args.symmetric,
+    )
+    for key, depth_report in report.items():
+        print(
+            f"{key}:"
+            f" num_datapoints={depth_report['num_datapoints']}"
+            f" num_deduplicated_datapoints={depth_report['num_deduplicated_datapoints']}"
+            f" num_duplicates={depth_report['num_duplicates']}"
+        )
+    print(f"deduplicated dataset saved to {args.output_dirpath} successfully!")
+
+
+if __name__ == "__main__":
+    main()
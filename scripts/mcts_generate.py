@@ -8,6 +8,7 @@ from utttpy.selfplay.monte_carlo_tree_search import (
     serialize_evaluated_state,
     serialize_evaluated_actions,
 )
+from utttpy.selfplay.root_parallel_monte_carlo_tree_search import RootParallelMonteCarloTreeSearch
 
 
 def run_argparse() -> argparse.Namespace:
@@ -17,6 +18,10 @@ def run_argparse() -> argparse.Namespace:
     parser.add_argument("--exploration_strength", type=float, required=True)
     parser.add_argument("--random_seed", type=int, required=True)
     parser.add_argument("--output_path", type=pathlib.Path, required=True)
+    parser.add_argument("--transposition_table_cache_size", type=int, default=None, help="needs --tree_storage=nodes")
+    parser.add_argument("--tree_storage", type=str, default="arrays", choices=["nodes", "arrays"])
+    parser.add_argument("--num_playouts_per_leaf", type=int, default=1)
+    parser.add_argument("--num_workers", type=int, default=1)
     args = parser.parse_args()
     return args
 
@@ -29,11 +34,25 @@ def main() -> None:
 
     uttt = UltimateTicTacToe(state=bytearray(map(int, args.uttt_state)))
 
-    mcts = MonteCarloTreeSearch(
-        uttt=uttt.clone(),
-        num_simulations=args.num_simulations,
-        exploration_strength=args.exploration_strength,
-    )
+    if args.num_workers > 1:
+        mcts = RootParallelMonteCarloTreeSearch(
+            uttt=uttt.clone(),
+            num_simulations=args.num_simulations,
+            exploration_strength=args.exploration_strength,
+            num_workers=args.num_workers,
+            transposition_table_cache_size=args.transposition_table_cache_size,
+            tree_storage=args.tree_storage,
+            num_playouts_per_leaf=args.num_playouts_per_leaf,
+        )
+    else:
+        mcts = MonteCarloTreeSearch(
+            uttt=uttt.clone(),
+            num_simulations=args.num_simulations,
+            exploration_strength=args.exploration_strength,
+            transposition_table_cache_size=args.transposition_table_cache_size,
+            tree_storage=args.tree_storage,
+            num_playouts_per_leaf=args.num_playouts_per_leaf,
+        )
     evaluations_str = ""
     while not uttt.is_terminated():
         mcts.run(progress_bar=True)
@@ -50,6 +69,8 @@ def main() -> None:
         uttt.execute(action=selected_action)
         mcts.synchronize(uttt=uttt)
     print(mcts)
+    if args.num_workers > 1:
+        mcts.close()
 
     with open(args.output_path, "w") as f:
         f.write(evaluations_str)
@@ -8,6 +8,8 @@ import torch.nn as nn
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
 from utttpy.selfplay.policy_value_network import PolicyValueNetwork
 from utttpy.selfplay.neural_monte_carlo_tree_search import (
+    EvaluationCache,
+    SymmetricEvaluationCache,
     NeuralMonteCarloTreeSearch,
     serialize_evaluated_state,
     serialize_evaluated_actions,
@@ -23,6 +25,8 @@ def run_argparse() -> argparse.Namespace:
     parser.add_argument("--random_seed", type=int, required=True)
     parser.add_argument("--output_path", type=pathlib.Path, required=True)
     parser.add_argument("--device", type=torch.device, default="cuda")
+    parser.add_argument("--evaluation_cache_max_memory_mb", type=float, default=None)
+    parser.add_argument("--evaluation_cache_symmetric", action="store_true")
     args = parser.parse_args()
     return args
 
@@ -49,11 +53,18 @@ def main() -> None:
 
     uttt = UltimateTicTacToe(state=bytearray(map(int, args.uttt_state)))
 
+    if args.evaluation_cache_max_memory_mb is None:
+        evaluation_cache = None
+    else:
+        evaluation_cache_class = SymmetricEvaluationCache if args.evaluation_cache_symmetric else EvaluationCache
+        evaluation_cache = evaluation_cache_class(max_memory_bytes=int(args.evaluation_cache_max_memory_mb * 2**20))
+
     nmcts = NeuralMonteCarloTreeSearch(
         uttt=uttt.clone(),
         num_simulations=args.num_simulations,
         exploration_strength=args.exploration_strength,
         policy_value_net=policy_value_net,
+        evaluation_cache=evaluation_cache,
     )
     evaluations_str = ""
     while not uttt.is_terminated():
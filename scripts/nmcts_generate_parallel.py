@@ -4,14 +4,19 @@ import queue
 import random
 from collections import deque
 from multiprocessing.queues import Queue
-from typing import List
+from typing import List, Optional
 
+import numpy as np
 import torch
 import torch.nn as nn
 
+from utttpy.game.constants import STATE_SIZE
+from utttpy.game.helpers import get_states_ndarray_Nx4x9x9
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
 from utttpy.selfplay.policy_value_network import PolicyValueNetwork
 from utttpy.selfplay.neural_monte_carlo_tree_search import (
+    EvaluationCache,
+    SymmetricEvaluationCache,
     NeuralMonteCarloTreeSearchWorker,
     serialize_evaluated_state,
     serialize_evaluated_actions,
@@ -24,6 +29,8 @@ def run_argparse() -> argparse.Namespace:
     parser.add_argument("--task_list_path", type=pathlib.Path, required=True)
     parser.add_argument("--num_workers", type=int, required=True)
     parser.add_argument("--device", type=torch.device, default="cuda")
+    parser.add_argument("--evaluation_cache_max_memory_mb", type=float, default=None)
+    parser.add_argument("--evaluation_cache_symmetric", action="store_true")
     args = parser.parse_args()
     return args
 
@@ -49,7 +56,15 @@ def nmcts_worker(
     input_queue: Queue,
     prediction_queue: Queue,
     idle_queue: Queue,
+    evaluation_cache_max_memory_mb: Optional[float] = None,
+    evaluation_cache_symmetric: bool = False,
 ) -> None:
+    # the cache is kept across tasks of the worker:
+    if evaluation_cache_max_memory_mb is None:
+        evaluation_cache = None
+    else:
+        evaluation_cache_class = SymmetricEvaluationCache if evaluation_cache_symmetric else EvaluationCache
+        evaluation_cache = evaluation_cache_class(max_memory_bytes=int(evaluation_cache_max_memory_mb * 2**20))
     idle_queue.put(worker_id)
     while True:
         task = task_queue.get()
@@ -73,6 +88,7 @@ def nmcts_worker(
             worker_id=worker_id,
             input_queue=input_queue,
             prediction_queue=prediction_queue,
+            evaluation_cache=evaluation_cache,
         )
         evaluations_str = ""
         while not uttt.is_terminated():
@@ -94,13 +110,18 @@ def nmcts_worker(
 
 
 def nmcts_generate_parallel(
-    policy_value_net: nn.Module, tasks: List[str], num_workers: int
+    policy_value_net: nn.Module,
+    tasks: List[str],
+    num_workers: int,
+    evaluation_cache_max_memory_mb: Optional[float] = None,
+    evaluation_cache_symmetric: bool = False,
 ) -> None:
     task_queues = [torch.multiprocessing.Queue() for i in range(num_workers)]
     input_queue = torch.multiprocessing.Queue()
     prediction_queues = [torch.multiprocessing.Queue() for i in range(num_workers)]
     idle_queue = torch.multiprocessing.Queue()
     processes = {}
+    input_buffer = np.empty(shape=(num_workers, 4, 9, 9), dtype=np.int8)
     for worker_id in range(num_workers):
         process = torch.multiprocessing.Process(
             target=nmcts_worker,
@@ -110,6 +131,8 @@ def nmcts_generate_parallel(
                 input_queue,
                 prediction_queues[worker_id],
                 idle_queue,
+                evaluation_cache_max_memory_mb,
+                evaluation_cache_symmetric,
             ),
         )
         process.start()
@@ -134,22 +157,24 @@ def nmcts_generate_parallel(
                 print(f"process[worker_id={worker_id}] deleted successfully!")
 
         batch_size = len(processes)
-        input_tensors = []
+        input_states = []
         input_worker_ids = []
-        while len(input_tensors) < batch_size:
+        while len(input_states) < batch_size:
             try:
                 worker_input = input_queue.get(timeout=0.001)
-                input_worker_id, input_tensor = worker_input
-                input_tensors.append(input_tensor)
+                input_worker_id, input_state = worker_input
+                input_states.append(input_state)
                 input_worker_ids.append(input_worker_id)
             except queue.Empty:
-                batch_size = len(input_tensors)
+                batch_size = len(input_states)
 
         if batch_size == 0:
             continue
 
-        inputs = torch.stack(input_tensors).to(device=policy_value_net.device)
-        del input_tensors
+        states = np.frombuffer(b"".join(input_states), dtype=np.uint8).reshape(batch_size, STATE_SIZE)
+        inputs = get_states_ndarray_Nx4x9x9(states=states, out=input_buffer[:batch_size])
+        inputs = torch.from_numpy(inputs).to(device=policy_value_net.device, dtype=torch.float32)
+        del input_states
         with torch.no_grad():
             policy_logits, action_values, state_value = policy_value_net(inputs)
         del inputs, action_values
@@ -179,6 +204,8 @@ def main() -> None:
         policy_value_net=policy_value_net,
         tasks=tasks,
         num_workers=args.num_workers,
+        evaluation_cache_max_memory_mb=args.evaluation_cache_max_memory_mb,
+        evaluation_cache_symmetric=args.evaluation_cache_symmetric,
     )
 
 
@@ -2,7 +2,7 @@ import argparse
 import pathlib
 import pickle
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import torch
 import torch.nn as nn
@@ -11,7 +11,11 @@ from tqdm import tqdm
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
 from utttpy.selfplay.evaluation_uttt_states import EVALUATION_UTTT_STATES
 from utttpy.selfplay.policy_value_network import PolicyValueNetwork
-from utttpy.selfplay.neural_monte_carlo_tree_search import NeuralMonteCarloTreeSearch
+from utttpy.selfplay.neural_monte_carlo_tree_search import (
+    EvaluationCache,
+    NeuralMonteCarloTreeSearch,
+    SymmetricEvaluationCache,
+)
 
 
 def run_argparse() -> argparse.Namespace:
@@ -25,6 +29,9 @@ def run_argparse() -> argparse.Namespace:
     parser.add_argument("--python_random_seed", type=int, default=10111213)
     parser.add_argument("--gamelines_output_path", type=pathlib.Path, required=True)
     parser.add_argument("--device", type=torch.device, default="cuda")
+    parser.add_argument("--batch_size", type=int, default=1)
+    parser.add_argument("--evaluation_cache_max_memory_mb", type=float, default=None)
+    parser.add_argument("--evaluation_cache_symmetric", action="store_true")
     args = parser.parse_args()
     return args
 
@@ -47,6 +54,9 @@ def play_nmctsX_vs_nmctsO(
     nmctsO_num_simulations: int,
     nmctsO_exploration_strength: float,
     python_random_seed: int,
+    batch_size: int = 1,
+    nmctsX_evaluation_cache: Optional[EvaluationCache] = None,
+    nmctsO_evaluation_cache: Optional[EvaluationCache] = None,
 ) -> List[dict]:
     gameline = []
     random.seed(python_random_seed)
@@ -56,12 +66,16 @@ def play_nmctsX_vs_nmctsO(
         num_simulations=nmctsX_num_simulations,
         exploration_strength=nmctsX_exploration_strength,
         policy_value_net=nmctsX_policy_value_net,
+        batch_size=batch_size,
+        evaluation_cache=nmctsX_evaluation_cache,
     )
     nmctsO = NeuralMonteCarloTreeSearch(
         uttt=uttt.clone(),
         num_simulations=nmctsO_num_simulations,
         exploration_strength=nmctsO_exploration_strength,
         policy_value_net=nmctsO_policy_value_net,
+        batch_size=batch_size,
+        evaluation_cache=nmctsO_evaluation_cache,
     )
     while not uttt.is_terminated():
         if uttt.is_next_symbol_X():
@@ -133,11 +147,26 @@ def play_nmcts1_vs_nmcts2(
     nmcts2_exploration_strength: float,
     python_random_seed: int,
     gamelines_output_path: pathlib.Path,
+    batch_size: int = 1,
+    evaluation_cache_max_memory_mb: Optional[float] = None,
+    evaluation_cache_symmetric: bool = False,
 ) -> None:
     gamelines = {
         "nmcts1X_vs_nmcts2O": [],
         "nmcts1O_vs_nmcts2X": [],
     }
+    # one cache per network, kept across moves, players and games:
+    if evaluation_cache_max_memory_mb is None:
+        nmcts1_evaluation_cache = None
+        nmcts2_evaluation_cache = None
+    else:
+        max_memory_bytes = int(evaluation_cache_max_memory_mb * 2**20)
+        evaluation_cache_class = SymmetricEvaluationCache if evaluation_cache_symmetric else EvaluationCache
+        nmcts1_evaluation_cache = evaluation_cache_class(max_memory_bytes=max_memory_bytes)
+        if nmcts2_policy_value_net is nmcts1_policy_value_net:
+            nmcts2_evaluation_cache = nmcts1_evaluation_cache
+        else:
+            nmcts2_evaluation_cache = evaluation_cache_class(max_memory_bytes=max_memory_bytes)
     for evaluation_uttt_state in tqdm(EVALUATION_UTTT_STATES):
         # nmcts1X vs nmcts2O:
         gameline = play_nmctsX_vs_nmctsO(
@@ -149,6 +178,9 @@ def play_nmcts1_vs_nmcts2(
             nmctsO_num_simulations=nmcts2_num_simulations,
             nmctsO_exploration_strength=nmcts2_exploration_strength,
             python_random_seed=python_random_seed,
+            batch_size=batch_size,
+            nmctsX_evaluation_cache=nmcts1_evaluation_cache,
+            nmctsO_evaluation_cache=nmcts2_evaluation_cache,
         )
         gamelines["nmcts1X_vs_nmcts2O"].append(gameline)
         # nmcts1O vs nmcts2X:
@@ -161,6 +193,9 @@ def play_nmcts1_vs_nmcts2(
             nmctsO_num_simulations=nmcts1_num_simulations,
             nmctsO_exploration_strength=nmcts1_exploration_strength,
             python_random_seed=python_random_seed,
+            batch_size=batch_size,
+            nmctsX_evaluation_cache=nmcts2_evaluation_cache,
+            nmctsO_evaluation_cache=nmcts1_evaluation_cache,
         )
         gamelines["nmcts1O_vs_nmcts2X"].append(gameline)
         # print and save gamelines:
@@ -194,6 +229,9 @@ def main() -> None:
         nmcts2_exploration_strength=args.nmcts2_exploration_strength,
         python_random_seed=args.python_random_seed,
         gamelines_output_path=args.gamelines_output_path,
+        batch_size=args.batch_size,
+        evaluation_cache_max_memory_mb=args.evaluation_cache_max_memory_mb,
+        evaluation_cache_symmetric=args.evaluation_cache_symmetric,
     )
 
 
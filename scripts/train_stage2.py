@@ -3,8 +3,14 @@ import pathlib
 
 import torch
 
-from utttpy.paths import UTTT_DATASET_STAGE2_PATH
-from utttpy.selfplay.datatools import load_nmcts_dataset, merge_endgame_depths_inplace
+from utttpy.paths import UTTT_DATASET_STAGE2_PATH, UTTT_DATASET_STAGE2_BINARY_PATH
+from utttpy.selfplay.datatools import (
+    load_binary_dataset,
+    load_nmcts_dataset,
+    load_streaming_dataset,
+    merge_endgame_depths_inplace,
+    parse_nmcts_datapoint,
+)
 from utttpy.selfplay.policy_value_network import PolicyValueNetwork
 from utttpy.selfplay.training import train_policy_value_net
 
@@ -14,6 +20,14 @@ def run_argparse() -> argparse.Namespace:
     parser.add_argument("--training_dirpath", type=pathlib.Path, required=True)
     parser.add_argument("--init_policy_value_net_path", type=pathlib.Path, required=True)
     parser.add_argument("--device", type=torch.device, default="cuda")
+    parser.add_argument("--dataset_format", type=str, choices=["text", "binary", "encoded", "streaming"], default="text")
+    parser.add_argument("--num_loader_workers", type=int, default=1)
+    parser.add_argument("--shuffle_buffer_size", type=int, default=10_000)
+    parser.add_argument("--num_batch_workers", type=int, default=0)
+    parser.add_argument("--prefetch_size", type=int, default=4)
+    parser.add_argument("--pin_memory", action="store_true")
+    parser.add_argument("--channels_last", action="store_true")
+    parser.add_argument("--resume", action="store_true")
     args = parser.parse_args()
     return args
 
@@ -22,9 +36,24 @@ def main() -> None:
     args = run_argparse()
 
     print(f"training_dirpath: {repr(args.training_dirpath)}")
-    args.training_dirpath.mkdir(parents=True, exist_ok=False)
+    if not args.resume:
+        args.training_dirpath.mkdir(parents=True, exist_ok=False)
 
-    dataset = load_nmcts_dataset(UTTT_DATASET_STAGE2_PATH)
+    if args.dataset_format == "text":
+        dataset = load_nmcts_dataset(UTTT_DATASET_STAGE2_PATH, num_workers=args.num_loader_workers)
+    elif args.dataset_format == "binary":
+        # converted with scripts/convert_dataset_to_binary.py:
+        dataset = load_binary_dataset(UTTT_DATASET_STAGE2_BINARY_PATH)
+    elif args.dataset_format == "encoded":
+        # converted with scripts/convert_dataset_to_binary.py --encode:
+        dataset = load_binary_dataset(UTTT_DATASET_STAGE2_BINARY_PATH, encoded=True)
+    elif args.dataset_format == "streaming":
+        # shuffle buffer of each depth holds at most shuffle_buffer_size datapoints:
+        dataset = load_streaming_dataset(
+            UTTT_DATASET_STAGE2_PATH,
+            parse_datapoint=parse_nmcts_datapoint,
+            shuffle_buffer_size=args.shuffle_buffer_size,
+        )
     merge_endgame_depths_inplace(dataset)
 
     policy_value_net = PolicyValueNetwork()
@@ -57,6 +86,11 @@ def main() -> None:
         print_loss_iters=100,
         save_checkpoint_iters=10000,
         automatic_mixed_precision=True,
+        num_batch_workers=args.num_batch_workers,
+        prefetch_size=args.prefetch_size,
+        pin_memory=args.pin_memory,
+        channels_last=args.channels_last,
+        resume=args.resume,
     )
 
 
@@ -0,0 +1,40 @@
+import random
+
+import numpy as np
+
+from utttpy.game.constants import UTTT_RESULT_STATE_INDEX, X_STATE_VALUE, O_STATE_VALUE
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.batch_playout import batch_playout
+
+
+def test_batch_playout(seed: int = 0, num_states: int = 256) -> None:
+    random.seed(seed)
+
+    states = []
+    for _ in range(num_states):
+        uttt = UltimateTicTacToe()
+        for _ in range(random.randint(0, 60)):
+            if uttt.is_terminated():
+                break
+            uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=False)
+        states.append(list(uttt.state))
+    states = np.array(states, dtype=np.uint8)
+
+    final_states = batch_playout(states=states, rng=np.random.default_rng(seed))
+    assert final_states.shape == states.shape
+    assert final_states.dtype == np.uint8
+    for state, final_state in zip(states, final_states):
+        uttt = UltimateTicTacToe(state=bytearray(final_state.tobytes()))
+        uttt._verify_state()
+        assert uttt.is_terminated()
+        taken = state[0:81] != 0
+        assert (final_state[0:81][taken] == state[0:81][taken]).all()
+        num_X = int((final_state[0:81] == X_STATE_VALUE).sum())
+        num_O = int((final_state[0:81] == O_STATE_VALUE).sum())
+        assert num_X - num_O == int(uttt.is_next_symbol_O())
+        if state[UTTT_RESULT_STATE_INDEX]:
+            assert (final_state == state).all()
+
+
+if __name__ == "__main__":
+    test_batch_playout()
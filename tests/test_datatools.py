@@ -0,0 +1,223 @@
+import pathlib
+import random
+import tempfile
+
+import numpy as np
+import pytest
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.datatools import (
+    convert_dataset_to_binary,
+    load_binary_dataset,
+    load_mcts_dataset,
+    load_streaming_dataset,
+    merge_endgame_depths_inplace,
+    parse_mcts_datapoint,
+    parse_nmcts_datapoint,
+)
+from utttpy.selfplay.training import DatapointSampler
+from utttpy.selfplay.monte_carlo_tree_search import (
+    MonteCarloTreeSearch,
+    serialize_evaluated_state,
+    serialize_evaluated_actions,
+)
+
+
+def write_mcts_dataset(dirpath: pathlib.Path, num_games: int, num_simulations: int) -> None:
+    lines = {depth: [] for depth in range(81)}
+    for _ in range(num_games):
+        uttt = UltimateTicTacToe()
+        mcts = MonteCarloTreeSearch(uttt=uttt.clone(), num_simulations=num_simulations, exploration_strength=1.0)
+        depth = 0
+        while not uttt.is_terminated():
+            mcts.run()
+            evaluated_state = mcts.get_evaluated_state()
+            evaluated_actions = mcts.get_evaluated_actions()
+            evaluated_actions = [ea for ea in evaluated_actions if ea["num_visits"] > 0]
+            lines[depth].append(
+                f"{serialize_evaluated_state(evaluated_state)} {serialize_evaluated_actions(evaluated_actions)}"
+            )
+            uttt.execute(action=mcts.select_action(evaluated_actions, "sample"))
+            mcts.synchronize(uttt=uttt)
+            depth += 1
+    for depth in range(81):
+        with open(dirpath / f"depth{depth:02}.txt", "w") as f:
+            f.write("".join(f"{line}\n" for line in lines[depth]))
+
+
+def test_parse_datapoint() -> None:
+    state = "".join(map(str, UltimateTicTacToe().state))
+
+    datapoint = parse_mcts_datapoint(
+        f"evaluatedState{{{state} 100 50 10 40}} evaluatedActions{{1 0 60 40 5 15,1 80 40 10 5 25}}"
+    )
+    assert datapoint["state"] == UltimateTicTacToe().state
+    assert datapoint["value"] == 0.1
+    assert datapoint["actions"][0].tolist() == [0, 80]
+    assert datapoint["actions"][0].dtype == np.int32
+    assert datapoint["actions"][1].tolist() == [np.float32(0.6), np.float32(0.4)]
+    assert datapoint["actions"][2].tolist() == [np.float32(25 / 60), np.float32(-15 / 40)]
+
+    with pytest.raises(ZeroDivisionError):
+        parse_mcts_datapoint(
+            f"evaluatedState{{{state} 100 50 10 40}} evaluatedActions{{1 0 100 50 10 40,1 80 0 0 0 0}}"
+        )
+
+    datapoint = parse_nmcts_datapoint(
+        f"evaluatedState{{{state} 100 -0.123456}} evaluatedActions{{1 4 75 0.5,1 40 25 -0.25}}"
+    )
+    assert datapoint["state"] == UltimateTicTacToe().state
+    assert datapoint["value"] == -0.123456
+    assert datapoint["actions"][0].tolist() == [4, 40]
+    assert datapoint["actions"][1].tolist() == [0.75, 0.25]
+    assert datapoint["actions"][2].tolist() == [0.5, -0.25]
+    assert all(array.dtype == np.float32 for array in datapoint["actions"][1:])
+
+
+def test_binary_dataset(seed: int = 0, num_games: int = 3, num_simulations: int = 50) -> None:
+    random.seed(seed)
+
+    with tempfile.TemporaryDirectory() as tmp_dirpath:
+        text_dirpath = pathlib.Path(tmp_dirpath) / "text"
+        binary_dirpath = pathlib.Path(tmp_dirpath) / "binary"
+        text_dirpath.mkdir()
+        write_mcts_dataset(dirpath=text_dirpath, num_games=num_games, num_simulations=num_simulations)
+        convert_dataset_to_binary(
+            input_dirpath=text_dirpath,
+            output_dirpath=binary_dirpath,
+            parse_datapoint=parse_mcts_datapoint,
+        )
+        text_dataset = load_mcts_dataset(text_dirpath)
+        parallel_text_dataset = load_mcts_dataset(text_dirpath, num_workers=2)
+        assert list(parallel_text_dataset.keys()) == list(text_dataset.keys())
+        for key, datapoints in parallel_text_dataset.items():
+            assert [datapoint["state"] for datapoint in datapoints] == [
+                datapoint["state"] for datapoint in text_dataset[key]
+            ]
+        binary_dataset = load_binary_dataset(binary_dirpath)
+        merge_endgame_depths_inplace(text_dataset)
+        merge_endgame_depths_inplace(binary_dataset)
+
+        assert list(binary_dataset.keys()) == list(text_dataset.keys())
+        assert sum(len(datapoints) for datapoints in binary_dataset.values()) > 0
+        for key, text_datapoints in text_dataset.items():
+            binary_datapoints = binary_dataset[key]
+            assert len(binary_datapoints) == len(text_datapoints)
+            for i, text_datapoint in enumerate(text_datapoints):
+                binary_datapoint = binary_datapoints[i]
+                assert binary_datapoint["state"] == text_datapoint["state"]
+                assert binary_datapoint["value"] == np.float32(text_datapoint["value"])
+                for binary_array, text_array in zip(binary_datapoint["actions"], text_datapoint["actions"]):
+                    assert binary_array.dtype == text_array.dtype
+                    assert (binary_array == text_array).all()
+
+
+def test_streaming_dataset(seed: int = 0, num_games: int = 3, num_simulations: int = 50) -> None:
+    random.seed(seed)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        dirpath = pathlib.Path(dirpath)
+        write_mcts_dataset(dirpath=dirpath, num_games=num_games, num_simulations=num_simulations)
+        text_dataset = load_mcts_dataset(dirpath)
+        merge_endgame_depths_inplace(text_dataset)
+        # datapoint keys by state, depth is the number of symbols on the board:
+        keys = {}
+        for key, datapoints in text_dataset.items():
+            for datapoint in datapoints:
+                keys[bytes(datapoint["state"])] = key
+
+        for shuffle_buffer_size in [1, 2, 1000]:
+            streaming_dataset = load_streaming_dataset(
+                dirpath,
+                parse_datapoint=parse_mcts_datapoint,
+                shuffle_buffer_size=shuffle_buffer_size,
+            )
+            merge_endgame_depths_inplace(streaming_dataset)
+            # depths without datapoints cannot be streamed:
+            streaming_dataset = {key: streaming_dataset[key] for key in text_dataset if len(text_dataset[key]) > 0}
+            sampler = DatapointSampler(dataset=streaming_dataset, seed=seed)
+            num_samples = {key: 0 for key in streaming_dataset}
+            sampled_states = set()
+            for _ in range(20):
+                for _ in range(len(streaming_dataset)):
+                    state = bytes(sampler.next_datapoint()["state"])
+                    num_samples[keys[state]] += 1
+                    sampled_states.add(state)
+                # each round samples every depth once:
+                assert set(num_samples.values()) == {num_samples[keys[state]]}
+            if shuffle_buffer_size == 1:
+                # files are read in order:
+                datapoints = iter(streaming_dataset["depth10"])
+                assert [next(datapoints)["state"] for _ in range(2 * num_games)] == [
+                    datapoint["state"] for datapoint in text_dataset["depth10"] * 2
+                ]
+            else:
+                assert len(sampled_states) > len(streaming_dataset)
+
+
+def test_streaming_dataset_shards(seed: int = 0, num_games: int = 5, num_simulations: int = 20) -> None:
+    random.seed(seed)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        dirpath = pathlib.Path(dirpath)
+        write_mcts_dataset(dirpath=dirpath, num_games=num_games, num_simulations=num_simulations)
+        states = [datapoint["state"] for datapoint in load_mcts_dataset(dirpath)["depth10"]]
+        for shuffle_buffer_size in [1, 1000]:
+            streaming_dataset = load_streaming_dataset(
+                dirpath,
+                parse_datapoint=parse_mcts_datapoint,
+                shuffle_buffer_size=shuffle_buffer_size,
+            )
+            # streams of two batch workers:
+            shard_states = []
+            for shard in range(2):
+                sampler = DatapointSampler(
+                    dataset={"depth10": streaming_dataset["depth10"]}, seed=seed, shard=shard, num_shards=2
+                )
+                shard_states.append([sampler.next_datapoint()["state"] for _ in range(4 * len(states))])
+            assert set(map(bytes, shard_states[0])).isdisjoint(set(map(bytes, shard_states[1])))
+            assert set(map(bytes, shard_states[0] + shard_states[1])) == set(map(bytes, states))
+            if shuffle_buffer_size == 1:
+                assert shard_states[0][:len(states[0::2])] == states[0::2]
+                assert shard_states[1][:len(states[1::2])] == states[1::2]
+
+        # a shard left empty by a short file reads all lines:
+        streaming_dataset = load_streaming_dataset(dirpath, parse_datapoint=parse_mcts_datapoint, shuffle_buffer_size=1)
+        datapoints = streaming_dataset["depth10"].stream(shard=len(states), num_shards=len(states) + 1)
+        assert [next(datapoints)["state"] for _ in range(len(states))] == states
+
+
+def test_streaming_dataset_position(seed: int = 0, num_games: int = 3, num_simulations: int = 20) -> None:
+    random.seed(seed)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        dirpath = pathlib.Path(dirpath)
+        write_mcts_dataset(dirpath=dirpath, num_games=num_games, num_simulations=num_simulations)
+        for shuffle_buffer_size in [1, 4, 1000]:
+            streaming_dataset = load_streaming_dataset(
+                dirpath,
+                parse_datapoint=parse_mcts_datapoint,
+                shuffle_buffer_size=shuffle_buffer_size,
+            )
+            # several files, read in a new random order in each pass:
+            streaming_datapoints = streaming_dataset["depth10"]
+            for d in range(11, 20):
+                streaming_datapoints = streaming_datapoints + streaming_dataset[f"depth{d}"]
+            for shard, num_shards in [(0, 1), (1, 2)]:
+                # positions are taken before the buffer is filled, within passes and at their ends:
+                for num_datapoints in [0, 1, 7, 40]:
+                    datapoints = streaming_datapoints.stream(shard, num_shards, rng=random.Random(seed))
+                    for _ in range(num_datapoints):
+                        next(datapoints)
+                    position = datapoints.get_position()
+                    states = [next(datapoints)["state"] for _ in range(100)]
+                    datapoints = streaming_datapoints.stream(shard, num_shards, rng=random.Random(), position=position)
+                    assert [next(datapoints)["state"] for _ in range(100)] == states
+
+
+if __name__ == "__main__":
+    test_parse_datapoint()
+    test_binary_dataset()
+    test_streaming_dataset()
+    test_streaming_dataset_shards()
+    test_streaming_dataset_position()
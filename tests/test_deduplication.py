@@ -0,0 +1,114 @@
+import pathlib
+import random
+import tempfile
+
+import numpy as np
+
+from utttpy.game.action import Action
+from utttpy.game.constants import X_STATE_VALUE
+from utttpy.game.symmetry import NUM_SYMMETRIES, SYMMETRY_INDEX_MAPS, canonicalize_state, transform_state
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.datatools import load_mcts_dataset, parse_nmcts_datapoint
+from utttpy.selfplay.deduplication import deduplicate_dataset, deduplicate_lines
+from utttpy.selfplay.monte_carlo_tree_search import (
+    MonteCarloTreeSearch,
+    serialize_evaluated_state,
+    serialize_evaluated_actions,
+)
+
+
+def write_mcts_dataset(dirpath: pathlib.Path, num_games: int, num_simulations: int) -> None:
+    # games are played from a few distinct openings, so that positions repeat:
+    lines = {depth: [] for depth in range(81)}
+    for game in range(num_games):
+        random.seed(game % 2)
+        uttt = UltimateTicTacToe()
+        mcts = MonteCarloTreeSearch(uttt=uttt.clone(), num_simulations=num_simulations, exploration_strength=1.0)
+        depth = 0
+        while not uttt.is_terminated():
+            mcts.run()
+            evaluated_state = mcts.get_evaluated_state()
+            evaluated_actions = [ea for ea in mcts.get_evaluated_actions() if ea["num_visits"] > 0]
+            lines[depth].append(
+                f"{serialize_evaluated_state(evaluated_state)} {serialize_evaluated_actions(evaluated_actions)}"
+            )
+            uttt.execute(action=mcts.select_action(evaluated_actions, "sample"))
+            mcts = MonteCarloTreeSearch(uttt=uttt.clone(), num_simulations=num_simulations, exploration_strength=1.0)
+            depth += 1
+    for depth in range(81):
+        with open(dirpath / f"depth{depth:02}.txt", "w") as f:
+            f.write("".join(f"{line}\n" for line in lines[depth]))
+
+
+def test_deduplicate_dataset(num_games: int = 4, num_simulations: int = 30) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dirpath:
+        input_dirpath = pathlib.Path(tmp_dirpath) / "input"
+        input_dirpath.mkdir()
+        write_mcts_dataset(dirpath=input_dirpath, num_games=num_games, num_simulations=num_simulations)
+        input_dataset = load_mcts_dataset(input_dirpath)
+
+        for symmetric in [False, True]:
+            output_dirpath = pathlib.Path(tmp_dirpath) / f"output_symmetric={symmetric}"
+            report = deduplicate_dataset(
+                input_dirpath=input_dirpath,
+                output_dirpath=output_dirpath,
+                dataset_type="mcts",
+                symmetric=symmetric,
+            )
+            output_dataset = load_mcts_dataset(output_dirpath)
+            assert report["all"]["num_datapoints"] == sum(len(datapoints) for datapoints in input_dataset.values())
+            assert report["all"]["num_duplicates"] > 0
+            for key, datapoints in output_dataset.items():
+                assert report[key]["num_deduplicated_datapoints"] == len(datapoints)
+                states = [bytes(datapoint["state"]) for datapoint in datapoints]
+                assert len(set(states)) == len(states)
+                input_states = {bytes(datapoint["state"]) for datapoint in input_dataset[key]}
+                if symmetric:
+                    input_states = {bytes(canonicalize_state(bytearray(state))[0]) for state in input_states}
+                assert set(states) == input_states
+            # nothing to merge in a deduplicated dataset:
+            assert deduplicate_dataset(
+                input_dirpath=output_dirpath,
+                output_dirpath=pathlib.Path(tmp_dirpath) / f"output_symmetric={symmetric}_again",
+                dataset_type="mcts",
+                symmetric=symmetric,
+            )["all"]["num_duplicates"] == 0
+
+
+def test_deduplicate_lines() -> None:
+    # a position without symmetries of its own:
+    uttt = UltimateTicTacToe()
+    uttt.execute(action=Action(symbol=X_STATE_VALUE, index=11))
+    state = "".join(map(str, uttt.state))
+    lines = [
+        f"evaluatedState{{{state} 100 0.5}} evaluatedActions{{2 0 60 -0.5,2 1 40 -0.5}}",
+        f"evaluatedState{{{state} 300 -0.5}} evaluatedActions{{2 1 200 0.25,2 2 100 1.0}}",
+    ]
+    datapoint = parse_nmcts_datapoint(deduplicate_lines(lines=lines, dataset_type="nmcts", symmetric=False)[0])
+    assert datapoint["state"] == uttt.state
+    assert datapoint["value"] == -0.25
+    assert datapoint["actions"][0].tolist() == [0, 1, 2]
+    assert datapoint["actions"][1].tolist() == [np.float32(p) for p in [60 / 400, 240 / 400, 100 / 400]]
+    assert datapoint["actions"][2].tolist() == [-0.5, 0.125, 1.0]
+
+    # symmetric positions are merged into the canonical one:
+    symmetric_lines = []
+    for symmetry in range(NUM_SYMMETRIES):
+        symmetric_state = "".join(map(str, transform_state(uttt.state, symmetry)))
+        index_map = SYMMETRY_INDEX_MAPS[symmetry]
+        symmetric_lines.append(
+            f"evaluatedState{{{symmetric_state} 10 0.5}}"
+            f" evaluatedActions{{2 {index_map[0]} 6 -0.5,2 {index_map[1]} 4 -0.5}}"
+        )
+    deduplicated_lines = deduplicate_lines(lines=symmetric_lines, dataset_type="nmcts", symmetric=True)
+    assert len(deduplicated_lines) == 1
+    datapoint = parse_nmcts_datapoint(deduplicated_lines[0])
+    canonical_state, symmetry = canonicalize_state(uttt.state)
+    assert datapoint["state"] == canonical_state
+    assert datapoint["value"] == 0.5
+    assert sorted(datapoint["actions"][0].tolist()) == sorted(SYMMETRY_INDEX_MAPS[symmetry][i] for i in [0, 1])
+
+
+if __name__ == "__main__":
+    test_deduplicate_dataset()
+    test_deduplicate_lines()
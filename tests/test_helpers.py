@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+
+from utttpy.game.constants import X_STATE_VALUE, O_STATE_VALUE
+from utttpy.game.helpers import row_index, col_index, get_state_ndarray_4x9x9, get_states_ndarray_Nx4x9x9
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+
+
+def get_state_ndarray_4x9x9_reference(uttt: UltimateTicTacToe) -> np.ndarray:
+    array = np.zeros(shape=(4, 9, 9), dtype=np.int8)
+    x_i, o_i = (0, 1) if uttt.is_next_symbol_X() else (1, 0)
+    for s_i, s_v in enumerate(uttt.state[0:81]):
+        if s_v == X_STATE_VALUE:
+            array[x_i, row_index(s_i), col_index(s_i)] = 1
+        elif s_v == O_STATE_VALUE:
+            array[o_i, row_index(s_i), col_index(s_i)] = 1
+    array[2].fill(1 if uttt.is_next_symbol_X() else -1)
+    for l_i in uttt.get_legal_indexes():
+        array[3, row_index(l_i), col_index(l_i)] = 1
+    return array
+
+
+def test_get_state_ndarray_4x9x9(seed: int = 0, num_games: int = 10) -> None:
+    random.seed(seed)
+
+    for _ in range(num_games):
+        uttt = UltimateTicTacToe()
+        while True:
+            state = uttt.state.copy()
+            array = get_state_ndarray_4x9x9(uttt=uttt)
+            assert uttt.state == state
+            assert array.shape == (4, 9, 9)
+            assert array.dtype == np.int8
+            assert (array == get_state_ndarray_4x9x9_reference(uttt=uttt)).all()
+            if uttt.is_terminated():
+                break
+            uttt.execute(action=random.choice(uttt.get_legal_actions()))
+
+
+def test_get_states_ndarray_Nx4x9x9(seed: int = 0, num_games: int = 10) -> None:
+    random.seed(seed)
+
+    uttts = []
+    for _ in range(num_games):
+        uttt = UltimateTicTacToe()
+        uttts.append(uttt.clone())
+        while not uttt.is_terminated():
+            uttt.execute(action=random.choice(uttt.get_legal_actions()))
+            uttts.append(uttt.clone())
+    states = np.array([list(uttt.state) for uttt in uttts], dtype=np.uint8)
+    expected = np.stack([get_state_ndarray_4x9x9(uttt=uttt) for uttt in uttts])
+
+    array = get_states_ndarray_Nx4x9x9(states=states)
+    assert array.dtype == np.int8
+    assert (array == expected).all()
+
+    out = np.full(shape=(len(uttts), 4, 9, 9), fill_value=7.0, dtype=np.float32)
+    assert get_states_ndarray_Nx4x9x9(states=states, out=out) is out
+    assert (out == expected).all()
+
+
+if __name__ == "__main__":
+    test_get_state_ndarray_4x9x9()
+    test_get_states_ndarray_Nx4x9x9()
@@ -0,0 +1,150 @@
+import random
+from typing import List, Optional
+
+import numpy as np
+
+from utttpy.game.constants import X_STATE_VALUE
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.monte_carlo_tree_search import (
+    MonteCarloTreeSearch,
+    Node,
+    TranspositionTable,
+    UCT,
+    UCT_scores,
+)
+
+
+def test_mcts(
+    seed: int = 0,
+    num_simulations: int = 500,
+    transposition_table_cache_size: Optional[int] = None,
+    tree_storage: str = "nodes",
+    num_playouts_per_leaf: int = 1,
+) -> List[List[dict]]:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    mcts = MonteCarloTreeSearch(
+        uttt=uttt.clone(),
+        num_simulations=num_simulations,
+        exploration_strength=1.0,
+        transposition_table_cache_size=transposition_table_cache_size,
+        tree_storage=tree_storage,
+        num_playouts_per_leaf=num_playouts_per_leaf,
+    )
+    evaluations = []
+    for _ in range(4):
+        mcts.run()
+        evaluated_state = mcts.get_evaluated_state()
+        evaluated_actions = mcts.get_evaluated_actions()
+        assert evaluated_state["state"] == uttt.state
+        assert evaluated_state["num_visits"] >= num_simulations
+        assert sorted(ea["index"] for ea in evaluated_actions) == uttt.get_legal_indexes()
+        for ea in evaluated_actions:
+            assert ea["num_visits"] == ea["num_wins"] + ea["num_draws"] + ea["num_losses"]
+        assert mcts.tree.uttt.is_equal_to(uttt)
+        if transposition_table_cache_size is not None:
+            # the cache size bounds lookups, not the tree:
+            assert len(mcts.tree.transposition_table.nodes) <= transposition_table_cache_size
+        evaluations.append([evaluated_state] + evaluated_actions)
+        selected_action = mcts.select_action(evaluated_actions, "argmax")
+        uttt.execute(action=selected_action)
+        mcts.synchronize(uttt=uttt)
+        assert mcts.tree.size > 0
+    return evaluations
+
+
+def test_mcts_transposition_table() -> None:
+    test_mcts(seed=0, num_simulations=2000, transposition_table_cache_size=100_000)
+    test_mcts(seed=1, num_simulations=2000, transposition_table_cache_size=100)
+
+
+def test_mcts_transposition_table_synchronize(seed: int = 0, cache_size: int = 100) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    mcts = MonteCarloTreeSearch(
+        uttt=uttt.clone(),
+        num_simulations=2000,
+        exploration_strength=1.0,
+        transposition_table_cache_size=100_000,
+        tree_storage="nodes",
+    )
+    mcts.run()
+    # the nodes nearest the root are kept in a smaller table:
+    transposition_table = TranspositionTable(cache_size=cache_size)
+    transposition_table.reset(node=mcts.tree.root, uttt=mcts.tree.uttt)
+    assert len(transposition_table.nodes) == cache_size
+    assert all(child_node in transposition_table.nodes.values() for child_node in mcts.tree.root.child_nodes)
+    # synchronize after a move of each player finds the new root in the table:
+    node = mcts.tree.root
+    for _ in range(2):
+        i = int(np.argmax([child_node.num_visits for child_node in node.child_nodes]))
+        uttt.execute(action=node.child_actions[i])
+        node = node.child_nodes[i]
+    assert mcts.tree.transposition_table.nodes[uttt.hash] is node
+    mcts.synchronize(uttt=uttt)
+    assert mcts.tree.root is node
+    assert mcts.tree.root.num_visits > 0
+
+
+def test_mcts_clones_uttt() -> None:
+    for tree_storage in ["nodes", "arrays"]:
+        uttt = UltimateTicTacToe()
+        mcts = MonteCarloTreeSearch(uttt=uttt, num_simulations=10, exploration_strength=1.0, tree_storage=tree_storage)
+        uttt.execute(action=uttt.get_legal_actions()[0])
+        assert mcts.tree.uttt.is_equal_to(UltimateTicTacToe())
+        mcts.run()
+        assert mcts.get_evaluated_state()["state"] == UltimateTicTacToe().state
+
+
+def test_mcts_array_tree() -> None:
+    for seed in range(3):
+        evaluations = test_mcts(seed=seed, tree_storage="nodes")
+        array_evaluations = test_mcts(seed=seed, tree_storage="arrays")
+        assert array_evaluations == evaluations
+
+
+def test_mcts_batch_playouts() -> None:
+    test_mcts(seed=0, num_simulations=2000, num_playouts_per_leaf=16)
+    test_mcts(seed=1, num_simulations=2000, tree_storage="arrays", num_playouts_per_leaf=16)
+
+
+def test_UCT_scores(seed: int = 0) -> None:
+    rng = random.Random(seed)
+    nodes = []
+    for _ in range(81):
+        node = Node()
+        node.num_X_wins = rng.randint(0, 50)
+        node.num_O_wins = rng.randint(0, 50)
+        node.num_draws = rng.randint(0, 50)
+        node.num_visits = rng.choice([0, node.num_X_wins + node.num_O_wins + node.num_draws])
+        nodes.append(node)
+    parent_num_visits = sum(node.num_visits for node in nodes) + 1
+    scores = UCT_scores(
+        num_wins=np.array([node.num_X_wins for node in nodes], dtype=np.int32),
+        num_losses=np.array([node.num_O_wins for node in nodes], dtype=np.int32),
+        num_visits=np.array([node.num_visits for node in nodes], dtype=np.int32),
+        parent_num_visits=parent_num_visits,
+        exploration_strength=1.0,
+    )
+    expected_scores = [
+        UCT(
+            node=node,
+            symbol=X_STATE_VALUE,
+            parent_num_visits=parent_num_visits,
+            exploration_strength=1.0,
+        )
+        for node in nodes
+    ]
+    assert scores.tolist() == expected_scores
+
+
+if __name__ == "__main__":
+    test_mcts()
+    test_mcts_transposition_table()
+    test_mcts_transposition_table_synchronize()
+    test_mcts_clones_uttt()
+    test_mcts_array_tree()
+    test_mcts_batch_playouts()
+    test_UCT_scores()
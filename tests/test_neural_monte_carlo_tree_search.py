@@ -0,0 +1,160 @@
+import random
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+import torch
+
+from utttpy.game.symmetry import NUM_SYMMETRIES, SYMMETRY_INDEX_MAPS, transform_state
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.neural_monte_carlo_tree_search import (
+    EvaluationCache,
+    NeuralMonteCarloTreeSearch,
+    SymmetricEvaluationCache,
+)
+from utttpy.selfplay.policy_value_network import PolicyValueNetwork
+
+
+def test_nmcts(
+    seed: int = 0,
+    num_simulations: int = 100,
+    batch_size: int = 1,
+    evaluation_cache: Optional[EvaluationCache] = None,
+) -> List[List[dict]]:
+    random.seed(seed)
+    torch.manual_seed(seed)
+
+    policy_value_net = PolicyValueNetwork(num_planes=16)
+    policy_value_net.eval()
+    uttt = UltimateTicTacToe()
+    nmcts = NeuralMonteCarloTreeSearch(
+        uttt=uttt.clone(),
+        num_simulations=num_simulations,
+        exploration_strength=2.0,
+        policy_value_net=policy_value_net,
+        batch_size=batch_size,
+        evaluation_cache=evaluation_cache,
+    )
+    evaluations = []
+    for _ in range(3):
+        nmcts.run()
+        evaluated_state = nmcts.get_evaluated_state()
+        evaluated_actions = nmcts.get_evaluated_actions()
+        assert evaluated_state["state"] == uttt.state
+        assert evaluated_state["visit_count"] >= num_simulations
+        assert sorted(ea["index"] for ea in evaluated_actions) == uttt.get_legal_indexes()
+        # no virtual loss is left in the tree:
+        nodes = deque([nmcts.tree.root])
+        while nodes:
+            node = nodes.popleft()
+            assert node.virtual_loss_count == 0
+            assert sum(child_node.visit_count for child_node in node.child_nodes) < max(node.visit_count, 1)
+            if node.visit_count > 0:
+                assert abs(node.state_value_sum) <= node.visit_count + 1e-6
+                assert node.state_value_mean == node.state_value_sum / node.visit_count
+            nodes.extend(node.child_nodes)
+        evaluations.append([evaluated_state] + evaluated_actions)
+        selected_action = nmcts.select_action(evaluated_actions, "argmax")
+        uttt.execute(action=selected_action)
+        nmcts.synchronize(uttt=uttt)
+    return evaluations
+
+
+def test_nmcts_batch() -> None:
+    test_nmcts(seed=0, batch_size=8)
+    test_nmcts(seed=1, num_simulations=50, batch_size=64)
+
+
+def test_nmcts_batch_visit_counts(seed: int = 0, num_simulations: int = 60, batch_size: int = 16) -> None:
+    random.seed(seed)
+    torch.manual_seed(seed)
+
+    policy_value_net = PolicyValueNetwork(num_planes=16)
+    policy_value_net.eval()
+    nmcts = NeuralMonteCarloTreeSearch(
+        uttt=UltimateTicTacToe(),
+        num_simulations=num_simulations,
+        exploration_strength=2.0,
+        policy_value_net=policy_value_net,
+        batch_size=batch_size,
+    )
+    # the first batch selects the unexpanded root batch_size times and evaluates it once:
+    nmcts._simulate_batch(batch_size=batch_size)
+    assert nmcts.tree.root.visit_count == 1
+    nmcts.run()
+    assert nmcts.tree.root.visit_count == num_simulations
+    # each visit of a node is its own evaluation or a visit of one of its children:
+    nodes = deque([nmcts.tree.root])
+    while nodes:
+        node = nodes.popleft()
+        if node.child_nodes:
+            assert node.visit_count == 1 + sum(child_node.visit_count for child_node in node.child_nodes)
+        nodes.extend(node.child_nodes)
+    # virtual loss lowers the score of a child and leaves its statistics unchanged when removed:
+    child_node = max(nmcts.tree.root.child_nodes, key=lambda child_node: child_node.visit_count)
+    statistics = (child_node.visit_count, child_node.state_value_sum, child_node.state_value_mean)
+    Q = nmcts._Q(child_node)
+    nmcts._add_virtual_loss(selected_path=[nmcts.tree.root, child_node], sign=1)
+    assert nmcts._Q(child_node) < Q
+    nmcts._add_virtual_loss(selected_path=[nmcts.tree.root, child_node], sign=-1)
+    assert (child_node.visit_count, child_node.state_value_sum, child_node.state_value_mean) == statistics
+    assert nmcts._Q(child_node) == Q
+
+
+def test_nmcts_evaluation_cache() -> None:
+    evaluation_cache = EvaluationCache(max_memory_bytes=1 << 20)
+    evaluations = test_nmcts(seed=0, num_simulations=200)
+    cached_evaluations = test_nmcts(seed=0, num_simulations=200, evaluation_cache=evaluation_cache)
+    assert cached_evaluations == evaluations
+    num_misses = evaluation_cache.num_misses
+    assert num_misses > 0
+    # the second search visits the same positions, so it is served from the cache:
+    cached_evaluations = test_nmcts(seed=0, num_simulations=200, evaluation_cache=evaluation_cache)
+    assert cached_evaluations == evaluations
+    assert evaluation_cache.num_misses == num_misses
+    assert evaluation_cache.num_hits > 0
+
+    evaluation_cache = EvaluationCache(max_memory_bytes=10_000)
+    for key in range(100):
+        evaluation_cache.put(key=key, legal_policy_logits=np.zeros(9, dtype=np.float32), state_value=0.5)
+        assert evaluation_cache.memory_bytes <= evaluation_cache.max_memory_bytes
+    assert evaluation_cache.num_evictions == 100 - len(evaluation_cache.evaluations)
+    assert evaluation_cache.get(key=0) is None
+    assert evaluation_cache.get(key=99)[1] == 0.5
+    assert (evaluation_cache.num_hits, evaluation_cache.num_misses) == (1, 1)
+
+
+def test_nmcts_symmetric_evaluation_cache(seed: int = 0) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    for _ in range(5):
+        uttt.execute(action=random.choice(uttt.get_legal_actions()))
+    legal_indexes = uttt.get_legal_indexes()
+    legal_policy_logits = np.array(legal_indexes, dtype=np.float32)
+    evaluation_cache = SymmetricEvaluationCache(max_memory_bytes=1 << 20)
+    evaluation_cache.put_evaluation(uttt=uttt, legal_policy_logits=legal_policy_logits, state_value=0.25)
+    for symmetry in range(NUM_SYMMETRIES):
+        transformed_uttt = UltimateTicTacToe(state=transform_state(uttt.state, symmetry))
+        transformed_legal_policy_logits, state_value = evaluation_cache.get_evaluation(uttt=transformed_uttt)
+        assert state_value == 0.25
+        # each logit follows its action to the transformed index:
+        assert sorted(
+            zip(transformed_uttt.get_legal_indexes(), transformed_legal_policy_logits.tolist())
+        ) == sorted(
+            (SYMMETRY_INDEX_MAPS[symmetry][l_i], float(l_i)) for l_i in legal_indexes
+        )
+    assert (evaluation_cache.num_hits, len(evaluation_cache.evaluations)) == (NUM_SYMMETRIES, 1)
+
+    # symmetric positions are in the same search from the initial position already:
+    evaluation_cache = SymmetricEvaluationCache(max_memory_bytes=1 << 20)
+    test_nmcts(seed=seed, num_simulations=200, evaluation_cache=evaluation_cache)
+    assert evaluation_cache.num_hits > 0
+
+
+if __name__ == "__main__":
+    test_nmcts()
+    test_nmcts_batch()
+    test_nmcts_batch_visit_counts()
+    test_nmcts_evaluation_cache()
+    test_nmcts_symmetric_evaluation_cache()
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.root_parallel_monte_carlo_tree_search import RootParallelMonteCarloTreeSearch
+
+
+def test_root_parallel_mcts(seed: int = 0, num_simulations: int = 301, num_workers: int = 2) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    with RootParallelMonteCarloTreeSearch(
+        uttt=uttt.clone(),
+        num_simulations=num_simulations,
+        exploration_strength=1.0,
+        num_workers=num_workers,
+    ) as mcts:
+        for _ in range(3):
+            mcts.run()
+            evaluated_state = mcts.get_evaluated_state()
+            evaluated_actions = mcts.get_evaluated_actions()
+            assert evaluated_state["state"] == uttt.state
+            assert evaluated_state["num_visits"] >= num_simulations
+            assert sorted(ea["index"] for ea in evaluated_actions) == uttt.get_legal_indexes()
+            num_visits = sum(ea["num_visits"] for ea in evaluated_actions)
+            assert evaluated_state["num_visits"] - num_workers <= num_visits < evaluated_state["num_visits"]
+            for ea in evaluated_actions:
+                assert ea["num_visits"] == ea["num_wins"] + ea["num_draws"] + ea["num_losses"]
+            selected_action = mcts.select_action(evaluated_actions, "argmax")
+            uttt.execute(action=selected_action)
+            mcts.synchronize(uttt=uttt)
+
+
+def test_root_parallel_mcts_worker_error(seed: int = 0, num_workers: int = 3) -> None:
+    random.seed(seed)
+
+    with RootParallelMonteCarloTreeSearch(
+        uttt=UltimateTicTacToe(),
+        num_simulations=30,
+        exploration_strength=1.0,
+        num_workers=num_workers,
+    ) as mcts:
+        with pytest.raises(ValueError):
+            mcts._request("unknown")
+        # replies of the other workers were drained, the next request gets its own replies:
+        mcts.run()
+        evaluated_state = mcts.get_evaluated_state()
+        assert evaluated_state["num_visits"] >= 30
+
+
+if __name__ == "__main__":
+    test_root_parallel_mcts()
+    test_root_parallel_mcts_worker_error()
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from utttpy.game.action import Action
+from utttpy.game.helpers import get_state_ndarray_4x9x9
+from utttpy.game.symmetry import (
+    NUM_SYMMETRIES,
+    SYMMETRY_GATHER_POSITIONS_9x9,
+    SYMMETRY_INDEX_MAPS,
+    canonicalize_state,
+    transform_state,
+)
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+
+
+def orient_4x9x9(array: np.ndarray, symmetry: int) -> np.ndarray:
+    # symmetry bits applied with np.flip and transpositions:
+    if symmetry & 1:
+        array = np.flip(array, 1)
+    if symmetry & 2:
+        array = np.flip(array, 2)
+    if symmetry & 4:
+        array = np.rollaxis(array, 2, 1)
+    return array
+
+
+def test_symmetry(seed: int = 0) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    while not uttt.is_terminated():
+        canonical_states = set()
+        for symmetry in range(NUM_SYMMETRIES):
+            transformed_uttt = UltimateTicTacToe(state=transform_state(uttt.state, symmetry))
+            transformed_uttt._verify_state()
+            assert sorted(
+                SYMMETRY_INDEX_MAPS[symmetry][l_i] for l_i in uttt.get_legal_indexes()
+            ) == transformed_uttt.get_legal_indexes()
+            assert (
+                get_state_ndarray_4x9x9(uttt=transformed_uttt)
+                == orient_4x9x9(get_state_ndarray_4x9x9(uttt=uttt), symmetry)
+            ).all()
+            assert (
+                get_state_ndarray_4x9x9(uttt=transformed_uttt).reshape(4, 81)
+                == get_state_ndarray_4x9x9(uttt=uttt).reshape(4, 81)[:, SYMMETRY_GATHER_POSITIONS_9x9[symmetry]]
+            ).all()
+            canonical_state, canonical_symmetry = canonicalize_state(transformed_uttt.state)
+            assert transform_state(transformed_uttt.state, canonical_symmetry) == canonical_state
+            canonical_states.add(bytes(canonical_state))
+        assert len(canonical_states) == 1
+
+        action = random.choice(uttt.get_legal_actions())
+        symmetry = random.randrange(NUM_SYMMETRIES)
+        transformed_uttt = UltimateTicTacToe(state=transform_state(uttt.state, symmetry))
+        transformed_uttt.execute(Action(symbol=action.symbol, index=SYMMETRY_INDEX_MAPS[symmetry][action.index]))
+        uttt.execute(action)
+        assert transformed_uttt.state == transform_state(uttt.state, symmetry)
+
+
+if __name__ == "__main__":
+    test_symmetry()
@@ -0,0 +1,326 @@
+import json
+import pathlib
+import random
+import tempfile
+
+import numpy as np
+import torch
+
+from test_datatools import write_mcts_dataset
+from utttpy.game.symmetry import NUM_SYMMETRIES
+from utttpy.selfplay.datatools import (
+    convert_dataset_to_binary,
+    encode_binary_dataset,
+    load_binary_dataset,
+    load_mcts_dataset,
+    load_streaming_dataset,
+    merge_endgame_depths_inplace,
+    parse_mcts_datapoint,
+)
+from utttpy.selfplay.policy_value_network import PolicyValueNetwork
+from utttpy.selfplay.training import (
+    BatchTransfer,
+    DatapointSampler,
+    batch_to_device,
+    gather_encoded_batch,
+    make_ndarray_batch_iterator,
+    ndarray_batch_generator,
+    orient_batch,
+    prefetch_ndarray_batch_generator,
+    preprocessing,
+    random_orientation_batch,
+    stack_datapoints,
+    train_batch_generator,
+    train_policy_value_net,
+)
+
+
+def load_test_dataset(dirpath: pathlib.Path, seed: int) -> dict:
+    random.seed(seed)
+    write_mcts_dataset(dirpath=dirpath, num_games=2, num_simulations=20)
+    dataset = load_mcts_dataset(dirpath)
+    merge_endgame_depths_inplace(dataset)
+    # depths not reached by the games are empty:
+    return {key: datapoints for key, datapoints in dataset.items() if len(datapoints) > 0}
+
+
+def assert_batches_equal(batch: dict, other_batch: dict) -> None:
+    assert torch.equal(batch["inputs"], other_batch["inputs"])
+    for key in batch["targets"]:
+        assert torch.equal(batch["targets"][key], other_batch["targets"][key])
+
+
+def test_prefetch_ndarray_batch_generator(seed: int = 0, num_batches: int = 6) -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        dataset = load_test_dataset(pathlib.Path(tmpdirname), seed=seed)
+
+    device = torch.device("cpu")
+    random.seed(seed)
+    ndarray_batch_iterator = prefetch_ndarray_batch_generator(dataset, batch_size=16, num_workers=2, prefetch_size=2)
+    batches = [batch_to_device(next(ndarray_batch_iterator), device=device) for _ in range(num_batches)]
+    ndarray_batch_iterator.close()
+    assert batches[0]["inputs"].shape == (16, 4, 9, 9)
+    assert batches[0]["targets"]["state_value"].shape == (16,)
+
+    # the same seed gives the same batches:
+    random.seed(seed)
+    ndarray_batch_iterator = prefetch_ndarray_batch_generator(dataset, batch_size=16, num_workers=2, prefetch_size=1)
+    for batch in batches:
+        assert_batches_equal(batch, batch_to_device(next(ndarray_batch_iterator), device=device))
+    ndarray_batch_iterator.close()
+
+    # a single worker builds the same batches as the main process would with the same seed:
+    random.seed(seed)
+    ndarray_batch_iterator = prefetch_ndarray_batch_generator(dataset, batch_size=16, num_workers=1, prefetch_size=2)
+    prefetched_batches = [batch_to_device(next(ndarray_batch_iterator), device=device) for _ in range(num_batches)]
+    ndarray_batch_iterator.close()
+    random.seed(seed)
+    train_batch_iterator = train_batch_generator(dataset, batch_size=16, device=device)
+    for batch in prefetched_batches:
+        assert_batches_equal(batch, next(train_batch_iterator))
+
+
+def test_datapoint_sampler(seed: int = 0, num_shards: int = 3) -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        dataset = load_test_dataset(pathlib.Path(tmpdirname), seed=seed)
+
+    # shards sample disjoint indexes, each epoch covers all datapoints:
+    num_datapoints = 10
+    datapoints = [{"index": i} for i in range(num_datapoints)]
+    samplers = [
+        DatapointSampler({"depth": datapoints}, seed=seed, shard=shard, num_shards=num_shards)
+        for shard in range(num_shards)
+    ]
+    epoch_idxs = []
+    for _ in range(2):
+        idxs = []
+        for shard, sampler in enumerate(samplers):
+            num_shard_datapoints = len(range(shard, num_datapoints, num_shards))
+            idxs.extend(sampler.next_index()[1] for _ in range(num_shard_datapoints))
+        assert sorted(idxs) == list(range(num_datapoints))
+        epoch_idxs.append(idxs)
+    assert epoch_idxs[0] != epoch_idxs[1]
+
+    # a sampler created with a state continues from it:
+    sampler = DatapointSampler(dataset, seed=seed, shard=1, num_shards=2)
+    for _ in range(100):
+        sampler.next_index()
+    state = sampler.get_state()
+    sampled_indexes = [sampler.next_index() for _ in range(200)]
+    sampler = DatapointSampler(dataset, seed=seed, shard=1, num_shards=2, state=state)
+    assert [sampler.next_index() for _ in range(200)] == sampled_indexes
+
+
+def test_sampling_state(seed: int = 0, num_batches: int = 6) -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        dirpath = pathlib.Path(tmpdirname)
+        dataset = load_test_dataset(dirpath, seed=seed)
+        streaming_dataset = load_streaming_dataset(dirpath, parse_datapoint=parse_mcts_datapoint, shuffle_buffer_size=4)
+        # in-memory and streaming datapoints together:
+        dataset["depth10"] = streaming_dataset["depth10"]
+
+        device = torch.device("cpu")
+        for num_batch_workers in [0, 2]:
+            random.seed(seed)
+            ndarray_batch_iterator = make_ndarray_batch_iterator(
+                dataset, batch_size=16, num_batch_workers=num_batch_workers, prefetch_size=2
+            )
+            ndarray_batches = [next(ndarray_batch_iterator) for _ in range(num_batches)]
+            ndarray_batch_iterator.close()
+
+            # batches continue from the sampling state of a batch as if it was not interrupted:
+            sampling_state = ndarray_batches[num_batches // 2 - 1]["sampling_state"]
+            random.seed(seed + 1)
+            ndarray_batch_iterator = make_ndarray_batch_iterator(
+                dataset,
+                batch_size=16,
+                num_batch_workers=num_batch_workers,
+                prefetch_size=2,
+                sampling_state=sampling_state,
+            )
+            for ndarray_batch in ndarray_batches[num_batches // 2:]:
+                assert_batches_equal(
+                    batch_to_device(ndarray_batch, device=device),
+                    batch_to_device(next(ndarray_batch_iterator), device=device),
+                )
+            ndarray_batch_iterator.close()
+
+
+def test_batch_transfer(seed: int = 0, num_batches: int = 5) -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        dataset = load_test_dataset(pathlib.Path(tmpdirname), seed=seed)
+
+    device = torch.device("cpu")
+    random.seed(seed)
+    ndarray_batch_iterator = ndarray_batch_generator(dataset, batch_size=16)
+    ndarray_batches = [next(ndarray_batch_iterator) for _ in range(num_batches + 1)]
+    for pin_memory in [False, True]:
+        batch_transfer = BatchTransfer(iter(ndarray_batches), device=device, pin_memory=pin_memory)
+        # batches stay valid while their buffers are reused:
+        batches = [next(batch_transfer) for _ in range(num_batches)]
+        for batch, ndarray_batch in zip(batches, ndarray_batches):
+            assert batch["inputs"].dtype == torch.float32
+            assert_batches_equal(batch, batch_to_device(ndarray_batch, device=device))
+        times = batch_transfer.pop_times()
+        assert sorted(times.keys()) == ["data_wait", "device_copy", "transfer"]
+        assert batch_transfer.pop_times()["transfer"] == 0.0
+
+
+def orient_datapoint(datapoint: dict, symmetry: int) -> dict:
+    # symmetry bits applied with np.flip and transpositions:
+    oriented_datapoint = {"input": datapoint["input"], "target": dict(datapoint["target"])}
+    for key, array in [("input", datapoint["input"])] + list(datapoint["target"].items()):
+        if key == "state_value":
+            continue
+        offset = 1 if key == "input" else 0
+        if symmetry & 1:
+            array = np.flip(array, offset)
+        if symmetry & 2:
+            array = np.flip(array, offset + 1)
+        if symmetry & 4:
+            array = np.swapaxes(array, offset, offset + 1)
+        if key == "input":
+            oriented_datapoint["input"] = array
+        else:
+            oriented_datapoint["target"][key] = array
+    return oriented_datapoint
+
+
+def test_encoded_dataset(seed: int = 0) -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        random.seed(seed)
+        dirpath = pathlib.Path(tmpdirname)
+        write_mcts_dataset(dirpath=dirpath, num_games=2, num_simulations=20)
+        convert_dataset_to_binary(
+            input_dirpath=dirpath,
+            output_dirpath=dirpath / "binary",
+            parse_datapoint=parse_mcts_datapoint,
+        )
+        encode_binary_dataset(dirpath / "binary", chunk_size=10)
+        dataset = load_binary_dataset(dirpath / "binary", encoded=True)
+    arrays = next(iter(dataset.values())).arrays
+    datapoints = [datapoint for datapoints in dataset.values() for datapoint in datapoints]
+    rows = np.concatenate([datapoints.rows for datapoints in dataset.values()])
+    assert len(datapoints) > 0
+    for symmetry in range(NUM_SYMMETRIES):
+        ndarray_batch = gather_encoded_batch(
+            arrays=arrays, rows=rows, symmetries=np.full(len(rows), symmetry)
+        )
+        expected_ndarray_batch = stack_datapoints([
+            orient_datapoint(preprocessing(datapoint), symmetry) for datapoint in datapoints
+        ])
+        assert ndarray_batch["inputs"].dtype == expected_ndarray_batch["inputs"].dtype
+        assert (ndarray_batch["inputs"] == expected_ndarray_batch["inputs"]).all()
+        for key, array in ndarray_batch["targets"].items():
+            assert array.dtype == expected_ndarray_batch["targets"][key].dtype
+            assert (array == expected_ndarray_batch["targets"][key]).all()
+
+    dataset = {key: datapoints for key, datapoints in dataset.items() if len(datapoints) > 0}
+    ndarray_batch = next(ndarray_batch_generator(dataset, batch_size=16))
+    assert ndarray_batch["inputs"].shape == (16, 4, 9, 9)
+    assert ndarray_batch["targets"]["policy_mask"].sum(axis=(1, 2)).min() > 0
+
+
+def test_orient_batch(seed: int = 0) -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        dataset = load_test_dataset(pathlib.Path(tmpdirname), seed=seed)
+    datapoints = [preprocessing(datapoint) for datapoints in dataset.values() for datapoint in datapoints]
+    batch = batch_to_device(stack_datapoints(datapoints), device=torch.device("cpu"))
+
+    torch.manual_seed(seed)
+    symmetries = torch.randint(NUM_SYMMETRIES, size=(len(datapoints),))
+    oriented_batch = orient_batch(batch, symmetries=symmetries)
+    expected_batch = batch_to_device(
+        stack_datapoints([
+            orient_datapoint(datapoint, symmetry) for datapoint, symmetry in zip(datapoints, symmetries.tolist())
+        ]),
+        device=torch.device("cpu"),
+    )
+    assert_batches_equal(oriented_batch, expected_batch)
+
+    torch.manual_seed(seed)
+    assert_batches_equal(random_orientation_batch(batch), oriented_batch)
+
+
+def train_test_policy_value_net(
+    dataset: dict, training_dirpath: pathlib.Path, num_train_iters: int, resume: bool, num_batch_workers: int
+) -> PolicyValueNetwork:
+    policy_value_net = PolicyValueNetwork(num_planes=16)
+    train_policy_value_net(
+        policy_value_net=policy_value_net,
+        dataset=dataset,
+        training_dirpath=training_dirpath,
+        num_train_iters=num_train_iters,
+        batch_size=8,
+        policy_loss_type="kl_divergence",
+        policy_loss_weight=1.0,
+        action_values_loss_weight=1.0,
+        state_value_loss_weight=1.0,
+        lr_schedule={0: 1e-3, 3: 5e-4},
+        bnm_schedule={5: 0.02},
+        print_loss_iters=2,
+        save_checkpoint_iters=3,
+        automatic_mixed_precision=False,
+        num_batch_workers=num_batch_workers,
+        resume=resume,
+    )
+    return policy_value_net
+
+
+def test_resume_training(seed: int = 0) -> None:
+    with tempfile.TemporaryDirectory() as dataset_dirname:
+        dataset_dirpath = pathlib.Path(dataset_dirname)
+        dataset = load_test_dataset(dataset_dirpath, seed=seed)
+        streaming_dataset = load_streaming_dataset(
+            dataset_dirpath, parse_datapoint=parse_mcts_datapoint, shuffle_buffer_size=4
+        )
+        # streams continue from the checkpoint too:
+        dataset["depth10"] = streaming_dataset["depth10"]
+
+        for num_batch_workers in [0, 2]:
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                full_dirpath = pathlib.Path(tmpdirname) / "full"
+                full_dirpath.mkdir()
+                random.seed(seed)
+                torch.manual_seed(seed)
+                policy_value_net = train_test_policy_value_net(
+                    dataset, full_dirpath, num_train_iters=8, resume=False, num_batch_workers=num_batch_workers
+                )
+
+                # interrupted after iteration 7, the last checkpoint is from iteration 6:
+                resumed_dirpath = pathlib.Path(tmpdirname) / "resumed"
+                resumed_dirpath.mkdir()
+                random.seed(seed)
+                torch.manual_seed(seed)
+                train_test_policy_value_net(
+                    dataset, resumed_dirpath, num_train_iters=7, resume=False, num_batch_workers=num_batch_workers
+                )
+                assert torch.load(resumed_dirpath / "training_state.pt")["iteration"] == 6
+                assert (resumed_dirpath / "policy_value_net_6.pt").exists()
+                random.seed(seed + 1)
+                torch.manual_seed(seed + 1)
+                resumed_policy_value_net = train_test_policy_value_net(
+                    dataset, resumed_dirpath, num_train_iters=8, resume=True, num_batch_workers=num_batch_workers
+                )
+
+                state_dict = policy_value_net.state_dict()
+                for key, tensor in resumed_policy_value_net.state_dict().items():
+                    assert torch.equal(tensor, state_dict[key])
+                with open(full_dirpath / "loss_history.json", "r") as f:
+                    loss_history = json.load(f)
+                with open(resumed_dirpath / "loss_history.json", "r") as f:
+                    resumed_loss_history = json.load(f)
+                assert [entry["iteration"] for entry in resumed_loss_history] == [2, 4, 6, 8]
+                assert [entry["mean_loss_value"] for entry in resumed_loss_history] == [
+                    entry["mean_loss_value"] for entry in loss_history
+                ]
+
+
+if __name__ == "__main__":
+    test_prefetch_ndarray_batch_generator()
+    test_datapoint_sampler()
+    test_sampling_state()
+    test_batch_transfer()
+    test_encoded_dataset()
+    test_orient_batch()
+    test_resume_training()
@@ -0,0 +1,91 @@
+import random
+import warnings
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.tree_parallel_monte_carlo_tree_search import TreeParallelMonteCarloTreeSearch
+
+
+def test_tree_parallel_mcts(
+    seed: int = 0,
+    num_simulations: int = 1000,
+    num_workers: int = 4,
+    capacity: int = 1 << 16,
+) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    mcts = TreeParallelMonteCarloTreeSearch(
+        uttt=uttt.clone(),
+        num_simulations=num_simulations,
+        exploration_strength=1.0,
+        num_workers=num_workers,
+        capacity=capacity,
+    )
+    for _ in range(3):
+        num_unexpanded_leaves_before = mcts.tree.num_unexpanded_leaves
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter("always")
+            mcts.run()
+        # leaves are left unexpanded only once the arrays are full, with a warning:
+        num_unexpanded_leaves = mcts.tree.num_unexpanded_leaves
+        assert len(caught_warnings) == int(num_unexpanded_leaves > num_unexpanded_leaves_before)
+        evaluated_state = mcts.get_evaluated_state()
+        evaluated_actions = mcts.get_evaluated_actions()
+        assert evaluated_state["state"] == uttt.state
+        # virtual losses are fully removed after the run:
+        assert evaluated_state["num_visits"] == num_simulations
+        assert evaluated_state["num_visits"] == (
+            evaluated_state["num_wins"] + evaluated_state["num_draws"] + evaluated_state["num_losses"]
+        )
+        # leaves visited concurrently are expanded once, after the arrays filled up not at all:
+        assert sum(ea["num_visits"] for ea in evaluated_actions) <= num_simulations - 1
+        assert sorted(ea["index"] for ea in evaluated_actions) == uttt.get_legal_indexes()
+        for ea in evaluated_actions:
+            assert ea["num_visits"] == ea["num_wins"] + ea["num_draws"] + ea["num_losses"]
+        assert mcts.tree.size <= capacity
+        selected_action = mcts.select_action(evaluated_actions, "argmax")
+        uttt.execute(action=selected_action)
+        mcts.synchronize(uttt=uttt)
+
+
+def test_tree_parallel_mcts_full_capacity() -> None:
+    test_tree_parallel_mcts(seed=1, num_simulations=500, num_workers=2, capacity=1000)
+    mcts = TreeParallelMonteCarloTreeSearch(
+        uttt=UltimateTicTacToe(),
+        num_simulations=500,
+        exploration_strength=1.0,
+        num_workers=2,
+        capacity=100,
+    )
+    with warnings.catch_warnings(record=True) as caught_warnings:
+        warnings.simplefilter("always")
+        mcts.run()
+    assert mcts.tree.num_unexpanded_leaves > 0
+    assert "leaves were evaluated without expansion" in str(caught_warnings[0].message)
+
+
+def test_tree_parallel_mcts_selection_virtual_loss(seed: int = 0, virtual_loss: int = 3) -> None:
+    random.seed(seed)
+
+    mcts = TreeParallelMonteCarloTreeSearch(
+        uttt=UltimateTicTacToe(),
+        num_simulations=200,
+        exploration_strength=1.0,
+        num_workers=1,
+        virtual_loss=virtual_loss,
+    )
+    mcts.run()
+    tree = mcts.tree
+    num_visits = tree.num_visits.copy()
+    # every node of a selected path holds the virtual loss as soon as selection passed it:
+    selected_path = tree._select_leaf_node(exploration_strength=1.0)
+    assert len(selected_path) > 2
+    assert (tree.num_visits[selected_path] == num_visits[selected_path] + virtual_loss).all()
+    tree._add_virtual_loss(selected_path=selected_path, root_symbol=UltimateTicTacToe().next_symbol, sign=-1)
+    assert (tree.num_visits == num_visits).all()
+
+
+if __name__ == "__main__":
+    test_tree_parallel_mcts()
+    test_tree_parallel_mcts_full_capacity()
+    test_tree_parallel_mcts_selection_virtual_loss()
@@ -276,7 +276,69 @@ def test_uttts(num_iters: int = 200, verbose: bool = False) -> None:
     assert (num_X_wins + num_O_wins + num_draws) == num_iters
 
 
+def test_uttt_legal_tracking(seed: int = 0) -> None:
+    random.seed(seed)
+    rng = random.Random(seed)
+
+    uttt = UltimateTicTacToe()
+    num_undos = 0
+    while not uttt.is_terminated():
+        legal_indexes = uttt.get_legal_indexes()
+        legal_mask = uttt.legal_mask()
+        assert uttt.num_legal() == len(legal_indexes)
+        assert [i for i in range(81) if legal_mask >> i & 1] == legal_indexes
+        assert uttt.random_legal_index(rng) in legal_indexes
+        assert UltimateTicTacToe(state=uttt.state.copy()).num_legal() == len(legal_indexes)
+        uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=True)
+        if num_undos < 3 and random.random() < 0.2:
+            uttt.undo()
+            num_undos += 1
+
+    assert uttt.num_legal() == 0
+    assert uttt.legal_mask() == 0
+    with pytest.raises(UltimateTicTacToeError) as e:
+        uttt.random_legal_index(rng)
+    assert str(e.value) == "supergame is terminated"
+
+
+def test_uttt_legal_trackings(num_iters: int = 100) -> None:
+    for i in range(num_iters):
+        test_uttt_legal_tracking(seed=i)
+
+
+def test_uttt_undo(seed: int = 0) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+
+    with pytest.raises(UltimateTicTacToeError) as e:
+        uttt.undo()
+    assert str(e.value) == "no action to undo"
+
+    history = []
+    while not uttt.is_terminated():
+        history.append((uttt.state.copy(), uttt.get_legal_indexes()))
+        selected_action = random.choice(uttt.get_legal_actions())
+        uttt.execute(action=selected_action, verify=True)
+
+    while history:
+        state, legal_indexes = history.pop()
+        uttt.undo()
+        assert uttt.state == state
+        assert uttt.get_legal_indexes() == legal_indexes
+        assert uttt.get_legal_indexes() == UltimateTicTacToe(state=state).get_legal_indexes()
+
+    assert uttt.is_equal_to(UltimateTicTacToe())
+
+
+def test_uttt_undos(num_iters: int = 100) -> None:
+    for i in range(num_iters):
+        test_uttt_undo(seed=i)
+
+
 if __name__ == "__main__":
     test_uttt_exceptions()
     test_uttt(seed=123456, verbose=True)
     test_uttts(num_iters=1000, verbose=True)
+    test_uttt_legal_trackings(num_iters=1000)
+    test_uttt_undos(num_iters=1000)
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from utttpy.game.action import Action
+from utttpy.game.constants import X_STATE_VALUE, O_STATE_VALUE
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe, UltimateTicTacToeError
+from utttpy.game.ultimate_tic_tac_toe_bitboard import UltimateTicTacToeBitboard
+from utttpy.selfplay.evaluation_uttt_states import EVALUATION_UTTT_STATES
+
+
+def test_uttt_bitboard_exceptions() -> None:
+    uttt = UltimateTicTacToeBitboard()
+
+    with pytest.raises(UltimateTicTacToeError) as e:
+        uttt.execute(action=Action(symbol=X_STATE_VALUE, index=81), verify=True)
+    assert str(e.value) == "Illegal Action(symbol=X, index=81) - index outside the valid range"
+
+    with pytest.raises(UltimateTicTacToeError) as e:
+        uttt.execute(action=Action(symbol=O_STATE_VALUE, index=40), verify=True)
+    assert str(e.value) == "Illegal Action(symbol=O, index=40) - next move belongs to X"
+
+    uttt.execute(action=Action(symbol=X_STATE_VALUE, index=40), verify=True)
+
+    uttt.execute(action=Action(symbol=O_STATE_VALUE, index=36), verify=True)
+
+    with pytest.raises(UltimateTicTacToeError) as e:
+        uttt.execute(action=Action(symbol=X_STATE_VALUE, index=35), verify=True)
+    assert str(e.value) == "Illegal Action(symbol=X, index=35) - violated constraint=0"
+
+    uttt.execute(action=Action(symbol=X_STATE_VALUE, index=0), verify=True)
+
+    with pytest.raises(UltimateTicTacToeError) as e:
+        uttt.execute(action=Action(symbol=O_STATE_VALUE, index=0), verify=True)
+    assert str(e.value) == "Illegal Action(symbol=O, index=0) - index is already taken"
+
+
+def test_uttt_bitboard_state_conversion() -> None:
+    for evaluation_uttt_state in EVALUATION_UTTT_STATES:
+        state = bytearray(map(int, evaluation_uttt_state))
+        uttt = UltimateTicTacToe(state=state.copy())
+        uttt_bitboard = UltimateTicTacToeBitboard(state=state.copy())
+        assert uttt_bitboard.state == state
+        assert uttt_bitboard.get_legal_indexes() == uttt.get_legal_indexes()
+        assert str(uttt_bitboard) == str(uttt).replace(
+            "UltimateTicTacToe(", "UltimateTicTacToeBitboard(", 1
+        )
+
+
+def test_uttt_bitboard(seed: int = 0) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    uttt_bitboard = UltimateTicTacToeBitboard()
+
+    while not uttt.is_terminated():
+        assert not uttt_bitboard.is_terminated()
+        assert uttt_bitboard.next_symbol == uttt.next_symbol
+        assert uttt_bitboard.constraint == uttt.constraint
+        legal_indexes = uttt.get_legal_indexes()
+        assert uttt_bitboard.get_legal_indexes() == legal_indexes
+        action = Action(symbol=uttt.next_symbol, index=random.choice(legal_indexes))
+        _uttt_bitboard_before = uttt_bitboard.clone()
+        uttt.execute(action=action, verify=True)
+        uttt_bitboard.execute(action=action, verify=True)
+        assert uttt_bitboard.state == uttt.state
+        assert not _uttt_bitboard_before.is_equal_to(uttt_bitboard)
+        assert UltimateTicTacToeBitboard(state=uttt.state.copy()).is_equal_to(uttt_bitboard)
+
+    assert uttt_bitboard.is_terminated()
+    assert uttt_bitboard.result == uttt.result
+    assert uttt_bitboard.get_legal_indexes() == []
+
+
+def test_uttt_bitboards(num_iters: int = 200) -> None:
+    for i in range(num_iters):
+        test_uttt_bitboard(seed=i)
+
+
+if __name__ == "__main__":
+    test_uttt_bitboard_exceptions()
+    test_uttt_bitboard_state_conversion()
+    test_uttt_bitboards(num_iters=1000)
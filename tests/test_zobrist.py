@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe, UltimateTicTacToeError
+from utttpy.game.zobrist import zobrist_hash
+from utttpy.selfplay.evaluation_uttt_states import EVALUATION_UTTT_STATES
+
+
+def test_zobrist_hash(seed: int = 0) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    hashes = [uttt.hash]
+    while not uttt.is_terminated():
+        uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=True)
+        assert uttt.hash == zobrist_hash(uttt.state)
+        assert uttt.hash == uttt.clone().hash
+        assert uttt.hash not in hashes
+        hashes.append(uttt.hash)
+
+    while hashes:
+        assert uttt.hash == hashes.pop()
+        if hashes:
+            uttt.undo()
+
+
+def test_zobrist_hash_without_undo(seed: int = 0) -> None:
+    random.seed(seed)
+
+    uttt = UltimateTicTacToe()
+    uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=True)
+    while not uttt.is_terminated():
+        record_undo = random.random() < 0.5
+        uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=True, record_undo=record_undo)
+        if random.random() < 0.5:
+            # the hash is recomputed after actions executed without record_undo:
+            assert uttt.hash == zobrist_hash(uttt.state)
+        if not record_undo:
+            # actions executed before cannot be undone:
+            with pytest.raises(UltimateTicTacToeError):
+                uttt.undo()
+    assert uttt.hash == zobrist_hash(uttt.state)
+
+
+def test_zobrist_hash_collisions(num_games: int = 200) -> None:
+    states = {}
+
+    def check(uttt: UltimateTicTacToe) -> None:
+        state = bytes(uttt.state)
+        assert states.setdefault(uttt.hash, state) == state
+
+    for evaluation_uttt_state in EVALUATION_UTTT_STATES:
+        uttt = UltimateTicTacToe(state=bytearray(map(int, evaluation_uttt_state)))
+        check(uttt)
+        random.seed(len(states))
+        while not uttt.is_terminated():
+            uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=False)
+            check(uttt)
+
+    for i in range(num_games):
+        random.seed(i)
+        uttt = UltimateTicTacToe()
+        while not uttt.is_terminated():
+            uttt.execute(action=random.choice(uttt.get_legal_actions()), verify=False)
+            check(uttt)
+
+    assert len(states) > num_games
+
+
+if __name__ == "__main__":
+    test_zobrist_hash(seed=0)
+    test_zobrist_hash_without_undo(seed=0)
+    test_zobrist_hash_collisions(num_games=10000)
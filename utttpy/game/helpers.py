@@ -1,8 +1,17 @@
 from functools import lru_cache
+from typing import Optional
 
 import numpy as np
 
-from utttpy.game.constants import X_STATE_VALUE, O_STATE_VALUE
+from utttpy.game.constants import (
+    STATE_SIZE,
+    NEXT_SYMBOL_STATE_INDEX,
+    CONSTRAINT_STATE_INDEX,
+    UTTT_RESULT_STATE_INDEX,
+    X_STATE_VALUE,
+    O_STATE_VALUE,
+    UNCONSTRAINED_STATE_VALUE,
+)
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
 
 
@@ -18,29 +27,63 @@ def col_index(s_i: int) -> int:
     return 3 * ((s_i // 9) % 3) + s_i % 3
 
 
+# STATE_INDEXES_9x9[9 * row + col] is the state index [0, 1, ... 80] at row and col on the 9x9 board:
+STATE_INDEXES_9x9 = np.array(
+    sorted(range(81), key=lambda s_i: 9 * row_index(s_i) + col_index(s_i)), dtype=np.intp
+)
+
+# SUBGAMES_9x9[9 * row + col] is the subgame [0, 1, ... 8] at row and col on the 9x9 board:
+SUBGAMES_9x9 = STATE_INDEXES_9x9 // 9
+
+# PLANES_4x8[next_symbol][plane, code] are the values of the planes of get_state_ndarray_4x9x9
+# at a cell with code = state value of the cell + 4 * (1 if the cell is a legal move else 0):
+PLANES_4x8 = np.zeros(shape=(3, 4, 8), dtype=np.int8)
+for _next_symbol, _opponent_symbol, _fill in [(X_STATE_VALUE, O_STATE_VALUE, 1), (O_STATE_VALUE, X_STATE_VALUE, -1)]:
+    for _code in range(8):
+        PLANES_4x8[_next_symbol, 0, _code] = _code & 3 == _next_symbol
+        PLANES_4x8[_next_symbol, 1, _code] = _code & 3 == _opponent_symbol
+        PLANES_4x8[_next_symbol, 2, _code] = _fill
+        PLANES_4x8[_next_symbol, 3, _code] = _code >> 2
+
+# maps the binary digits of a legal mask to the legal move bit of a cell code in PLANES_4x8:
+LEGAL_BITS_TO_CODES = bytes.maketrans(b"01", b"\x00\x04")
+
+
 def get_state_ndarray_4x9x9(uttt: UltimateTicTacToe) -> np.ndarray:
-    array = np.zeros(shape=(4, 9, 9), dtype=np.int8)
-
-    # 0: current player's symbols
-    # 1: opponent's symbols
-    if uttt.is_next_symbol_X():
-        x_i, o_i = 0, 1
-    elif uttt.is_next_symbol_O():
-        x_i, o_i = 1, 0
-    for s_i, s_v in enumerate(uttt.state[0:81]):
-        if s_v == X_STATE_VALUE:
-            array[x_i, row_index(s_i), col_index(s_i)] = 1
-        elif s_v == O_STATE_VALUE:
-            array[o_i, row_index(s_i), col_index(s_i)] = 1
-
-    # 2: fill 1 or -1 depending on the current player's symbol (X or O)
-    if uttt.is_next_symbol_X():
-        array[2].fill(1)
-    elif uttt.is_next_symbol_O():
-        array[2].fill(-1)
-
-    # 3: current player's legal moves
-    for l_i in uttt.get_legal_indexes():
-        array[3, row_index(l_i), col_index(l_i)] = 1
-
-    return array
+    """Network input planes of the state:
+    0: current player's symbols
+    1: opponent's symbols
+    2: filled with 1 or -1 depending on the current player's symbol (X or O)
+    3: current player's legal moves
+    """
+    # legal mask bits, most significant first, looked up as 4 (legal) or 0 per cell:
+    legal_codes = format(uttt.legal_mask(), "081b").encode().translate(LEGAL_BITS_TO_CODES)
+    codes = int.from_bytes(uttt.state[0:81], "little") | int.from_bytes(legal_codes, "big")
+    codes = np.frombuffer(codes.to_bytes(81, "little"), dtype=np.uint8)[STATE_INDEXES_9x9]
+    return PLANES_4x8[uttt.state[NEXT_SYMBOL_STATE_INDEX]][:, codes].reshape(4, 9, 9)
+
+
+def get_states_ndarray_Nx4x9x9(states: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """get_state_ndarray_4x9x9 of each row of the Nx93 uint8 states array.
+
+    Legal moves are computed from cells, subgame results, constraint and result of the state.
+    Planes are written into out if given (any dtype, shape Nx4x9x9).
+    """
+    if states.ndim != 2 or states.shape[1] != STATE_SIZE:
+        raise ValueError(f"invalid states.shape={states.shape}")
+    num_states = states.shape[0]
+    if out is None:
+        out = np.empty(shape=(num_states, 4, 9, 9), dtype=np.int8)
+    elif out.shape != (num_states, 4, 9, 9):
+        raise ValueError(f"invalid out.shape={out.shape}")
+    cells = states[:, STATE_INDEXES_9x9]
+    next_symbols = states[:, NEXT_SYMBOL_STATE_INDEX:NEXT_SYMBOL_STATE_INDEX + 1]
+    constraints = states[:, CONSTRAINT_STATE_INDEX:CONSTRAINT_STATE_INDEX + 1]
+    is_legal = (cells == 0) & (states[:, 81:90] == 0)[:, SUBGAMES_9x9]
+    is_legal &= (constraints == UNCONSTRAINED_STATE_VALUE) | (constraints == SUBGAMES_9x9)
+    is_legal &= states[:, UTTT_RESULT_STATE_INDEX:UTTT_RESULT_STATE_INDEX + 1] == 0
+    out[:, 0] = (cells == next_symbols).reshape(num_states, 9, 9)
+    out[:, 1] = (cells == X_STATE_VALUE + O_STATE_VALUE - next_symbols).reshape(num_states, 9, 9)
+    out[:, 2] = np.where(next_symbols == X_STATE_VALUE, 1, -1).reshape(num_states, 1, 1)
+    out[:, 3] = is_legal.reshape(num_states, 9, 9)
+    return out
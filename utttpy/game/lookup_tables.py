@@ -0,0 +1,44 @@
+# 3x3 board cells are numbered the same way as in the state (row-major):
+#   0 1 2
+#   3 4 5
+#   6 7 8
+# and a 3x3 board occupancy is a 9-bit mask with bit i set if cell i is occupied.
+
+FULL_MASK = 0b111111111
+
+WINNING_LINES = (
+    (0, 1, 2),
+    (3, 4, 5),
+    (6, 7, 8),
+    (0, 3, 6),
+    (1, 4, 7),
+    (2, 5, 8),
+    (0, 4, 8),
+    (2, 4, 6),
+)
+
+WINNING_LINE_MASKS = tuple(
+    sum(1 << i for i in winning_line) for winning_line in WINNING_LINES
+)
+
+# IS_WINNING_MASK[mask] is True if symbols placed on mask contain a winning line:
+IS_WINNING_MASK = tuple(
+    any(mask & line_mask == line_mask for line_mask in WINNING_LINE_MASKS)
+    for mask in range(FULL_MASK + 1)
+)
+
+# MASK_INDEXES[mask] is a tuple of cells [0, 1, ... 8] set in mask:
+MASK_INDEXES = tuple(
+    tuple(i for i in range(9) if mask >> i & 1)
+    for mask in range(FULL_MASK + 1)
+)
+
+# SUBGAME_EMPTY_INDEXES[subgame][taken_mask] is a tuple of state indexes [0, 1, ... 80]
+# of the cells not set in taken_mask on a given subgame [0, 1, ... 8]:
+SUBGAME_EMPTY_INDEXES = tuple(
+    tuple(
+        tuple(subgame * 9 + i for i in MASK_INDEXES[FULL_MASK ^ taken_mask])
+        for taken_mask in range(FULL_MASK + 1)
+    )
+    for subgame in range(9)
+)
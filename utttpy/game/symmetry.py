@@ -0,0 +1,87 @@
+from typing import Tuple
+
+import numpy as np
+
+from utttpy.game.constants import (
+    STATE_SIZE,
+    CONSTRAINT_STATE_INDEX,
+    UNCONSTRAINED_STATE_VALUE,
+)
+
+# Symmetries of the 9x9 board are numbered with 3 bits applied in order:
+#   bit 0: flip rows, bit 1: flip columns, bit 2: transpose.
+# Every symmetry of the 9x9 board maps subgames onto subgames,
+# so it acts on the 3x3 supergame with the same bits.
+NUM_SYMMETRIES = 8
+
+
+def _transform_coords(row: int, col: int, size: int, symmetry: int) -> Tuple[int, int]:
+    if symmetry & 1:
+        row = size - 1 - row
+    if symmetry & 2:
+        col = size - 1 - col
+    if symmetry & 4:
+        row, col = col, row
+    return row, col
+
+
+def _transform_state_index(s_i: int, symmetry: int) -> int:
+    subgame, cell = divmod(s_i, 9)
+    row, col = _transform_coords(3 * (subgame // 3) + cell // 3, 3 * (subgame % 3) + cell % 3, 9, symmetry)
+    return 9 * (3 * (row // 3) + col // 3) + 3 * (row % 3) + col % 3
+
+
+def _transform_subgame(subgame: int, symmetry: int) -> int:
+    row, col = _transform_coords(subgame // 3, subgame % 3, 3, symmetry)
+    return 3 * row + col
+
+
+# SYMMETRY_INDEX_MAPS[symmetry][s_i] is the state index [0, 1, ... 80] that s_i is mapped to:
+SYMMETRY_INDEX_MAPS = tuple(
+    tuple(_transform_state_index(s_i, symmetry) for s_i in range(81))
+    for symmetry in range(NUM_SYMMETRIES)
+)
+
+# SYMMETRY_SUBGAME_MAPS[symmetry][subgame] is the subgame [0, 1, ... 8] that subgame is mapped to,
+# UNCONSTRAINED_STATE_VALUE is mapped to itself, so constraints are mapped with it too:
+SYMMETRY_SUBGAME_MAPS = tuple(
+    tuple(_transform_subgame(subgame, symmetry) for subgame in range(9)) + (UNCONSTRAINED_STATE_VALUE,)
+    for symmetry in range(NUM_SYMMETRIES)
+)
+
+# SYMMETRY_GATHER_POSITIONS_9x9[symmetry] gathers flat positions (9 * row + col) of the 9x9 board:
+#   transformed_board.reshape(81) = board.reshape(81)[SYMMETRY_GATHER_POSITIONS_9x9[symmetry]]
+SYMMETRY_GATHER_POSITIONS_9x9 = np.zeros(shape=(NUM_SYMMETRIES, 81), dtype=np.intp)
+for _symmetry in range(NUM_SYMMETRIES):
+    for _row in range(9):
+        for _col in range(9):
+            _transformed_row, _transformed_col = _transform_coords(_row, _col, 9, _symmetry)
+            SYMMETRY_GATHER_POSITIONS_9x9[_symmetry, 9 * _transformed_row + _transformed_col] = 9 * _row + _col
+
+# transformed_state = state[_STATE_GATHER_INDEXES[symmetry]] up to the constraint value:
+_STATE_GATHER_INDEXES = np.tile(np.arange(STATE_SIZE), (NUM_SYMMETRIES, 1))
+for _symmetry in range(NUM_SYMMETRIES):
+    for _s_i in range(81):
+        _STATE_GATHER_INDEXES[_symmetry, SYMMETRY_INDEX_MAPS[_symmetry][_s_i]] = _s_i
+    for _subgame in range(9):
+        _STATE_GATHER_INDEXES[_symmetry, 81 + SYMMETRY_SUBGAME_MAPS[_symmetry][_subgame]] = 81 + _subgame
+_CONSTRAINT_MAPS = np.array(SYMMETRY_SUBGAME_MAPS, dtype=np.uint8)
+
+
+def transform_state(state: bytearray, symmetry: int) -> bytearray:
+    """State with cells, subgame results and constraint mapped by the symmetry."""
+    transformed_state = np.frombuffer(state, dtype=np.uint8)[_STATE_GATHER_INDEXES[symmetry]]
+    transformed_state[CONSTRAINT_STATE_INDEX] = _CONSTRAINT_MAPS[symmetry, state[CONSTRAINT_STATE_INDEX]]
+    return bytearray(transformed_state.tobytes())
+
+
+def canonicalize_state(state: bytearray) -> Tuple[bytearray, int]:
+    """Canonical representative of the state among its symmetries and the symmetry mapping to it.
+
+    The canonical representative is the lexicographically smallest transformed state.
+    """
+    transformed_states = np.frombuffer(state, dtype=np.uint8)[_STATE_GATHER_INDEXES]
+    transformed_states[:, CONSTRAINT_STATE_INDEX] = _CONSTRAINT_MAPS[:, state[CONSTRAINT_STATE_INDEX]]
+    transformed_states = [transformed_state.tobytes() for transformed_state in transformed_states]
+    symmetry = min(range(NUM_SYMMETRIES), key=transformed_states.__getitem__)
+    return bytearray(transformed_states[symmetry]), symmetry
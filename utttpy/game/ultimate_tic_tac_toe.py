@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import random
 from typing import List, Optional
 
 from utttpy.game.action import Action
@@ -13,6 +14,18 @@ from utttpy.game.constants import (
     DRAW_STATE_VALUE,
     UNCONSTRAINED_STATE_VALUE,
 )
+from utttpy.game.lookup_tables import (
+    FULL_MASK,
+    IS_WINNING_MASK,
+    MASK_INDEXES,
+    SUBGAME_EMPTY_INDEXES,
+)
+from utttpy.game.zobrist import (
+    ZOBRIST_CELLS,
+    ZOBRIST_NEXT_SYMBOL_O,
+    ZOBRIST_CONSTRAINTS,
+    zobrist_hash,
+)
 
 
 class UltimateTicTacToe:
@@ -24,26 +37,91 @@ class UltimateTicTacToe:
             self.state = bytearray(STATE_SIZE)
             self.state[NEXT_SYMBOL_STATE_INDEX] = X_STATE_VALUE
             self.state[CONSTRAINT_STATE_INDEX] = UNCONSTRAINED_STATE_VALUE
+        self._init_masks()
+        self._hash = zobrist_hash(self.state)
+        self._undo_stack = []
 
     def clone(self) -> UltimateTicTacToe:
-        return UltimateTicTacToe(state=self.state.copy())
+        uttt = UltimateTicTacToe.__new__(UltimateTicTacToe)
+        uttt.state = self.state.copy()
+        uttt._symbol_masks = {
+            X_STATE_VALUE: self._symbol_masks[X_STATE_VALUE].copy(),
+            O_STATE_VALUE: self._symbol_masks[O_STATE_VALUE].copy(),
+        }
+        uttt._taken_masks = self._taken_masks.copy()
+        uttt._num_open_cells = self._num_open_cells
+        uttt._hash = self._hash
+        uttt._undo_stack = []
+        return uttt
 
     def is_equal_to(self, uttt: UltimateTicTacToe) -> bool:
         return self.state == uttt.state
 
-    def execute(self, action: Action, verify: bool = True) -> None:
+    def execute(self, action: Action, verify: bool = True, record_undo: bool = True) -> None:
+        """Executes action. Without record_undo (e.g. in random playouts), no action
+        executed so far can be undone and the hash is recomputed only when read.
+        """
         if verify:
             if self.is_terminated():
                 raise UltimateTicTacToeError("supergame is terminated")
             self._verify_state()
             self._verify_action(action=action)
+        constraint = self.state[CONSTRAINT_STATE_INDEX]
+        if record_undo:
+            self._undo_stack.append((
+                action.index,
+                constraint,
+                self.state[81 + action.index // 9],
+                self.state[UTTT_RESULT_STATE_INDEX],
+            ))
+        elif self._undo_stack:
+            self._undo_stack.clear()
         self.state[action.index] = action.symbol
+        self._symbol_masks[action.symbol][action.index // 9] |= 1 << (action.index % 9)
+        self._taken_masks[action.index // 9] |= 1 << (action.index % 9)
+        self._num_open_cells -= 1
         self._update_supergame_result(symbol=action.symbol, index=action.index)
         self._toggle_next_symbol()
         self._set_next_constraint(index=action.index)
+        if not record_undo:
+            self._hash = None
+        elif self._hash is not None:
+            self._hash ^= (
+                ZOBRIST_CELLS[action.symbol][action.index] ^
+                ZOBRIST_NEXT_SYMBOL_O ^
+                ZOBRIST_CONSTRAINTS[constraint] ^
+                ZOBRIST_CONSTRAINTS[self.state[CONSTRAINT_STATE_INDEX]]
+            )
         if verify:
             self._verify_state()
 
+    def undo(self) -> None:
+        """Reverts the last executed action."""
+        if not self._undo_stack:
+            raise UltimateTicTacToeError("no action to undo")
+        index, constraint, subgame_result, result = self._undo_stack.pop()
+        subgame = index // 9
+        symbol = self.state[index]
+        self.state[index] = 0
+        self._symbol_masks[symbol][subgame] &= ~(1 << (index % 9))
+        self._taken_masks[subgame] &= ~(1 << (index % 9))
+        self._num_open_cells += 1
+        if self.state[81 + subgame] != subgame_result:
+            self.state[81 + subgame] = subgame_result
+            self._symbol_masks[symbol][9] &= ~(1 << subgame)
+            self._taken_masks[9] &= ~(1 << subgame)
+            self._num_open_cells += len(SUBGAME_EMPTY_INDEXES[subgame][self._taken_masks[subgame]]) - 1
+        if self._hash is not None:
+            self._hash ^= (
+                ZOBRIST_CELLS[symbol][index] ^
+                ZOBRIST_NEXT_SYMBOL_O ^
+                ZOBRIST_CONSTRAINTS[self.state[CONSTRAINT_STATE_INDEX]] ^
+                ZOBRIST_CONSTRAINTS[constraint]
+            )
+        self.state[NEXT_SYMBOL_STATE_INDEX] = symbol
+        self.state[CONSTRAINT_STATE_INDEX] = constraint
+        self.state[UTTT_RESULT_STATE_INDEX] = result
+
     def get_legal_actions(self) -> List[Action]:
         return [
             Action(symbol=self.next_symbol, index=legal_index)
@@ -55,13 +133,52 @@ class UltimateTicTacToe:
             return []
         if self.is_unconstrained():
             indexes = []
-            for i, s in enumerate(self.state[81:90]):
-                if not s:
-                    indexes.extend(self._get_empty_indexes(subgame=i))
+            for subgame in MASK_INDEXES[FULL_MASK ^ self._taken_masks[9]]:
+                indexes.extend(SUBGAME_EMPTY_INDEXES[subgame][self._taken_masks[subgame]])
         else:
             indexes = self._get_empty_indexes(subgame=self.constraint)
         return indexes
 
+    def legal_mask(self) -> int:
+        """81-bit mask with bit i set if state index i is a legal move."""
+        if self.is_terminated():
+            return 0
+        if self.is_unconstrained():
+            mask = 0
+            for subgame in MASK_INDEXES[FULL_MASK ^ self._taken_masks[9]]:
+                mask |= (FULL_MASK ^ self._taken_masks[subgame]) << (subgame * 9)
+            return mask
+        return (FULL_MASK ^ self._taken_masks[self.constraint]) << (self.constraint * 9)
+
+    def num_legal(self) -> int:
+        if self.is_terminated():
+            return 0
+        if self.is_unconstrained():
+            return self._num_open_cells
+        return len(SUBGAME_EMPTY_INDEXES[self.constraint][self._taken_masks[self.constraint]])
+
+    def random_legal_index(self, rng: Optional[random.Random] = None) -> int:
+        """Uniformly random legal index drawn without building the list of legal indexes."""
+        if rng is None:
+            rng = random
+        if self.is_terminated():
+            raise UltimateTicTacToeError("supergame is terminated")
+        if self.is_unconstrained():
+            k = rng.randrange(self._num_open_cells)
+            for subgame in MASK_INDEXES[FULL_MASK ^ self._taken_masks[9]]:
+                empty_indexes = SUBGAME_EMPTY_INDEXES[subgame][self._taken_masks[subgame]]
+                if k < len(empty_indexes):
+                    return empty_indexes[k]
+                k -= len(empty_indexes)
+        return rng.choice(SUBGAME_EMPTY_INDEXES[self.constraint][self._taken_masks[self.constraint]])
+
+    @property
+    def hash(self) -> int:
+        """64-bit Zobrist hash of cells, next symbol and constraint."""
+        if self._hash is None:
+            self._hash = zobrist_hash(self.state)
+        return self._hash
+
     @property
     def next_symbol(self) -> int:
         return self.state[NEXT_SYMBOL_STATE_INDEX]
@@ -98,11 +215,24 @@ class UltimateTicTacToe:
     def is_result_draw(self) -> bool:
         return self.result == DRAW_STATE_VALUE
 
+    def _init_masks(self) -> None:
+        # 9-bit masks per subgame [0, 1, ... 8] and supergame [9] maintained by execute:
+        self._symbol_masks = {X_STATE_VALUE: [0] * 10, O_STATE_VALUE: [0] * 10}
+        self._taken_masks = [0] * 10
+        for index, value in enumerate(self.state[0:90]):
+            if value:
+                subgame, cell = divmod(index, 9)
+                if value in self._symbol_masks:
+                    self._symbol_masks[value][subgame] |= 1 << cell
+                self._taken_masks[subgame] |= 1 << cell
+        # number of empty cells in not terminated subgames:
+        self._num_open_cells = sum(
+            len(SUBGAME_EMPTY_INDEXES[subgame][self._taken_masks[subgame]])
+            for subgame in MASK_INDEXES[FULL_MASK ^ self._taken_masks[9]]
+        )
+
     def _get_empty_indexes(self, subgame: int) -> List[int]:
-        offset = subgame * 9
-        return [
-            i + offset for i, s in enumerate(self.state[offset : offset + 9]) if not s
-        ]
+        return list(SUBGAME_EMPTY_INDEXES[subgame][self._taken_masks[subgame]])
 
     def _is_winning_position(self, symbol: int, subgame: int) -> bool:
         state = self.state
@@ -142,16 +272,20 @@ class UltimateTicTacToe:
     def _update_supergame_result(self, symbol: int, index: int) -> None:
         supergame_updated = False
         subgame = index // 9
-        if self._is_winning_position(symbol=symbol, subgame=subgame):
+        symbol_masks = self._symbol_masks[symbol]
+        if IS_WINNING_MASK[symbol_masks[subgame]]:
             self.state[81 + subgame] = symbol
+            symbol_masks[9] |= 1 << subgame
             supergame_updated = True
-        elif self._is_full(subgame=subgame):
+        elif self._taken_masks[subgame] == FULL_MASK:
             self.state[81 + subgame] = DRAW_STATE_VALUE
             supergame_updated = True
         if supergame_updated:
-            if self._is_winning_position(symbol=symbol, subgame=9):
+            self._taken_masks[9] |= 1 << subgame
+            self._num_open_cells -= len(SUBGAME_EMPTY_INDEXES[subgame][self._taken_masks[subgame]])
+            if IS_WINNING_MASK[symbol_masks[9]]:
                 self.state[UTTT_RESULT_STATE_INDEX] = symbol
-            elif self._is_full(subgame=9):
+            elif self._taken_masks[9] == FULL_MASK:
                 self.state[UTTT_RESULT_STATE_INDEX] = DRAW_STATE_VALUE
 
     def _toggle_next_symbol(self) -> None:
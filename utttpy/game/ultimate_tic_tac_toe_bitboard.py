@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from utttpy.game.action import Action
+from utttpy.game.constants import (
+    STATE_SIZE,
+    NEXT_SYMBOL_STATE_INDEX,
+    CONSTRAINT_STATE_INDEX,
+    UTTT_RESULT_STATE_INDEX,
+    X_STATE_VALUE,
+    O_STATE_VALUE,
+    DRAW_STATE_VALUE,
+    UNCONSTRAINED_STATE_VALUE,
+)
+from utttpy.game.lookup_tables import (
+    FULL_MASK,
+    IS_WINNING_MASK,
+    MASK_INDEXES,
+    SUBGAME_EMPTY_INDEXES,
+)
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe, UltimateTicTacToeError
+
+
+class UltimateTicTacToeBitboard:
+    """UltimateTicTacToe with subgames and supergame stored as 9-bit masks.
+
+    Public API is the same as in UltimateTicTacToe and the 93-byte state
+    can be converted back and forth with `UltimateTicTacToeBitboard(state=...)`
+    and the `state` property.
+    """
+
+    def __init__(self, state: Optional[bytearray] = None):
+        self.x_masks = [0] * 9
+        self.o_masks = [0] * 9
+        self.supergame_x_mask = 0
+        self.supergame_o_mask = 0
+        self.supergame_draw_mask = 0
+        self.next_symbol = X_STATE_VALUE
+        self.constraint = UNCONSTRAINED_STATE_VALUE
+        self.result = 0
+        if state:
+            self._load_state(state=state)
+
+    @property
+    def state(self) -> bytearray:
+        state = bytearray(STATE_SIZE)
+        for subgame in range(9):
+            offset = subgame * 9
+            for i in MASK_INDEXES[self.x_masks[subgame]]:
+                state[offset + i] = X_STATE_VALUE
+            for i in MASK_INDEXES[self.o_masks[subgame]]:
+                state[offset + i] = O_STATE_VALUE
+        for i in MASK_INDEXES[self.supergame_x_mask]:
+            state[81 + i] = X_STATE_VALUE
+        for i in MASK_INDEXES[self.supergame_o_mask]:
+            state[81 + i] = O_STATE_VALUE
+        for i in MASK_INDEXES[self.supergame_draw_mask]:
+            state[81 + i] = DRAW_STATE_VALUE
+        state[NEXT_SYMBOL_STATE_INDEX] = self.next_symbol
+        state[CONSTRAINT_STATE_INDEX] = self.constraint
+        state[UTTT_RESULT_STATE_INDEX] = self.result
+        return state
+
+    def clone(self) -> UltimateTicTacToeBitboard:
+        uttt = UltimateTicTacToeBitboard.__new__(UltimateTicTacToeBitboard)
+        uttt.x_masks = self.x_masks.copy()
+        uttt.o_masks = self.o_masks.copy()
+        uttt.supergame_x_mask = self.supergame_x_mask
+        uttt.supergame_o_mask = self.supergame_o_mask
+        uttt.supergame_draw_mask = self.supergame_draw_mask
+        uttt.next_symbol = self.next_symbol
+        uttt.constraint = self.constraint
+        uttt.result = self.result
+        return uttt
+
+    def is_equal_to(self, uttt: UltimateTicTacToeBitboard) -> bool:
+        return (
+            self.x_masks == uttt.x_masks and
+            self.o_masks == uttt.o_masks and
+            self.supergame_x_mask == uttt.supergame_x_mask and
+            self.supergame_o_mask == uttt.supergame_o_mask and
+            self.supergame_draw_mask == uttt.supergame_draw_mask and
+            self.next_symbol == uttt.next_symbol and
+            self.constraint == uttt.constraint and
+            self.result == uttt.result
+        )
+
+    def execute(self, action: Action, verify: bool = True) -> None:
+        if verify:
+            if self.is_terminated():
+                raise UltimateTicTacToeError("supergame is terminated")
+            self._verify_state()
+            self._verify_action(action=action)
+        symbol = action.symbol
+        subgame = action.index // 9
+        cell = action.index % 9
+        if symbol == X_STATE_VALUE:
+            self.x_masks[subgame] |= 1 << cell
+            self.next_symbol = O_STATE_VALUE
+        else:
+            self.o_masks[subgame] |= 1 << cell
+            self.next_symbol = X_STATE_VALUE
+        self._update_supergame_result(symbol=symbol, subgame=subgame)
+        self._set_next_constraint(cell=cell)
+        if verify:
+            self._verify_state()
+
+    def get_legal_actions(self) -> List[Action]:
+        return [
+            Action(symbol=self.next_symbol, index=legal_index)
+            for legal_index in self.get_legal_indexes()
+        ]
+
+    def get_legal_indexes(self) -> List[int]:
+        if self.result:
+            return []
+        if self.constraint == UNCONSTRAINED_STATE_VALUE:
+            indexes = []
+            supergame_mask = self._supergame_mask()
+            for subgame in MASK_INDEXES[FULL_MASK ^ supergame_mask]:
+                indexes.extend(self._get_empty_indexes(subgame=subgame))
+        else:
+            indexes = self._get_empty_indexes(subgame=self.constraint)
+        return indexes
+
+    def is_next_symbol_X(self) -> bool:
+        return self.next_symbol == X_STATE_VALUE
+
+    def is_next_symbol_O(self) -> bool:
+        return self.next_symbol == O_STATE_VALUE
+
+    def is_constrained(self) -> bool:
+        return 0 <= self.constraint < 9
+
+    def is_unconstrained(self) -> bool:
+        return self.constraint == UNCONSTRAINED_STATE_VALUE
+
+    def is_terminated(self) -> bool:
+        return bool(self.result)
+
+    def is_result_X(self) -> bool:
+        return self.result == X_STATE_VALUE
+
+    def is_result_O(self) -> bool:
+        return self.result == O_STATE_VALUE
+
+    def is_result_draw(self) -> bool:
+        return self.result == DRAW_STATE_VALUE
+
+    def _load_state(self, state: bytearray) -> None:
+        for index, value in enumerate(state[0:81]):
+            if value == X_STATE_VALUE:
+                self.x_masks[index // 9] |= 1 << (index % 9)
+            elif value == O_STATE_VALUE:
+                self.o_masks[index // 9] |= 1 << (index % 9)
+        for subgame, value in enumerate(state[81:90]):
+            if value == X_STATE_VALUE:
+                self.supergame_x_mask |= 1 << subgame
+            elif value == O_STATE_VALUE:
+                self.supergame_o_mask |= 1 << subgame
+            elif value == DRAW_STATE_VALUE:
+                self.supergame_draw_mask |= 1 << subgame
+        self.next_symbol = state[NEXT_SYMBOL_STATE_INDEX]
+        self.constraint = state[CONSTRAINT_STATE_INDEX]
+        self.result = state[UTTT_RESULT_STATE_INDEX]
+
+    def _supergame_mask(self) -> int:
+        return self.supergame_x_mask | self.supergame_o_mask | self.supergame_draw_mask
+
+    def _get_empty_indexes(self, subgame: int) -> List[int]:
+        taken_mask = self.x_masks[subgame] | self.o_masks[subgame]
+        return list(SUBGAME_EMPTY_INDEXES[subgame][taken_mask])
+
+    def _update_supergame_result(self, symbol: int, subgame: int) -> None:
+        subgame_bit = 1 << subgame
+        if symbol == X_STATE_VALUE:
+            if IS_WINNING_MASK[self.x_masks[subgame]]:
+                self.supergame_x_mask |= subgame_bit
+                if IS_WINNING_MASK[self.supergame_x_mask]:
+                    self.result = X_STATE_VALUE
+                    return
+            elif self.x_masks[subgame] | self.o_masks[subgame] == FULL_MASK:
+                self.supergame_draw_mask |= subgame_bit
+            else:
+                return
+        else:
+            if IS_WINNING_MASK[self.o_masks[subgame]]:
+                self.supergame_o_mask |= subgame_bit
+                if IS_WINNING_MASK[self.supergame_o_mask]:
+                    self.result = O_STATE_VALUE
+                    return
+            elif self.x_masks[subgame] | self.o_masks[subgame] == FULL_MASK:
+                self.supergame_draw_mask |= subgame_bit
+            else:
+                return
+        if self._supergame_mask() == FULL_MASK:
+            self.result = DRAW_STATE_VALUE
+
+    def _set_next_constraint(self, cell: int) -> None:
+        if self._supergame_mask() >> cell & 1:
+            self.constraint = UNCONSTRAINED_STATE_VALUE
+        else:
+            self.constraint = cell
+
+    def _verify_state(self) -> None:
+        self._verify_supergame()
+        self._verify_subgames()
+        self._verify_constraint()
+
+    def _verify_supergame(self) -> None:
+        x_w = IS_WINNING_MASK[self.supergame_x_mask]
+        o_w = IS_WINNING_MASK[self.supergame_o_mask]
+        full = self._supergame_mask() == FULL_MASK
+        if x_w and o_w:
+            raise UltimateTicTacToeError("X and O have winning positions on supergame")
+        if x_w and not self.is_result_X():
+            raise UltimateTicTacToeError("X won supergame, but result is not updated")
+        if o_w and not self.is_result_O():
+            raise UltimateTicTacToeError("O won supergame, but result is not updated")
+        if full and not self.is_result_draw() and not (x_w or o_w):
+            raise UltimateTicTacToeError("DRAW on supergame, but result is not updated")
+
+    def _verify_subgames(self) -> None:
+        for subgame in range(0, 9):
+            subgame_bit = 1 << subgame
+            x_w = IS_WINNING_MASK[self.x_masks[subgame]]
+            o_w = IS_WINNING_MASK[self.o_masks[subgame]]
+            full = self.x_masks[subgame] | self.o_masks[subgame] == FULL_MASK
+            if self.x_masks[subgame] & self.o_masks[subgame]:
+                raise UltimateTicTacToeError(f"X and O share cells on subgame={subgame}")
+            if x_w and o_w:
+                raise UltimateTicTacToeError(f"X and O have winning positions on subgame={subgame}")
+            if x_w and not self.supergame_x_mask & subgame_bit:
+                raise UltimateTicTacToeError(f"X won subgame={subgame}, but supergame is not updated")
+            if o_w and not self.supergame_o_mask & subgame_bit:
+                raise UltimateTicTacToeError(f"O won subgame={subgame}, but supergame is not updated")
+            if full and not self.supergame_draw_mask & subgame_bit and not (x_w or o_w):
+                raise UltimateTicTacToeError(f"DRAW on subgame={subgame}, but supergame is not updated")
+
+    def _verify_constraint(self) -> None:
+        if not (self.is_constrained() or self.is_unconstrained()):
+            raise UltimateTicTacToeError(f"invalid constraint={self.constraint}")
+        if self.is_constrained() and self._supergame_mask() >> self.constraint & 1:
+            raise UltimateTicTacToeError(f"constraint={self.constraint} points to terminated subgame")
+
+    def _verify_action(self, action: Action) -> None:
+        illegal_action = f"Illegal {action} - "
+        if self.is_next_symbol_X() and not action.is_symbol_X():
+            raise UltimateTicTacToeError(illegal_action + "next move belongs to X")
+        if self.is_next_symbol_O() and not action.is_symbol_O():
+            raise UltimateTicTacToeError(illegal_action + "next move belongs to O")
+        if not (0 <= action.index < 81):
+            raise UltimateTicTacToeError(illegal_action + "index outside the valid range")
+        subgame = action.index // 9
+        cell = action.index % 9
+        if self.is_constrained() and self.constraint != subgame:
+            raise UltimateTicTacToeError(illegal_action + f"violated constraint={self.constraint}")
+        if self._supergame_mask() >> subgame & 1:
+            raise UltimateTicTacToeError(illegal_action + "index from terminated subgame")
+        if (self.x_masks[subgame] | self.o_masks[subgame]) >> cell & 1:
+            raise UltimateTicTacToeError(illegal_action + "index is already taken")
+
+    def __str__(self):
+        return UltimateTicTacToe.__str__(self)
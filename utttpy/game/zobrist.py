@@ -0,0 +1,39 @@
+import random
+
+from utttpy.game.constants import (
+    NEXT_SYMBOL_STATE_INDEX,
+    CONSTRAINT_STATE_INDEX,
+    X_STATE_VALUE,
+    O_STATE_VALUE,
+)
+
+# fixed seed keeps hashes stable across processes and runs:
+_zobrist_rng = random.Random(2021)
+
+# ZOBRIST_CELLS[symbol][index] for symbol in (X_STATE_VALUE, O_STATE_VALUE) and index [0, 1, ... 80]:
+ZOBRIST_CELLS = {
+    X_STATE_VALUE: tuple(_zobrist_rng.getrandbits(64) for _ in range(81)),
+    O_STATE_VALUE: tuple(_zobrist_rng.getrandbits(64) for _ in range(81)),
+}
+
+# xored into the hash when the next symbol is O:
+ZOBRIST_NEXT_SYMBOL_O = _zobrist_rng.getrandbits(64)
+
+# ZOBRIST_CONSTRAINTS[constraint] for constraint [0, 1, ... 8] and UNCONSTRAINED_STATE_VALUE:
+ZOBRIST_CONSTRAINTS = tuple(_zobrist_rng.getrandbits(64) for _ in range(10))
+
+
+def zobrist_hash(state: bytearray) -> int:
+    """64-bit Zobrist hash of the state computed from scratch.
+
+    Subgame results and the supergame result are not hashed,
+    because they are determined by the cells.
+    """
+    h = 0
+    for index, value in enumerate(state[0:81]):
+        if value:
+            h ^= ZOBRIST_CELLS[value][index]
+    if state[NEXT_SYMBOL_STATE_INDEX] == O_STATE_VALUE:
+        h ^= ZOBRIST_NEXT_SYMBOL_O
+    h ^= ZOBRIST_CONSTRAINTS[state[CONSTRAINT_STATE_INDEX]]
+    return h
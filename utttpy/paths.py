@@ -8,3 +8,5 @@ UTTT_PATH = UTTTPY_PATH.parent
 UTTT_DATASETS_PATH = UTTT_PATH / "datasets"
 UTTT_DATASET_STAGE1_PATH = UTTT_DATASETS_PATH / "stage1-mcts"
 UTTT_DATASET_STAGE2_PATH = UTTT_DATASETS_PATH / "stage2-nmcts"
+UTTT_DATASET_STAGE1_BINARY_PATH = UTTT_DATASETS_PATH / "stage1-mcts-binary"
+UTTT_DATASET_STAGE2_BINARY_PATH = UTTT_DATASETS_PATH / "stage2-nmcts-binary"
@@ -0,0 +1,65 @@
+import numpy as np
+
+from utttpy.game.constants import (
+    NEXT_SYMBOL_STATE_INDEX,
+    CONSTRAINT_STATE_INDEX,
+    UTTT_RESULT_STATE_INDEX,
+    X_STATE_VALUE,
+    O_STATE_VALUE,
+    DRAW_STATE_VALUE,
+    UNCONSTRAINED_STATE_VALUE,
+)
+from utttpy.game.lookup_tables import IS_WINNING_MASK
+
+
+_IS_WINNING_MASK = np.array(IS_WINNING_MASK, dtype=bool)
+_CELL_BITS = 1 << np.arange(9)
+_SUBGAME_OF_INDEX = np.arange(81) // 9
+_SUBGAME_CELL_INDEXES = np.arange(81).reshape(9, 9)
+
+
+def batch_playout(states: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Plays uniformly random games from N states (N x 93 uint8 array) in lock-step.
+
+    Returns final states (N x 93 uint8 array), results are in column UTTT_RESULT_STATE_INDEX.
+    """
+    states = states.copy()
+    active = np.flatnonzero(states[:, UTTT_RESULT_STATE_INDEX] == 0)
+    while len(active) > 0:
+        batch = states[active]
+        rows = np.arange(len(active))
+        symbol = batch[:, NEXT_SYMBOL_STATE_INDEX]
+        constraint = batch[:, CONSTRAINT_STATE_INDEX]
+        supergame = batch[:, 81:90]  # view, updated in place below
+
+        legal = batch[:, 0:81] == 0
+        legal &= supergame[:, _SUBGAME_OF_INDEX] == 0
+        constrained = constraint != UNCONSTRAINED_STATE_VALUE
+        legal[constrained] &= _SUBGAME_OF_INDEX == constraint[constrained, None]
+
+        # argmax over random keys of legal indexes is a uniform choice:
+        keys = rng.random(legal.shape)
+        keys[~legal] = -1.0
+        index = keys.argmax(axis=1)
+        batch[rows, index] = symbol
+
+        subgame = index // 9
+        cell = index % 9
+        subgame_cells = batch[rows[:, None], _SUBGAME_CELL_INDEXES[subgame]]
+        subgame_won = _IS_WINNING_MASK[(subgame_cells == symbol[:, None]) @ _CELL_BITS]
+        subgame_drawn = ~subgame_won & (subgame_cells != 0).all(axis=1)
+        supergame[rows[subgame_won], subgame[subgame_won]] = symbol[subgame_won]
+        supergame[rows[subgame_drawn], subgame[subgame_drawn]] = DRAW_STATE_VALUE
+
+        supergame_won = _IS_WINNING_MASK[(supergame == symbol[:, None]) @ _CELL_BITS]
+        supergame_drawn = ~supergame_won & (supergame != 0).all(axis=1)
+        batch[supergame_won, UTTT_RESULT_STATE_INDEX] = symbol[supergame_won]
+        batch[supergame_drawn, UTTT_RESULT_STATE_INDEX] = DRAW_STATE_VALUE
+
+        batch[:, NEXT_SYMBOL_STATE_INDEX] = X_STATE_VALUE + O_STATE_VALUE - symbol
+        batch[:, CONSTRAINT_STATE_INDEX] = np.where(
+            supergame[rows, cell] == 0, cell, UNCONSTRAINED_STATE_VALUE
+        )
+        states[active] = batch
+        active = active[batch[:, UTTT_RESULT_STATE_INDEX] == 0]
+    return states
@@ -1,35 +1,87 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
 import pathlib
-import re
-from typing import Dict, List
+import random
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 from tqdm import tqdm
 
+from utttpy.game.constants import STATE_SIZE
+from utttpy.game.helpers import STATE_INDEXES_9x9, get_states_ndarray_Nx4x9x9
 
-def load_mcts_dataset(dirpath: pathlib.Path) -> Dict[str, List[dict]]:
-    dataset = {}
-    paths = sorted(list(dirpath.glob("depth*txt")))
-    for path in tqdm(paths, desc="loading mcts dataset"):
-        key = path.stem
-        datapoints = load_mcts_datapoints(path)
-        dataset[key] = datapoints
+# binary dataset arrays, one file per array in the dataset directory:
+#   states[row] - state of the datapoint in row
+#   values[row] - state value of the datapoint in row
+#   actions_offsets[row]:actions_offsets[row + 1] - range of actions_* of the datapoint in row
+#   actions_index, actions_probability, actions_value - evaluated actions of all datapoints
+# metadata.json holds the number of datapoints, the number of actions
+# and the range of rows [start, stop) of each depth key:
+BINARY_DATASET_DTYPES = {
+    "states": np.uint8,
+    "values": np.float32,
+    "actions_offsets": np.int64,
+    "actions_index": np.uint8,
+    "actions_probability": np.float32,
+    "actions_value": np.float32,
+}
+
+# encoded arrays added to a binary dataset by encode_binary_dataset:
+#   inputs_packed[row] - bits of get_state_ndarray_4x9x9 planes of the datapoint in row
+#                        (plane 2 as 1 for X and 0 for O), packed with np.packbits
+#   actions_position - positions (9 * row + col) on the 9x9 board of actions_index
+ENCODED_DATASET_DTYPES = {
+    "inputs_packed": np.uint8,
+    "actions_position": np.uint8,
+}
+INPUTS_PACKED_SIZE = (4 * 81 + 7) // 8
+
+# translates digit characters of the state string into state values:
+_DIGIT_VALUES = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+
+def load_mcts_dataset(dirpath: pathlib.Path, num_workers: int = 1) -> Dict[str, List[dict]]:
+    dataset = load_dataset(
+        dirpath=dirpath,
+        load_datapoints=load_mcts_datapoints,
+        num_workers=num_workers,
+        desc="loading mcts dataset",
+    )
     num_datapoints = sum(len(datapoints) for datapoints in dataset.values())
     print(f"mcts dataset containing {num_datapoints} datapoints loaded successfully!")
     return dataset
 
 
-def load_nmcts_dataset(dirpath: pathlib.Path) -> Dict[str, List[dict]]:
-    dataset = {}
-    paths = sorted(list(dirpath.glob("depth*txt")))
-    for path in tqdm(paths, desc="loading nmcts dataset"):
-        key = path.stem
-        datapoints = load_nmcts_datapoints(path)
-        dataset[key] = datapoints
+def load_nmcts_dataset(dirpath: pathlib.Path, num_workers: int = 1) -> Dict[str, List[dict]]:
+    dataset = load_dataset(
+        dirpath=dirpath,
+        load_datapoints=load_nmcts_datapoints,
+        num_workers=num_workers,
+        desc="loading nmcts dataset",
+    )
     num_datapoints = sum(len(datapoints) for datapoints in dataset.values())
     print(f"nmcts dataset containing {num_datapoints} datapoints loaded successfully!")
     return dataset
 
 
+def load_dataset(
+    dirpath: pathlib.Path,
+    load_datapoints: Callable[[pathlib.Path], List[dict]],
+    num_workers: int,
+    desc: str,
+) -> Dict[str, List[dict]]:
+    """Loads depth*txt files in dirpath, num_workers files at a time in a process pool."""
+    paths = sorted(list(dirpath.glob("depth*txt")))
+    if num_workers > 1:
+        with multiprocessing.Pool(processes=num_workers) as pool:
+            datapoints_list = list(tqdm(pool.imap(load_datapoints, paths), total=len(paths), desc=desc))
+    else:
+        datapoints_list = [load_datapoints(path) for path in tqdm(paths, desc=desc)]
+    return {path.stem: datapoints for path, datapoints in zip(paths, datapoints_list)}
+
+
 def load_mcts_datapoints(path: pathlib.Path) -> List[dict]:
     with open(path, "r") as f:
         content = f.read()
@@ -55,35 +107,22 @@ def load_nmcts_datapoints(path: pathlib.Path) -> List[dict]:
 
 
 def parse_mcts_datapoint(line: str) -> dict:
-    match = re.match("evaluatedState{(.*?)}", line)
-    if match is None:
-        raise RuntimeError("cannot parse datapoint")
-    evaluated_state_string = match.group(1)
-    evaluated_state_values = evaluated_state_string.split(" ")
-    state = bytearray(map(int, evaluated_state_values[0]))
+    evaluated_state_values, evaluated_actions_values = split_datapoint(line)
+    state = bytearray(evaluated_state_values[0].encode().translate(_DIGIT_VALUES))
     num_visits = int(evaluated_state_values[1])
     num_wins = int(evaluated_state_values[2])
     num_losses = int(evaluated_state_values[4])
     value = (num_wins - num_losses) / num_visits
-    match = re.match(".*evaluatedActions{(.*?)}", line)
-    if match is None:
-        raise RuntimeError("cannot parse datapoint")
-    evaluated_actions_string = match.group(1)
-    evaluated_actions_values = evaluated_actions_string.split(",")
-    num_actions = len(evaluated_actions_values)
-    actions_index = np.zeros(num_actions, dtype=np.int32)
-    actions_probability = np.zeros(num_actions, dtype=np.float32)
-    actions_value = np.zeros(num_actions, dtype=np.float32)
-    for i, evaluated_action_values in enumerate(evaluated_actions_values):
-        evaluated_action_values = list(map(int, evaluated_action_values.split(" ")))
-        action_index = evaluated_action_values[1]
-        action_num_visits = evaluated_action_values[2]
-        action_num_wins = evaluated_action_values[3]
-        action_num_losses = evaluated_action_values[5]
-        action_value = (action_num_wins - action_num_losses) / action_num_visits
-        actions_index[i] = action_index
-        actions_probability[i] = action_num_visits
-        actions_value[i] = action_value
+    # SYMBOL INDEX NUM_VISITS NUM_WINS NUM_DRAWS NUM_LOSSES per action:
+    evaluated_actions_values = evaluated_actions_values.reshape(-1, 6)
+    actions_index = evaluated_actions_values[:, 1].astype(np.int32)
+    actions_num_visits = evaluated_actions_values[:, 2]
+    actions_num_wins = evaluated_actions_values[:, 3]
+    actions_num_losses = evaluated_actions_values[:, 5]
+    if not actions_num_visits.all():
+        raise ZeroDivisionError("cannot parse datapoint with unvisited action")
+    actions_probability = actions_num_visits.astype(np.float32)
+    actions_value = ((actions_num_wins - actions_num_losses) / actions_num_visits).astype(np.float32)
     actions_probability = actions_probability / actions_probability.sum()
     actions = (actions_index, actions_probability, actions_value)
     return {
@@ -94,30 +133,14 @@ def parse_mcts_datapoint(line: str) -> dict:
 
 
 def parse_nmcts_datapoint(line: str) -> dict:
-    match = re.match("evaluatedState{(.*?)}", line)
-    if match is None:
-        raise RuntimeError("cannot parse datapoint")
-    evaluated_state_string = match.group(1)
-    evaluated_state_values = evaluated_state_string.split(" ")
-    state = bytearray(map(int, evaluated_state_values[0]))
+    evaluated_state_values, evaluated_actions_values = split_datapoint(line)
+    state = bytearray(evaluated_state_values[0].encode().translate(_DIGIT_VALUES))
     value = float(evaluated_state_values[2])
-    match = re.match(".*evaluatedActions{(.*?)}", line)
-    if match is None:
-        raise RuntimeError("cannot parse datapoint")
-    evaluated_actions_string = match.group(1)
-    evaluated_actions_values = evaluated_actions_string.split(",")
-    num_actions = len(evaluated_actions_values)
-    actions_index = np.zeros(num_actions, dtype=np.int32)
-    actions_probability = np.zeros(num_actions, dtype=np.float32)
-    actions_value = np.zeros(num_actions, dtype=np.float32)
-    for i, evaluated_action_values in enumerate(evaluated_actions_values):
-        evaluated_action_values = evaluated_action_values.split(" ")
-        action_index = int(evaluated_action_values[1])
-        action_visit_count = int(evaluated_action_values[2])
-        action_value = float(evaluated_action_values[3])
-        actions_index[i] = action_index
-        actions_probability[i] = action_visit_count
-        actions_value[i] = action_value
+    # SYMBOL INDEX VISIT_COUNT STATE_VALUE_MEAN per action:
+    evaluated_actions_values = evaluated_actions_values.reshape(-1, 4)
+    actions_index = evaluated_actions_values[:, 1].astype(np.int32)
+    actions_probability = evaluated_actions_values[:, 2].astype(np.float32)
+    actions_value = evaluated_actions_values[:, 3].astype(np.float32)
     actions_probability = actions_probability / actions_probability.sum()
     actions = (actions_index, actions_probability, actions_value)
     return {
@@ -127,11 +150,389 @@ def parse_nmcts_datapoint(line: str) -> dict:
     }
 
 
+def split_datapoint(line: str) -> Tuple[List[str], np.ndarray]:
+    """Splits "evaluatedState{...} evaluatedActions{...}" line into evaluated state values
+    and a flat float64 array of evaluated actions values.
+    """
+    if not line.startswith("evaluatedState{"):
+        raise RuntimeError("cannot parse datapoint")
+    evaluated_state_end = line.find("}")
+    evaluated_actions_begin = line.find("evaluatedActions{", evaluated_state_end)
+    evaluated_actions_end = line.find("}", evaluated_actions_begin)
+    if evaluated_state_end == -1 or evaluated_actions_begin == -1 or evaluated_actions_end == -1:
+        raise RuntimeError("cannot parse datapoint")
+    evaluated_state_values = line[len("evaluatedState{"):evaluated_state_end].split(" ")
+    evaluated_actions_string = line[evaluated_actions_begin + len("evaluatedActions{"):evaluated_actions_end]
+    evaluated_actions_values = np.fromstring(evaluated_actions_string.replace(",", " "), dtype=np.float64, sep=" ")
+    return evaluated_state_values, evaluated_actions_values
+
+
+def convert_dataset_to_binary(
+    input_dirpath: pathlib.Path,
+    output_dirpath: pathlib.Path,
+    parse_datapoint: Callable[[str], dict],
+) -> None:
+    """Converts depth*txt files parsed with parse_datapoint into a binary dataset in output_dirpath.
+
+    Depth files are converted one at a time and appended to the array files.
+    """
+    output_dirpath.mkdir(parents=True, exist_ok=False)
+    files = {name: open(output_dirpath / f"{name}.bin", "wb") for name in BINARY_DATASET_DTYPES}
+    keys = {}
+    num_datapoints = 0
+    num_actions = 0
+    np.zeros(1, dtype=np.int64).tofile(files["actions_offsets"])
+    paths = sorted(list(input_dirpath.glob("depth*txt")))
+    for path in tqdm(paths, desc="converting dataset"):
+        with open(path, "r") as f:
+            lines = f.read().rstrip().split("\n")
+        datapoints = [parse_datapoint(line) for line in lines if line]
+        keys[path.stem] = [num_datapoints, num_datapoints + len(datapoints)]
+        num_datapoints += len(datapoints)
+        if len(datapoints) == 0:
+            continue
+        actions_lengths = np.array([len(datapoint["actions"][0]) for datapoint in datapoints], dtype=np.int64)
+        actions_offsets = num_actions + np.cumsum(actions_lengths)
+        num_actions = int(actions_offsets[-1])
+        arrays = {
+            "states": np.array([list(datapoint["state"]) for datapoint in datapoints]),
+            "values": np.array([datapoint["value"] for datapoint in datapoints]),
+            "actions_offsets": actions_offsets,
+            "actions_index": np.concatenate([datapoint["actions"][0] for datapoint in datapoints]),
+            "actions_probability": np.concatenate([datapoint["actions"][1] for datapoint in datapoints]),
+            "actions_value": np.concatenate([datapoint["actions"][2] for datapoint in datapoints]),
+        }
+        for name, array in arrays.items():
+            array.astype(BINARY_DATASET_DTYPES[name]).tofile(files[name])
+    for f in files.values():
+        f.close()
+    metadata = {
+        "num_datapoints": num_datapoints,
+        "num_actions": num_actions,
+        "keys": keys,
+    }
+    with open(output_dirpath / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=4)
+    print(f"binary dataset containing {num_datapoints} datapoints saved to {output_dirpath} successfully!")
+
+
+def encode_binary_dataset(dirpath: pathlib.Path, chunk_size: int = 1 << 16) -> None:
+    """Adds encoded arrays (see ENCODED_DATASET_DTYPES) to the binary dataset in dirpath.
+
+    Datapoints are encoded once, so that training gathers batches from encoded rows
+    instead of preprocessing each sampled datapoint.
+    """
+    with open(dirpath / "metadata.json", "r") as f:
+        metadata = json.load(f)
+    arrays = _load_binary_arrays(dirpath=dirpath, metadata=metadata, names=BINARY_DATASET_DTYPES)
+    # position on the 9x9 board of each state index:
+    positions = np.argsort(STATE_INDEXES_9x9).astype(np.uint8)
+    num_datapoints = metadata["num_datapoints"]
+    num_actions = metadata["num_actions"]
+    with open(dirpath / "inputs_packed.bin", "wb") as f:
+        for start in tqdm(range(0, num_datapoints, chunk_size), desc="encoding inputs"):
+            states = np.array(arrays["states"][start:start + chunk_size])
+            inputs = get_states_ndarray_Nx4x9x9(states).reshape(len(states), 4 * 81)
+            np.packbits(inputs == 1, axis=1).tofile(f)
+    with open(dirpath / "actions_position.bin", "wb") as f:
+        for start in tqdm(range(0, num_actions, chunk_size), desc="encoding actions"):
+            positions[arrays["actions_index"][start:start + chunk_size]].tofile(f)
+    metadata["encoded"] = True
+    with open(dirpath / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=4)
+    print(f"binary dataset containing {num_datapoints} datapoints encoded in {dirpath} successfully!")
+
+
+def load_binary_dataset(dirpath: pathlib.Path, encoded: bool = False) -> Dict[str, BinaryDatapoints]:
+    """Loads the binary dataset as read-only memory maps, shared between processes by the page cache.
+
+    Encoded arrays are loaded too if encoded (the dataset must be encoded with encode_binary_dataset).
+    """
+    with open(dirpath / "metadata.json", "r") as f:
+        metadata = json.load(f)
+    names = dict(BINARY_DATASET_DTYPES)
+    if encoded:
+        if not metadata.get("encoded", False):
+            raise ValueError(f"binary dataset in dirpath={repr(dirpath)} is not encoded")
+        names.update(ENCODED_DATASET_DTYPES)
+    arrays = _load_binary_arrays(dirpath=dirpath, metadata=metadata, names=names)
+    num_datapoints = metadata["num_datapoints"]
+    dataset = {
+        key: BinaryDatapoints(arrays=arrays, rows=np.arange(start, stop, dtype=np.int64))
+        for key, (start, stop) in metadata["keys"].items()
+    }
+    print(f"binary dataset containing {num_datapoints} datapoints loaded successfully!")
+    return dataset
+
+
+def _load_binary_arrays(dirpath: pathlib.Path, metadata: dict, names: Dict[str, type]) -> Dict[str, np.ndarray]:
+    num_datapoints = metadata["num_datapoints"]
+    num_actions = metadata["num_actions"]
+    shapes = {
+        "states": (num_datapoints, STATE_SIZE),
+        "values": (num_datapoints,),
+        "actions_offsets": (num_datapoints + 1,),
+        "actions_index": (num_actions,),
+        "actions_probability": (num_actions,),
+        "actions_value": (num_actions,),
+        "inputs_packed": (num_datapoints, INPUTS_PACKED_SIZE),
+        "actions_position": (num_actions,),
+    }
+    arrays = {}
+    for name, dtype in names.items():
+        if np.prod(shapes[name]) == 0:
+            # empty files cannot be memory mapped:
+            arrays[name] = np.zeros(shape=shapes[name], dtype=dtype)
+        else:
+            arrays[name] = np.memmap(dirpath / f"{name}.bin", dtype=dtype, mode="r", shape=shapes[name])
+    return arrays
+
+
+class BinaryDatapoints:
+    """Sequence of datapoints stored in rows of binary dataset arrays.
+
+    Items are datapoint dicts in the same format as returned by parse_mcts_datapoint
+    and parse_nmcts_datapoint. Adding two BinaryDatapoints concatenates their rows.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], rows: np.ndarray):
+        self.arrays = arrays
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i: int) -> dict:
+        row = self.rows[i]
+        start = self.arrays["actions_offsets"][row]
+        stop = self.arrays["actions_offsets"][row + 1]
+        actions_index = self.arrays["actions_index"][start:stop].astype(np.int32)
+        actions_probability = np.array(self.arrays["actions_probability"][start:stop])
+        actions_value = np.array(self.arrays["actions_value"][start:stop])
+        return {
+            "state": bytearray(self.arrays["states"][row].tobytes()),
+            "value": float(self.arrays["values"][row]),
+            "actions": (actions_index, actions_probability, actions_value),
+        }
+
+    def __add__(self, other: BinaryDatapoints) -> BinaryDatapoints:
+        if other.arrays is not self.arrays:
+            raise ValueError("cannot add datapoints of different binary datasets")
+        return BinaryDatapoints(arrays=self.arrays, rows=np.concatenate([self.rows, other.rows]))
+
+
+def load_streaming_dataset(
+    dirpath: pathlib.Path,
+    parse_datapoint: Callable[[str], dict],
+    shuffle_buffer_size: int,
+) -> Dict[str, StreamingDatapoints]:
+    """Opens depth*txt files in dirpath for streaming, without reading them."""
+    paths = sorted(list(dirpath.glob("depth*txt")))
+    dataset = {
+        path.stem: StreamingDatapoints(
+            paths=[path],
+            parse_datapoint=parse_datapoint,
+            shuffle_buffer_size=shuffle_buffer_size,
+        )
+        for path in paths
+    }
+    print(f"streaming dataset of {len(paths)} depth files opened successfully!")
+    return dataset
+
+
+class StreamingDatapoints:
+    """Endless stream of datapoints read line by line from depth files.
+
+    Iterating yields datapoints in random order through a shuffle buffer:
+    a random datapoint from the buffer is yielded and replaced by the next line.
+    Files are read again in random order after each pass,
+    so at most shuffle_buffer_size datapoints are held in memory.
+    Adding two StreamingDatapoints concatenates their files.
+    """
+
+    def __init__(
+        self,
+        paths: List[pathlib.Path],
+        parse_datapoint: Callable[[str], dict],
+        shuffle_buffer_size: int,
+    ):
+        if shuffle_buffer_size < 1:
+            raise ValueError(f"invalid shuffle_buffer_size={shuffle_buffer_size}")
+        self.paths = paths
+        self.parse_datapoint = parse_datapoint
+        self.shuffle_buffer_size = shuffle_buffer_size
+
+    def __iter__(self) -> DatapointStream:
+        return self.stream()
+
+    def stream(
+        self,
+        shard: int = 0,
+        num_shards: int = 1,
+        rng: Optional[random.Random] = None,
+        position: Optional[dict] = None,
+    ) -> DatapointStream:
+        """Stream of the shard of lines with line numbers equal to shard modulo num_shards.
+
+        Streams of different shards (e.g. in different batch workers) yield disjoint datapoints.
+        """
+        if rng is None:
+            rng = random.Random(random.getrandbits(64))
+        return DatapointStream(
+            streaming_datapoints=self,
+            shard=shard,
+            num_shards=num_shards,
+            rng=rng,
+            position=position,
+        )
+
+    def __add__(self, other: StreamingDatapoints) -> StreamingDatapoints:
+        return StreamingDatapoints(
+            paths=self.paths + other.paths,
+            parse_datapoint=self.parse_datapoint,
+            shuffle_buffer_size=self.shuffle_buffer_size,
+        )
+
+
+class DatapointStream:
+    """Iterator over a shard of StreamingDatapoints, see StreamingDatapoints.stream.
+
+    get_position returns the position in files, the random state and the file offsets
+    of lines in the shuffle buffer, a stream created with it continues exactly from there.
+    Files with fewer lines than num_shards may leave the shard empty, it reads all lines then.
+    """
+
+    def __init__(
+        self,
+        streaming_datapoints: StreamingDatapoints,
+        shard: int,
+        num_shards: int,
+        rng: random.Random,
+        position: Optional[dict] = None,
+    ):
+        if not 0 <= shard < num_shards:
+            raise ValueError(f"invalid shard={shard} for num_shards={num_shards}")
+        self.paths = [str(path) for path in streaming_datapoints.paths]
+        self.parse_datapoint = streaming_datapoints.parse_datapoint
+        self.shuffle_buffer_size = streaming_datapoints.shuffle_buffer_size
+        self.rng = rng
+        self._buffer = None
+        # _buffer_lines[i] is (file_id, offset) of the line of _buffer[i]:
+        self._buffer_lines = None
+        if position is None:
+            self.file_order = list(range(len(self.paths)))
+            self.rng.shuffle(self.file_order)
+            self.shard = shard
+            self.num_shards = num_shards
+            self.order_index = 0
+            self.offset = 0
+            self.num_pass_lines = 0
+            self.num_pass_shard_lines = 0
+        else:
+            self.file_order = list(position["file_order"])
+            self.shard = position["shard"]
+            self.num_shards = position["num_shards"]
+            self.order_index = position["order_index"]
+            self.offset = position["offset"]
+            self.num_pass_lines = position["num_pass_lines"]
+            self.num_pass_shard_lines = position["num_pass_shard_lines"]
+            version, internal_state, gauss_next = position["rng"]
+            self.rng.setstate((version, tuple(internal_state), gauss_next))
+            if position["buffer_lines"] is not None:
+                self._buffer_lines = [tuple(buffer_line) for buffer_line in position["buffer_lines"]]
+                self._buffer = self._read_buffer(self._buffer_lines)
+        self._lines = self._read_lines()
+
+    def __iter__(self) -> DatapointStream:
+        return self
+
+    def __next__(self) -> dict:
+        if self._buffer is None:
+            self._buffer = []
+            self._buffer_lines = []
+            # the buffer is filled with at most one pass over the files:
+            for line, buffer_line in self._lines:
+                if line is None:
+                    break
+                self._buffer.append(self.parse_datapoint(line))
+                self._buffer_lines.append(buffer_line)
+                if len(self._buffer) >= self.shuffle_buffer_size:
+                    break
+            if len(self._buffer) == 0:
+                raise ValueError(f"no datapoints in paths={self.paths}")
+        line, buffer_line = next(self._lines)
+        while line is None:
+            line, buffer_line = next(self._lines)
+        i = self.rng.randrange(len(self._buffer))
+        datapoint = self._buffer[i]
+        self._buffer[i] = self.parse_datapoint(line)
+        self._buffer_lines[i] = buffer_line
+        return datapoint
+
+    def get_position(self) -> dict:
+        return {
+            "file_order": list(self.file_order),
+            "shard": self.shard,
+            "num_shards": self.num_shards,
+            "order_index": self.order_index,
+            "offset": self.offset,
+            "num_pass_lines": self.num_pass_lines,
+            "num_pass_shard_lines": self.num_pass_shard_lines,
+            "rng": self.rng.getstate(),
+            "buffer_lines": None if self._buffer_lines is None else list(self._buffer_lines),
+        }
+
+    def _read_lines(self) -> Iterator[Tuple[Optional[str], Optional[Tuple[int, int]]]]:
+        """Yields lines of the shard with their (file_id, offset), pass after pass,
+        with (None, None) at the end of each pass.
+
+        The position is updated before each line is yielded, so it points after the line.
+        """
+        while True:
+            while self.order_index < len(self.file_order):
+                file_id = self.file_order[self.order_index]
+                with open(self.paths[file_id], "rb") as f:
+                    f.seek(self.offset)
+                    for line in iter(f.readline, b""):
+                        line_offset, self.offset = self.offset, f.tell()
+                        line = line.rstrip()
+                        if not line:
+                            continue
+                        self.num_pass_lines += 1
+                        if (self.num_pass_lines - 1) % self.num_shards == self.shard:
+                            self.num_pass_shard_lines += 1
+                            yield line.decode(), (file_id, line_offset)
+                self.order_index += 1
+                self.offset = 0
+            if self.num_pass_lines == 0:
+                return
+            is_shard_empty = self.num_pass_shard_lines == 0
+            if is_shard_empty:
+                self.shard, self.num_shards = 0, 1
+            self.rng.shuffle(self.file_order)
+            self.order_index = 0
+            self.num_pass_lines = 0
+            self.num_pass_shard_lines = 0
+            if not is_shard_empty:
+                yield None, None
+
+    def _read_buffer(self, buffer_lines: List[Tuple[int, int]]) -> List[dict]:
+        buffer = [None] * len(buffer_lines)
+        for file_id in set(file_id for file_id, _ in buffer_lines):
+            with open(self.paths[file_id], "rb") as f:
+                for i, (buffer_file_id, offset) in enumerate(buffer_lines):
+                    if buffer_file_id == file_id:
+                        f.seek(offset)
+                        buffer[i] = self.parse_datapoint(f.readline().rstrip().decode())
+        return buffer
+
+
 def merge_endgame_depths_inplace(dataset: Dict[str, List[dict]]) -> None:
+    # works for lists of datapoints, BinaryDatapoints and StreamingDatapoints:
     dataset["depth55+56"] = dataset["depth55"] + dataset["depth56"]
     dataset["depth57+58+59"] = dataset["depth57"] + dataset["depth58"] + dataset["depth59"]
-    dataset["depth60+"] = []
-    for d in range(60, 81):
-        dataset["depth60+"].extend(dataset[f"depth{d:02}"])
+    dataset["depth60+"] = dataset["depth60"]
+    for d in range(61, 81):
+        dataset["depth60+"] = dataset["depth60+"] + dataset[f"depth{d:02}"]
     for d in range(55, 81):
         del dataset[f"depth{d:02}"]
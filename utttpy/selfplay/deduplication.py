@@ -0,0 +1,140 @@
+import json
+import pathlib
+from typing import Dict, List
+
+import numpy as np
+from tqdm import tqdm
+
+from utttpy.game.symmetry import SYMMETRY_INDEX_MAPS, canonicalize_state
+from utttpy.selfplay import monte_carlo_tree_search as mcts
+from utttpy.selfplay import neural_monte_carlo_tree_search as nmcts
+from utttpy.selfplay.datatools import split_datapoint
+
+
+def deduplicate_dataset(
+    input_dirpath: pathlib.Path,
+    output_dirpath: pathlib.Path,
+    dataset_type: str,
+    symmetric: bool,
+) -> Dict[str, dict]:
+    """Writes depth*txt files of input_dirpath to output_dirpath with repeated positions merged.
+
+    Repeated positions always share a depth file, so files are deduplicated one at a time.
+    Returns and saves to deduplication_report.json the number of datapoints per depth before and after.
+    """
+    if dataset_type not in {"mcts", "nmcts"}:
+        raise ValueError(f"unknown dataset_type={repr(dataset_type)}")
+    output_dirpath.mkdir(parents=True, exist_ok=False)
+    report = {}
+    paths = sorted(list(input_dirpath.glob("depth*txt")))
+    for path in tqdm(paths, desc="deduplicating dataset"):
+        with open(path, "r") as f:
+            lines = [line.rstrip() for line in f if line.strip()]
+        deduplicated_lines = deduplicate_lines(lines=lines, dataset_type=dataset_type, symmetric=symmetric)
+        with open(output_dirpath / path.name, "w") as f:
+            f.write("".join(f"{line}\n" for line in deduplicated_lines))
+        report[path.stem] = {
+            "num_datapoints": len(lines),
+            "num_deduplicated_datapoints": len(deduplicated_lines),
+            "num_duplicates": len(lines) - len(deduplicated_lines),
+        }
+    report["all"] = {
+        key: sum(depth_report[key] for depth_report in report.values())
+        for key in ["num_datapoints", "num_deduplicated_datapoints", "num_duplicates"]
+    }
+    with open(output_dirpath / "deduplication_report.json", "w") as f:
+        json.dump(report, f, indent=4)
+    return report
+
+
+def deduplicate_lines(lines: List[str], dataset_type: str, symmetric: bool) -> List[str]:
+    """Merges datapoint lines of the same position (or symmetric positions if symmetric).
+
+    Visits, wins, draws and losses (mcts) are summed, value means (nmcts) are averaged
+    weighted by visit counts, for the state and for each action. Merged positions are
+    written in the canonical orientation if symmetric, with actions sorted by index.
+    """
+    evaluations = {}
+    for line in lines:
+        evaluated_state_values, evaluated_actions_values = split_datapoint(line)
+        state = bytearray(map(int, evaluated_state_values[0]))
+        if dataset_type == "mcts":
+            # NUM_VISITS NUM_WINS NUM_DRAWS NUM_LOSSES are additive:
+            state_stats = np.array(evaluated_state_values[1:5], dtype=np.float64)
+            evaluated_actions_values = evaluated_actions_values.reshape(-1, 6)
+            actions_stats = evaluated_actions_values[:, 2:6]
+        elif dataset_type == "nmcts":
+            # VISIT_COUNT and VISIT_COUNT * STATE_VALUE_MEAN are additive:
+            visit_count = int(evaluated_state_values[1])
+            state_stats = np.array([visit_count, visit_count * float(evaluated_state_values[2])])
+            evaluated_actions_values = evaluated_actions_values.reshape(-1, 4)
+            actions_stats = np.stack([
+                evaluated_actions_values[:, 2],
+                evaluated_actions_values[:, 2] * evaluated_actions_values[:, 3],
+            ], axis=1)
+        else:
+            raise ValueError(f"unknown dataset_type={repr(dataset_type)}")
+        actions_symbol = evaluated_actions_values[:, 0].astype(int).tolist()
+        actions_index = evaluated_actions_values[:, 1].astype(int).tolist()
+        if symmetric:
+            state, symmetry = canonicalize_state(state)
+            actions_index = [SYMMETRY_INDEX_MAPS[symmetry][index] for index in actions_index]
+        key = bytes(state)
+        if key not in evaluations:
+            evaluations[key] = {"state": state, "stats": np.zeros_like(state_stats), "actions": {}}
+        evaluation = evaluations[key]
+        evaluation["stats"] += state_stats
+        for symbol, index, action_stats in zip(actions_symbol, actions_index, actions_stats):
+            if index not in evaluation["actions"]:
+                evaluation["actions"][index] = (symbol, np.zeros_like(action_stats))
+            evaluation["actions"][index][1][:] += action_stats
+    return [
+        serialize_merged_evaluation(evaluation=evaluation, dataset_type=dataset_type)
+        for evaluation in evaluations.values()
+    ]
+
+
+def serialize_merged_evaluation(evaluation: dict, dataset_type: str) -> str:
+    actions = sorted(evaluation["actions"].items())
+    if dataset_type == "mcts":
+        num_visits, num_wins, num_draws, num_losses = map(int, evaluation["stats"])
+        evaluated_state = {
+            "state": evaluation["state"],
+            "num_visits": num_visits,
+            "num_wins": num_wins,
+            "num_draws": num_draws,
+            "num_losses": num_losses,
+        }
+        evaluated_actions = []
+        for index, (symbol, action_stats) in actions:
+            num_visits, num_wins, num_draws, num_losses = map(int, action_stats)
+            evaluated_actions.append({
+                "symbol": symbol,
+                "index": index,
+                "num_visits": num_visits,
+                "num_wins": num_wins,
+                "num_draws": num_draws,
+                "num_losses": num_losses,
+            })
+        evaluated_state_str = mcts.serialize_evaluated_state(evaluated_state=evaluated_state)
+        evaluated_actions_str = mcts.serialize_evaluated_actions(evaluated_actions=evaluated_actions)
+    elif dataset_type == "nmcts":
+        visit_count, state_value_sum = evaluation["stats"]
+        evaluated_state = {
+            "state": evaluation["state"],
+            "visit_count": int(visit_count),
+            "state_value_mean": float(state_value_sum / visit_count),
+        }
+        evaluated_actions = []
+        for index, (symbol, (visit_count, state_value_sum)) in actions:
+            evaluated_actions.append({
+                "symbol": symbol,
+                "index": index,
+                "visit_count": int(visit_count),
+                "state_value_mean": float(state_value_sum / visit_count) if visit_count > 0 else 0.0,
+            })
+        evaluated_state_str = nmcts.serialize_evaluated_state(evaluated_state=evaluated_state)
+        evaluated_actions_str = nmcts.serialize_evaluated_actions(evaluated_actions=evaluated_actions)
+    else:
+        raise ValueError(f"unknown dataset_type={repr(dataset_type)}")
+    return f"{evaluated_state_str} {evaluated_actions_str}"
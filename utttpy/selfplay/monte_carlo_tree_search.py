@@ -2,13 +2,25 @@ from __future__ import annotations
 
 import math
 import random
-from collections import deque
-from typing import List, Optional, Tuple
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple, Union
 
+import numpy as np
 from tqdm import tqdm
 
 from utttpy.game.action import Action
+from utttpy.game.constants import (
+    UTTT_RESULT_STATE_INDEX,
+    X_STATE_VALUE,
+    O_STATE_VALUE,
+    DRAW_STATE_VALUE,
+)
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.batch_playout import batch_playout
+
+
+# numpy call overhead outweighs a list comprehension on small sibling sets:
+VECTORIZED_UCT_MIN_NUM_CHILDREN = 32
 
 
 class MonteCarloTreeSearch:
@@ -18,53 +30,60 @@ class MonteCarloTreeSearch:
         uttt: UltimateTicTacToe,
         num_simulations: int,
         exploration_strength: float,
+        transposition_table_cache_size: Optional[int] = None,
+        tree_storage: str = "arrays",
+        num_playouts_per_leaf: int = 1,
     ):
-        self.tree = Tree(root=Node(uttt=uttt))
+        if num_playouts_per_leaf < 1:
+            raise ValueError(f"invalid num_playouts_per_leaf={num_playouts_per_leaf}")
+        self.tree = self._make_tree(
+            uttt=uttt,
+            transposition_table_cache_size=transposition_table_cache_size,
+            tree_storage=tree_storage,
+        )
         self.num_simulations = num_simulations
         self.exploration_strength = exploration_strength
+        self.num_playouts_per_leaf = num_playouts_per_leaf
+
+    def _make_tree(
+        self,
+        uttt: UltimateTicTacToe,
+        transposition_table_cache_size: Optional[int],
+        tree_storage: str,
+    ) -> Union[Tree, ArrayTree]:
+        if tree_storage == "nodes":
+            if transposition_table_cache_size is None:
+                transposition_table = None
+            else:
+                transposition_table = TranspositionTable(cache_size=transposition_table_cache_size)
+            return Tree(root=Node(), uttt=uttt, transposition_table=transposition_table)
+        if tree_storage == "arrays":
+            if transposition_table_cache_size is not None:
+                raise ValueError("transposition table is not supported with tree_storage='arrays'")
+            return ArrayTree(uttt=uttt)
+        raise ValueError(f"unknown tree_storage={repr(tree_storage)}")
 
     def run(self, progress_bar: bool = False) -> None:
-        num_run_simulations = self.num_simulations - self.tree.root.num_visits
+        # each simulation adds num_playouts_per_leaf visits to the root:
+        num_run_simulations = max(
+            0, -(-(self.num_simulations - self.tree.root_num_visits) // self.num_playouts_per_leaf)
+        )
         for i in tqdm(range(num_run_simulations), disable=not progress_bar):
-            simulate(
-                node=self.tree.root,
+            self.tree.simulate(
                 exploration_strength=self.exploration_strength,
+                num_playouts=self.num_playouts_per_leaf,
             )
 
     def get_evaluated_state(self) -> dict:
-        return self.tree.root.get_evaluated_state()
+        return self.tree.get_evaluated_state()
 
     def get_evaluated_actions(self) -> List[dict]:
-        return self.tree.root.get_evaluated_actions()
+        return self.tree.get_evaluated_actions()
 
     def select_action(
         self, evaluated_actions: List[dict], selection_method: str
     ) -> Action:
-        if selection_method == "argmax":
-            max_num_visits = max(
-                evaluated_action["num_visits"] for evaluated_action in evaluated_actions
-            )
-            top_evaluated_actions = [
-                evaluated_action
-                for evaluated_action in evaluated_actions
-                if evaluated_action["num_visits"] >= max_num_visits
-            ]
-            selected_evaluated_action = random.choice(top_evaluated_actions)
-        elif selection_method == "sample":
-            num_visits_list = [
-                evaluated_action["num_visits"] for evaluated_action in evaluated_actions
-            ]
-            total_num_visits = sum(num_visits_list)
-            weights = [num_visits / total_num_visits for num_visits in num_visits_list]
-            selected_evaluated_action = random.choices(evaluated_actions, weights=weights, k=1)[0]
-        elif selection_method == "random":
-            selected_evaluated_action = random.choice(evaluated_actions)
-        else:
-            raise ValueError(f"unknown selection_method={repr(selection_method)}")
-        return Action(
-            symbol=selected_evaluated_action["symbol"],
-            index=selected_evaluated_action["index"],
-        )
+        return select_action(evaluated_actions=evaluated_actions, selection_method=selection_method)
 
     def synchronize(self, uttt: UltimateTicTacToe) -> None:
         self.tree.synchronize(uttt=uttt)
@@ -74,21 +93,30 @@ class MonteCarloTreeSearch:
             '{cls}(\n'
             '  tree: {tree}\n'
             '  num_simulations: {num_simulations}\n'
-            '  exploration_strength: {exploration_strength}\n)'
+            '  exploration_strength: {exploration_strength}\n'
+            '  num_playouts_per_leaf: {num_playouts_per_leaf}\n)'
         )
         output = output.format(
             cls=self.__class__.__name__,
             tree=str(self.tree).replace('\n', '\n  '),
             num_simulations=self.num_simulations,
             exploration_strength=self.exploration_strength,
+            num_playouts_per_leaf=self.num_playouts_per_leaf,
         )
         return output
 
 
 class Tree:
 
-    def __init__(self, root: Node):
+    def __init__(
+        self,
+        root: Node,
+        uttt: UltimateTicTacToe,
+        transposition_table: Optional[TranspositionTable] = None,
+    ):
         self.root = root
+        self.uttt = uttt.clone()  # root position, walked down and back up by simulations
+        self.transposition_table = transposition_table  # if set, the tree is a DAG
 
     @property
     def size(self) -> int:
@@ -98,34 +126,395 @@ class Tree:
     def height(self) -> int:
         return dfs_max_depth(node=self.root, depth=0)
 
+    @property
+    def root_num_visits(self) -> int:
+        return self.root.num_visits
+
+    def simulate(self, exploration_strength: float, num_playouts: int = 1) -> None:
+        simulate(
+            node=self.root,
+            uttt=self.uttt,
+            exploration_strength=exploration_strength,
+            transposition_table=self.transposition_table,
+            num_playouts=num_playouts,
+        )
+
+    def get_evaluated_state(self) -> dict:
+        return self.root.get_evaluated_state(uttt=self.uttt)
+
+    def get_evaluated_actions(self) -> List[dict]:
+        return self.root.get_evaluated_actions()
+
     def synchronize(self, uttt: UltimateTicTacToe) -> None:
-        for child_node in self.root.child_nodes:
-            if uttt.is_equal_to(child_node.uttt):
-                self.root = child_node
-                return
-        self.root = Node(uttt=uttt.clone())
+        root = None
+        for child_action, child_node in zip(self.root.child_actions, self.root.child_nodes):
+            self.uttt.execute(action=child_action, verify=False)
+            is_equal = uttt.hash == self.uttt.hash and uttt.is_equal_to(self.uttt)
+            self.uttt.undo()
+            if is_equal:
+                root = child_node
+                break
+        if root is None and self.transposition_table is not None:
+            # the new root may be deeper in the tree, e.g. after a move of each player:
+            root = self.transposition_table.nodes.get(uttt.hash)
+        if root is None:
+            root = Node()
+        self.root = root
+        self.uttt = uttt.clone()
+        if self.transposition_table is not None:
+            self.transposition_table.reset(node=self.root, uttt=self.uttt)
 
     def __str__(self):
         output = (
             '{cls}(\n'
+            '  uttt: {uttt}\n'
             '  root: {root}\n'
             '  size: {size}\n'
-            '  height: {height}\n)'
+            '  height: {height}\n'
+            '  transposition_table: {transposition_table}\n)'
         )
         output = output.format(
             cls=self.__class__.__name__,
+            uttt=str(self.uttt).replace('\n', '\n  '),
             root=str(self.root).replace('\n', '\n  '),
             size=self.size,
             height=self.height,
+            transposition_table=str(self.transposition_table).replace('\n', '\n  '),
+        )
+        return output
+
+
+class ArrayTree:
+    """Tree stored as a structure of NumPy arrays indexed by node.
+
+    Children of a node are allocated together, so they occupy a contiguous
+    range [first_child, first_child + num_children). Arrays grow by doubling.
+    The root is always node 0: synchronize compacts the arrays to the subtree
+    of the new root.
+    """
+
+    def __init__(self, uttt: UltimateTicTacToe, capacity: int = 1024):
+        self.uttt = uttt.clone()  # root position, walked down and back up by simulations
+        self._allocate(capacity=capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.first_child = np.zeros(capacity, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int8)
+        self.action_index = np.zeros(capacity, dtype=np.int8)
+        self.depth = np.zeros(capacity, dtype=np.int8)
+        self.num_visits = np.zeros(capacity, dtype=np.int32)
+        self.num_X_wins = np.zeros(capacity, dtype=np.int32)
+        self.num_O_wins = np.zeros(capacity, dtype=np.int32)
+        self.num_draws = np.zeros(capacity, dtype=np.int32)
+        self.num_nodes = 1
+        self.max_depth = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.parent)
+
+    @property
+    def size(self) -> int:
+        return self.num_nodes
+
+    @property
+    def height(self) -> int:
+        return self.max_depth
+
+    @property
+    def root_num_visits(self) -> int:
+        return int(self.num_visits[0])
+
+    def simulate(self, exploration_strength: float, num_playouts: int = 1) -> None:
+        selected_path = self._select_leaf_node(exploration_strength=exploration_strength)
+        self._expand(node=selected_path[-1])
+        stats = playouts(uttt=self.uttt, num_playouts=num_playouts)
+        self._backprop(selected_path=selected_path, stats=stats)
+        for _ in range(len(selected_path) - 1):
+            self.uttt.undo()
+
+    def get_evaluated_state(self) -> dict:
+        if self.uttt.is_next_symbol_X():
+            num_wins = self.num_X_wins[0]
+            num_losses = self.num_O_wins[0]
+        else:
+            num_wins = self.num_O_wins[0]
+            num_losses = self.num_X_wins[0]
+        return {
+            "state": self.uttt.state.copy(),
+            "num_visits": int(self.num_visits[0]),
+            "num_wins": int(num_wins),
+            "num_draws": int(self.num_draws[0]),
+            "num_losses": int(num_losses),
+        }
+
+    def get_evaluated_actions(self) -> List[dict]:
+        if self.num_children[0] == 0:
+            raise MonteCarloTreeSearchError("node is a leaf")
+        if self.num_visits[0] == 0:
+            raise MonteCarloTreeSearchError("node was not visited")
+        symbol = self.uttt.next_symbol
+        children = slice(self.first_child[0], self.first_child[0] + self.num_children[0])
+        if symbol == X_STATE_VALUE:
+            num_wins = self.num_X_wins[children]
+            num_losses = self.num_O_wins[children]
+        else:
+            num_wins = self.num_O_wins[children]
+            num_losses = self.num_X_wins[children]
+        evaluated_actions = []
+        for index, num_visits, num_wins, num_draws, num_losses in zip(
+            self.action_index[children].tolist(),
+            self.num_visits[children].tolist(),
+            num_wins.tolist(),
+            self.num_draws[children].tolist(),
+            num_losses.tolist(),
+        ):
+            evaluated_action = {
+                "symbol": symbol,
+                "index": index,
+                "num_visits": num_visits,
+                "num_wins": num_wins,
+                "num_draws": num_draws,
+                "num_losses": num_losses,
+            }
+            evaluated_actions.append(evaluated_action)
+        return evaluated_actions
+
+    def synchronize(self, uttt: UltimateTicTacToe) -> None:
+        root = None
+        for child in range(self.first_child[0], self.first_child[0] + self.num_children[0]):
+            self.uttt.execute(Action(symbol=self.uttt.next_symbol, index=int(self.action_index[child])), verify=False)
+            is_equal = uttt.hash == self.uttt.hash and uttt.is_equal_to(self.uttt)
+            self.uttt.undo()
+            if is_equal:
+                root = child
+                break
+        self.uttt = uttt.clone()
+        if root is None:
+            self._allocate(capacity=self.capacity)
+        else:
+            self._compact(root=root)
+
+    def _select_leaf_node(self, exploration_strength: float) -> List[int]:
+        """Selects path from root to a leaf and executes its actions on uttt."""
+        uttt = self.uttt
+        selected_path = []
+        node = 0
+        while self.num_children[node] > 0:
+            selected_path.append(node)
+            node = self._select_child(node=node, exploration_strength=exploration_strength)
+            uttt.execute(Action(symbol=uttt.next_symbol, index=int(self.action_index[node])), verify=False)
+        selected_path.append(node)
+        return selected_path
+
+    def _select_child(self, node: int, exploration_strength: float) -> int:
+        """Child of node with the top UCT score, node is at the uttt position."""
+        first_child = int(self.first_child[node])
+        children = slice(first_child, first_child + int(self.num_children[node]))
+        if self.uttt.is_next_symbol_X():
+            num_wins = self.num_X_wins[children]
+            num_losses = self.num_O_wins[children]
+        else:
+            num_wins = self.num_O_wins[children]
+            num_losses = self.num_X_wins[children]
+        if children.stop - children.start >= VECTORIZED_UCT_MIN_NUM_CHILDREN:
+            scores = UCT_scores(
+                num_wins=num_wins,
+                num_losses=num_losses,
+                num_visits=self.num_visits[children],
+                parent_num_visits=int(self.num_visits[node]),
+                exploration_strength=exploration_strength,
+            )
+            top_score_indices = np.flatnonzero(scores >= scores.max()).tolist()
+        else:
+            num_visits = self.num_visits[children].tolist()
+            num_wins = num_wins.tolist()
+            num_losses = num_losses.tolist()
+            log_parent_num_visits = math.log(self.num_visits[node])
+            scores = [
+                (
+                    (num_wins[i] - num_losses[i]) / num_visits[i]
+                    + exploration_strength * math.sqrt(log_parent_num_visits / num_visits[i])
+                ) if num_visits[i] > 0 else float("inf")
+                for i in range(len(num_visits))
+            ]
+            top_score = max(scores)
+            top_score_indices = [i for i, score in enumerate(scores) if score >= top_score]
+        return first_child + random.choice(top_score_indices)
+
+    def _expand(self, node: int) -> None:
+        if self.num_children[node] > 0:
+            return
+        if self.uttt.is_terminated():
+            return
+        legal_indexes = self.uttt.get_legal_indexes()
+        if len(legal_indexes) == 0:
+            raise MonteCarloTreeSearchError("expanding node with no legal actions")
+        num_children = len(legal_indexes)
+        first_child = self.num_nodes
+        if first_child + num_children > self.capacity:
+            self._grow(min_capacity=first_child + num_children)
+        children = slice(first_child, first_child + num_children)
+        self.parent[children] = node
+        self.action_index[children] = legal_indexes
+        self.depth[children] = self.depth[node] + 1
+        self.first_child[node] = first_child
+        self.num_children[node] = num_children
+        self.num_nodes += num_children
+        self.max_depth = max(self.max_depth, int(self.depth[node]) + 1)
+
+    def _backprop(self, selected_path: List[int], stats: Tuple[int, int, int]) -> None:
+        num_X_wins, num_O_wins, num_draws = stats
+        self.num_visits[selected_path] += num_X_wins + num_O_wins + num_draws
+        self.num_X_wins[selected_path] += num_X_wins
+        self.num_O_wins[selected_path] += num_O_wins
+        self.num_draws[selected_path] += num_draws
+
+    def _arrays(self) -> List[str]:
+        return [
+            "parent",
+            "first_child",
+            "num_children",
+            "action_index",
+            "depth",
+            "num_visits",
+            "num_X_wins",
+            "num_O_wins",
+            "num_draws",
+        ]
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = self.capacity
+        while capacity < min_capacity:
+            capacity *= 2
+        for name in self._arrays():
+            array = getattr(self, name)
+            grown_array = np.zeros(capacity, dtype=array.dtype)
+            grown_array[: self.num_nodes] = array[: self.num_nodes]
+            setattr(self, name, grown_array)
+
+    def _compact(self, root: int) -> None:
+        # collect the subtree of root level by level; children of every node stay contiguous:
+        levels = [np.array([root], dtype=np.int64)]
+        while True:
+            level = levels[-1]
+            level = level[self.num_children[level] > 0]
+            if len(level) == 0:
+                break
+            num_children = self.num_children[level].astype(np.int64)
+            offsets = np.cumsum(num_children) - num_children
+            starts = np.repeat(self.first_child[level] - offsets, num_children)
+            levels.append(starts + np.arange(num_children.sum()))
+        nodes = np.concatenate(levels)
+        new_index = np.full(self.num_nodes, -1, dtype=np.int64)
+        new_index[nodes] = np.arange(len(nodes))
+        depth = self.depth[root]
+        for name in self._arrays():
+            array = getattr(self, name)
+            array[: len(nodes)] = array[nodes]
+            array[len(nodes) :] = 0
+        self.num_nodes = len(nodes)
+        has_children = self.num_children[: self.num_nodes] > 0
+        self.first_child[: self.num_nodes][has_children] = new_index[self.first_child[: self.num_nodes][has_children]]
+        self.parent[1 : self.num_nodes] = new_index[self.parent[1 : self.num_nodes]]
+        self.parent[0] = -1
+        self.depth[: self.num_nodes] -= depth
+        self.max_depth = int(self.depth[: self.num_nodes].max())
+
+    def __str__(self):
+        output = (
+            '{cls}(\n'
+            '  uttt: {uttt}\n'
+            '  root_num_visits: {root_num_visits}\n'
+            '  size: {size}\n'
+            '  height: {height}\n'
+            '  capacity: {capacity}\n)'
+        )
+        output = output.format(
+            cls=self.__class__.__name__,
+            uttt=str(self.uttt).replace('\n', '\n  '),
+            root_num_visits=self.root_num_visits,
+            size=self.size,
+            height=self.height,
+            capacity=self.capacity,
+        )
+        return output
+
+
+class TranspositionTable:
+    """Maps position hashes to nodes, so that transpositions share one node.
+
+    A lookup cache of at most cache_size entries, the least recently used one is evicted.
+    cache_size does not bound the size of the tree: evicted nodes stay in the tree,
+    they just stop being shared. Nodes are freed when synchronize drops them from the tree.
+    """
+
+    def __init__(self, cache_size: int):
+        if cache_size < 1:
+            raise ValueError(f"invalid cache_size={cache_size}")
+        self.cache_size = cache_size
+        self.nodes = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def get_node(self, key: int) -> Node:
+        node = self.nodes.get(key)
+        if node is not None:
+            self.nodes.move_to_end(key)
+            self.num_hits += 1
+            return node
+        node = Node()
+        self.nodes[key] = node
+        self.num_misses += 1
+        if len(self.nodes) > self.cache_size:
+            self.nodes.popitem(last=False)
+            self.num_evictions += 1
+        return node
+
+    def reset(self, node: Node, uttt: UltimateTicTacToe) -> None:
+        """Keeps only nodes reachable from node, which is at the uttt position."""
+        nodes = OrderedDict()
+        depths = {}
+        dfs_index_nodes(node=node, uttt=uttt, nodes=nodes, depths=depths)
+        if len(nodes) > self.cache_size:
+            # deepest nodes become the least recently used ones, so they are evicted first:
+            keys = sorted(nodes, key=depths.__getitem__, reverse=True)
+            nodes = OrderedDict((key, nodes[key]) for key in keys[len(keys) - self.cache_size:])
+        self.nodes = nodes
+
+    @property
+    def hit_rate(self) -> float:
+        num_lookups = self.num_hits + self.num_misses
+        return self.num_hits / num_lookups if num_lookups > 0 else 0.0
+
+    def __str__(self):
+        output = (
+            '{cls}(\n'
+            '  size: {size}\n'
+            '  cache_size: {cache_size}\n'
+            '  num_hits: {num_hits}\n'
+            '  num_misses: {num_misses}\n'
+            '  num_evictions: {num_evictions}\n'
+            '  hit_rate: {hit_rate:.4f}\n)'
+        )
+        output = output.format(
+            cls=self.__class__.__name__,
+            size=len(self.nodes),
+            cache_size=self.cache_size,
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+            num_evictions=self.num_evictions,
+            hit_rate=self.hit_rate,
         )
         return output
 
 
 class Node:
 
-    def __init__(self, uttt: UltimateTicTacToe, action: Optional[Action] = None):
-        self.uttt = uttt
-        self.action = action
+    def __init__(self):
+        self.child_actions = []
         self.child_nodes = []
         self.num_visits = 0
         self.num_X_wins = 0
@@ -135,32 +524,36 @@ class Node:
     def is_leaf(self) -> bool:
         return len(self.child_nodes) == 0
 
-    def is_terminal(self) -> bool:
-        return self.uttt.is_terminated()
-
-    def expand(self) -> None:
+    def expand(
+        self,
+        uttt: UltimateTicTacToe,
+        transposition_table: Optional[TranspositionTable] = None,
+    ) -> None:
         if not self.is_leaf():
             return
-        if self.is_terminal():
+        if uttt.is_terminated():
             return
-        legal_actions = self.uttt.get_legal_actions()
+        legal_actions = uttt.get_legal_actions()
         if len(legal_actions) == 0:
             raise MonteCarloTreeSearchError("expanding node with no legal actions")
+        self.child_actions = legal_actions
+        if transposition_table is None:
+            self.child_nodes = [Node() for _ in legal_actions]
+            return
         for legal_action in legal_actions:
-            uttt = self.uttt.clone()
             uttt.execute(action=legal_action, verify=False)
-            child_node = Node(uttt=uttt, action=legal_action)
-            self.child_nodes.append(child_node)
+            self.child_nodes.append(transposition_table.get_node(key=uttt.hash))
+            uttt.undo()
 
-    def get_evaluated_state(self) -> dict:
-        if self.uttt.is_next_symbol_X():
+    def get_evaluated_state(self, uttt: UltimateTicTacToe) -> dict:
+        if uttt.is_next_symbol_X():
             num_wins = self.num_X_wins
             num_losses = self.num_O_wins
         else:
             num_wins = self.num_O_wins
             num_losses = self.num_X_wins
         return {
-            "state": self.uttt.state.copy(),
+            "state": uttt.state.copy(),
             "num_visits": self.num_visits,
             "num_wins": num_wins,
             "num_draws": self.num_draws,
@@ -173,16 +566,16 @@ class Node:
         if self.num_visits == 0:
             raise MonteCarloTreeSearchError("node was not visited")
         evaluated_actions = []
-        for child_node in self.child_nodes:
-            if child_node.action.is_symbol_X():
+        for child_action, child_node in zip(self.child_actions, self.child_nodes):
+            if child_action.is_symbol_X():
                 num_wins = child_node.num_X_wins
                 num_losses = child_node.num_O_wins
             else:
                 num_wins = child_node.num_O_wins
                 num_losses = child_node.num_X_wins
             evaluated_action = {
-                "symbol": child_node.action.symbol,
-                "index": child_node.action.index,
+                "symbol": child_action.symbol,
+                "index": child_action.index,
                 "num_visits": child_node.num_visits,
                 "num_wins": num_wins,
                 "num_draws": child_node.num_draws,
@@ -194,8 +587,6 @@ class Node:
     def __str__(self):
         output = (
             '{cls}(\n'
-            '  action: {action}\n'
-            '  uttt: {uttt}\n'
             '  num_children: {num_children}\n'
             '  num_visits: {num_visits}\n'
             '  num_X_wins: {num_X_wins}\n'
@@ -204,8 +595,6 @@ class Node:
         )
         output = output.format(
             cls=self.__class__.__name__,
-            action=self.action,
-            uttt=str(self.uttt).replace('\n', '\n  '),
             num_children=len(self.child_nodes),
             num_visits=self.num_visits,
             num_X_wins=self.num_X_wins,
@@ -215,23 +604,62 @@ class Node:
         return output
 
 
-def simulate(node: Node, exploration_strength: float) -> None:
-    selected_path = select_leaf_node(node=node, exploration_strength=exploration_strength)
+def select_action(evaluated_actions: List[dict], selection_method: str) -> Action:
+    if selection_method == "argmax":
+        max_num_visits = max(
+            evaluated_action["num_visits"] for evaluated_action in evaluated_actions
+        )
+        top_evaluated_actions = [
+            evaluated_action
+            for evaluated_action in evaluated_actions
+            if evaluated_action["num_visits"] >= max_num_visits
+        ]
+        selected_evaluated_action = random.choice(top_evaluated_actions)
+    elif selection_method == "sample":
+        num_visits_list = [
+            evaluated_action["num_visits"] for evaluated_action in evaluated_actions
+        ]
+        total_num_visits = sum(num_visits_list)
+        weights = [num_visits / total_num_visits for num_visits in num_visits_list]
+        selected_evaluated_action = random.choices(evaluated_actions, weights=weights, k=1)[0]
+    elif selection_method == "random":
+        selected_evaluated_action = random.choice(evaluated_actions)
+    else:
+        raise ValueError(f"unknown selection_method={repr(selection_method)}")
+    return Action(
+        symbol=selected_evaluated_action["symbol"],
+        index=selected_evaluated_action["index"],
+    )
+
+
+def simulate(
+    node: Node,
+    uttt: UltimateTicTacToe,
+    exploration_strength: float,
+    transposition_table: Optional[TranspositionTable] = None,
+    num_playouts: int = 1,
+) -> None:
+    selected_path = select_leaf_node(node=node, uttt=uttt, exploration_strength=exploration_strength)
     if len(selected_path) == 0:
         raise MonteCarloTreeSearchError("selected path is empty")
     leaf_node = selected_path[-1]
-    leaf_node.expand()
-    stats = playout(node=leaf_node)
+    leaf_node.expand(uttt=uttt, transposition_table=transposition_table)
+    stats = playouts(uttt=uttt, num_playouts=num_playouts)
     backprop(selected_path=selected_path, stats=stats)
+    for _ in range(len(selected_path) - 1):
+        uttt.undo()
 
 
-def select_leaf_node(node: Node, exploration_strength: float) -> List[Node]:
+def select_leaf_node(node: Node, uttt: UltimateTicTacToe, exploration_strength: float) -> List[Node]:
+    """Selects path from node to a leaf and executes its actions on uttt."""
     selected_path = []
     while not node.is_leaf():
         selected_path.append(node)
+        symbol = uttt.next_symbol
         scores = [
             UCT(
                 node=child_node,
+                symbol=symbol,
                 parent_num_visits=node.num_visits,
                 exploration_strength=exploration_strength,
             )
@@ -240,15 +668,16 @@ def select_leaf_node(node: Node, exploration_strength: float) -> List[Node]:
         top_score = max(scores)
         top_score_indices = [i for i, score in enumerate(scores) if score >= top_score]
         top_child_node_index = random.choice(top_score_indices)
+        uttt.execute(action=node.child_actions[top_child_node_index], verify=False)
         node = node.child_nodes[top_child_node_index]
     selected_path.append(node)
     return selected_path
 
 
-def UCT(node: Node, parent_num_visits: int, exploration_strength: float) -> float:
+def UCT(node: Node, symbol: int, parent_num_visits: int, exploration_strength: float) -> float:
     if node.num_visits == 0:
         return float("inf")
-    exploitation_score = value_function(node)
+    exploitation_score = value_function(node=node, symbol=symbol)
     exploration_score = exploration_strength * math.sqrt(
         math.log(parent_num_visits) / node.num_visits
     )
@@ -256,25 +685,41 @@ def UCT(node: Node, parent_num_visits: int, exploration_strength: float) -> floa
     return UCT_value
 
 
-def value_function(node: Node) -> float:
-    if node.action.is_symbol_X():
+def UCT_scores(
+    num_wins: np.ndarray,
+    num_losses: np.ndarray,
+    num_visits: np.ndarray,
+    parent_num_visits: int,
+    exploration_strength: float,
+) -> np.ndarray:
+    """UCT of all siblings at once, unvisited children score infinity."""
+    log_parent_num_visits = math.log(parent_num_visits)
+    safe_num_visits = np.maximum(num_visits, 1)
+    scores = (num_wins - num_losses) / safe_num_visits
+    scores += exploration_strength * np.sqrt(log_parent_num_visits / safe_num_visits)
+    scores[num_visits == 0] = np.inf
+    return scores
+
+
+def value_function(node: Node, symbol: int) -> float:
+    """Value of the node for the symbol which made the action leading to it."""
+    if symbol == X_STATE_VALUE:
         num_wins = node.num_X_wins
         num_losses = node.num_O_wins
-    elif node.action.is_symbol_O():
+    elif symbol == O_STATE_VALUE:
         num_wins = node.num_O_wins
         num_losses = node.num_X_wins
     return (num_wins - num_losses) / node.num_visits
 
 
-def playout(node: Node) -> Tuple[int, int, int]:
+def playout(uttt: UltimateTicTacToe) -> Tuple[int, int, int]:
     num_X_wins = 0
     num_O_wins = 0
     num_draws = 0
-    uttt = node.uttt.clone()
+    uttt = uttt.clone()
     while not uttt.is_terminated():
-        actions = uttt.get_legal_actions()
-        action = random.choice(actions)
-        uttt.execute(action, verify=False)
+        index = uttt.random_legal_index()
+        uttt.execute(Action(symbol=uttt.next_symbol, index=index), verify=False, record_undo=False)
     if uttt.is_result_X():
         num_X_wins += 1
     elif uttt.is_result_O():
@@ -284,34 +729,63 @@ def playout(node: Node) -> Tuple[int, int, int]:
     return num_X_wins, num_O_wins, num_draws
 
 
+def playouts(uttt: UltimateTicTacToe, num_playouts: int) -> Tuple[int, int, int]:
+    """Sums results of num_playouts random games, played in lock-step if more than one."""
+    if num_playouts == 1:
+        return playout(uttt=uttt)
+    states = np.tile(np.frombuffer(uttt.state, dtype=np.uint8), (num_playouts, 1))
+    # seeded from random, so that random.seed makes searches reproducible:
+    rng = np.random.default_rng(random.getrandbits(64))
+    results = batch_playout(states=states, rng=rng)[:, UTTT_RESULT_STATE_INDEX]
+    counts = np.bincount(results, minlength=4).tolist()
+    return counts[X_STATE_VALUE], counts[O_STATE_VALUE], counts[DRAW_STATE_VALUE]
+
+
 def backprop(selected_path: List[Node], stats: Tuple[int, int, int]) -> None:
     num_X_wins, num_O_wins, num_draws = stats
+    num_visits = num_X_wins + num_O_wins + num_draws
     for node in selected_path:
-        node.num_visits += 1
+        node.num_visits += num_visits
         node.num_X_wins += num_X_wins
         node.num_O_wins += num_O_wins
         node.num_draws += num_draws
 
 
 def bfs_count_nodes(node: Node) -> int:
-    cnt = 0
+    visited = {id(node)}
     nodes = deque([node])
     while len(nodes) > 0:
         node = nodes.popleft()
-        cnt += 1
-        nodes.extend(node.child_nodes)
-    return cnt
-
-
-def dfs_max_depth(node: Node, depth: int) -> int:
-    if len(node.child_nodes) == 0:
-        return depth
+        for child_node in node.child_nodes:
+            if id(child_node) not in visited:
+                visited.add(id(child_node))
+                nodes.append(child_node)
+    return len(visited)
+
+
+def dfs_max_depth(node: Node, depth: int, visited: Optional[set] = None) -> int:
+    # every path to a shared node has the same length (number of actions),
+    # so each node of a DAG needs to be visited once:
+    if visited is None:
+        visited = set()
+    visited.add(id(node))
     max_depth = depth
     for child_node in node.child_nodes:
-        max_depth = max(max_depth, dfs_max_depth(node=child_node, depth=depth + 1))
+        if id(child_node) not in visited:
+            max_depth = max(max_depth, dfs_max_depth(node=child_node, depth=depth + 1, visited=visited))
     return max_depth
 
 
+def dfs_index_nodes(node: Node, uttt: UltimateTicTacToe, nodes: OrderedDict, depths: dict, depth: int = 1) -> None:
+    for child_action, child_node in zip(node.child_actions, node.child_nodes):
+        uttt.execute(action=child_action, verify=False)
+        if uttt.hash not in nodes:
+            nodes[uttt.hash] = child_node
+            depths[uttt.hash] = depth
+            dfs_index_nodes(node=child_node, uttt=uttt, nodes=nodes, depths=depths, depth=depth + 1)
+        uttt.undo()
+
+
 def serialize_evaluated_state(evaluated_state: dict) -> str:
     state = "".join(map(str, evaluated_state["state"]))
     num_visits = str(evaluated_state["num_visits"])
@@ -2,17 +2,20 @@ from __future__ import annotations
 
 import math
 import random
-from collections import deque
+import sys
+from collections import OrderedDict, deque
 from multiprocessing.queues import Queue
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import numpy as np
 import torch
 from tqdm import tqdm
 
 from utttpy.game.action import Action
-from utttpy.game.helpers import row_index, col_index, get_state_ndarray_4x9x9
+from utttpy.game.helpers import row_index, col_index, get_state_ndarray_4x9x9, get_states_ndarray_Nx4x9x9
+from utttpy.game.symmetry import SYMMETRY_INDEX_MAPS, canonicalize_state
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.game.zobrist import zobrist_hash
 from utttpy.selfplay.policy_value_network import PolicyValueNetwork
 
 
@@ -24,19 +27,33 @@ class NeuralMonteCarloTreeSearch:
         num_simulations: int,
         exploration_strength: float,
         policy_value_net: PolicyValueNetwork,
+        batch_size: int = 1,
+        evaluation_cache: Optional[EvaluationCache] = None,
     ):
-        self.tree = Tree(root=Node(uttt=uttt))
+        if batch_size < 1:
+            raise ValueError(f"invalid batch_size={batch_size}")
+        self.tree = Tree(root=Node(), uttt=uttt)
         self.num_simulations = num_simulations
         self.exploration_strength = exploration_strength
         self.policy_value_net = policy_value_net
+        self.batch_size = batch_size
+        self.evaluation_cache = evaluation_cache  # shared only by searches with the same network
 
     def run(self, progress_bar: bool = False) -> None:
         num_run_simulations = self.num_simulations - self.tree.root.visit_count
-        for i in tqdm(range(num_run_simulations), disable=not progress_bar):
-            self._simulate()
+        if self.batch_size == 1:
+            for i in tqdm(range(num_run_simulations), disable=not progress_bar):
+                self._simulate()
+            return
+        with tqdm(total=max(0, num_run_simulations), disable=not progress_bar) as pbar:
+            while self.tree.root.visit_count < self.num_simulations:
+                root_visit_count = self.tree.root.visit_count
+                batch_size = min(self.batch_size, self.num_simulations - root_visit_count)
+                self._simulate_batch(batch_size=batch_size)
+                pbar.update(self.tree.root.visit_count - root_visit_count)
 
     def get_evaluated_state(self) -> dict:
-        return self.tree.root.get_evaluated_state()
+        return self.tree.root.get_evaluated_state(uttt=self.tree.uttt)
 
     def get_evaluated_actions(self) -> List[dict]:
         return self.tree.root.get_evaluated_actions()
@@ -78,60 +95,167 @@ class NeuralMonteCarloTreeSearch:
         if len(selected_path) == 0:
             raise NeuralMonteCarloTreeSearchError("selected path is empty")
         leaf_node = selected_path[-1]
-        leaf_node.expand()
-        self._evaluate(node=leaf_node, softmax_temperature=1.0)
+        leaf_node.expand(uttt=self.tree.uttt)
+        self._evaluate(node=leaf_node, uttt=self.tree.uttt, softmax_temperature=1.0)
         self._backprop(selected_path=selected_path, state_value=leaf_node.state_value)
+        for _ in range(len(selected_path) - 1):
+            self.tree.uttt.undo()
+
+    def _simulate_batch(self, batch_size: int) -> None:
+        """Selects batch_size leaves under virtual loss and evaluates them with one network call.
+
+        Each distinct leaf is evaluated and backed up once, repeated selections of a leaf
+        count against batch_size without adding visits, so the root gets one visit per evaluation.
+        """
+        selected_paths = []
+        leaf_uttts = {}  # leaves to evaluate, one uttt per distinct leaf
+        for _ in range(batch_size):
+            selected_path = self._select_leaf_node()
+            if len(selected_path) == 0:
+                raise NeuralMonteCarloTreeSearchError("selected path is empty")
+            leaf_node = selected_path[-1]
+            if id(leaf_node) not in leaf_uttts:
+                self._add_virtual_loss(selected_path=selected_path, sign=1)
+                selected_paths.append(selected_path)
+                leaf_uttts[id(leaf_node)] = (leaf_node, self.tree.uttt.clone())
+            for _ in range(len(selected_path) - 1):
+                self.tree.uttt.undo()
+        self._evaluate_batch(leaf_uttts=list(leaf_uttts.values()), softmax_temperature=1.0)
+        for selected_path in selected_paths:
+            self._add_virtual_loss(selected_path=selected_path, sign=-1)
+            self._backprop(selected_path=selected_path, state_value=selected_path[-1].state_value)
+
+    def _evaluate_batch(self, leaf_uttts: List[tuple], softmax_temperature: float) -> None:
+        nonterminal_leaf_uttts = []
+        for leaf_node, uttt in leaf_uttts:
+            if uttt.is_terminated():
+                self._evaluate(node=leaf_node, uttt=uttt, softmax_temperature=softmax_temperature)
+            else:
+                leaf_node.expand(uttt=uttt)
+                if not self._evaluate_cached(node=leaf_node, uttt=uttt, softmax_temperature=softmax_temperature):
+                    nonterminal_leaf_uttts.append((leaf_node, uttt))
+        if len(nonterminal_leaf_uttts) == 0:
+            return
+        states = np.frombuffer(b"".join(uttt.state for _, uttt in nonterminal_leaf_uttts), dtype=np.uint8)
+        input_Nx4x9x9 = get_states_ndarray_Nx4x9x9(states=states.reshape(len(nonterminal_leaf_uttts), -1))
+        input_Nx4x9x9 = torch.from_numpy(input_Nx4x9x9)
+        input_Nx4x9x9 = input_Nx4x9x9.to(device=self.policy_value_net.device, dtype=torch.float32)
+        with torch.no_grad():
+            policy_logits, action_values, state_values = self.policy_value_net(input_Nx4x9x9)
+        policy_logits = policy_logits.cpu()
+        state_values = state_values.cpu().tolist()
+        for i, (leaf_node, uttt) in enumerate(nonterminal_leaf_uttts):
+            legal_policy_logits = self._gather_legal_policy_logits(node=leaf_node, policy_logits_tensor=policy_logits[i])
+            self._cache_evaluation(uttt=uttt, legal_policy_logits=legal_policy_logits, state_value=state_values[i])
+            self._set_action_probabilities(
+                node=leaf_node,
+                legal_policy_logits=legal_policy_logits,
+                softmax_temperature=softmax_temperature,
+            )
+            leaf_node.state_value = state_values[i]
+
+    def _add_virtual_loss(self, selected_path: List[Node], sign: int) -> None:
+        # counted apart from visit_count and state_value_sum, so removing it leaves them exact:
+        for node in selected_path:
+            node.virtual_loss_count += sign
 
     def _select_leaf_node(self) -> List[Node]:
+        """Selects path from root to a leaf and executes its actions on tree.uttt."""
         selected_path = []
         node = self.tree.root
         while not node.is_leaf():
             selected_path.append(node)
             scores = [
-                self._Q(child_node) + self._U(child_node, node.visit_count)
+                self._Q(child_node) + self._U(child_node, node.visit_count + node.virtual_loss_count)
                 for child_node in node.child_nodes
             ]
             top_score = max(scores)
             top_score_indices = [i for i, score in enumerate(scores) if score >= top_score]
             top_child_node_index = random.choice(top_score_indices)
             node = node.child_nodes[top_child_node_index]
+            self.tree.uttt.execute(action=node.action, verify=False)
         selected_path.append(node)
         return selected_path
 
     def _Q(self, node: Node) -> float:
-        return -node.state_value_mean
+        if node.virtual_loss_count == 0:
+            return -node.state_value_mean
+        # each virtual loss is a visit valued as a win for the player to move at the node,
+        # i.e. as a loss for the player choosing it in the parent:
+        virtual_visit_count = node.visit_count + node.virtual_loss_count
+        return -(node.state_value_sum + node.virtual_loss_count) / virtual_visit_count
 
     def _U(self, node: Node, parent_visit_count: int) -> float:
         return (
             self.exploration_strength * max(0.01, node.action_probability) * math.sqrt(parent_visit_count)
-            / (node.visit_count + 1)
+            / (node.visit_count + node.virtual_loss_count + 1)
         )
 
-    def _evaluate(self, node: Node, softmax_temperature: float) -> None:
-        if node.is_terminal():
-            if node.uttt.is_result_draw():
+    def _evaluate(self, node: Node, uttt: UltimateTicTacToe, softmax_temperature: float) -> None:
+        if uttt.is_terminated():
+            if uttt.is_result_draw():
                 node.state_value = 0.0
             else:
                 node.state_value = -1.0
             return
-        input_4x9x9 = get_state_ndarray_4x9x9(uttt=node.uttt)
+        if self._evaluate_cached(node=node, uttt=uttt, softmax_temperature=softmax_temperature):
+            return
+        input_4x9x9 = get_state_ndarray_4x9x9(uttt=uttt)
         input_1x4x9x9 = np.expand_dims(input_4x9x9, axis=0)
         input_1x4x9x9 = torch.from_numpy(input_1x4x9x9)
         input_1x4x9x9 = input_1x4x9x9.to(device=self.policy_value_net.device, dtype=torch.float32)
         with torch.no_grad():
             policy_logits, action_values, state_value = self.policy_value_net(input_1x4x9x9)
-        policy_logits_tensor = policy_logits[0].cpu()
-        policy_logits_list = []
-        for child_node in node.child_nodes:
-            action_index = child_node.action.index
-            action_logit = policy_logits_tensor[row_index(action_index), col_index(action_index)].item()
-            policy_logits_list.append(action_logit)
-        policy_logits_tensor = torch.tensor(policy_logits_list)
-        policy_probas_tensor = torch.softmax(policy_logits_tensor / softmax_temperature, dim=0)
-        for i, child_node in enumerate(node.child_nodes):
-            child_node.action_probability = policy_probas_tensor[i].item()
+        legal_policy_logits = self._gather_legal_policy_logits(node=node, policy_logits_tensor=policy_logits[0].cpu())
         state_value = state_value[0].item()
+        self._cache_evaluation(uttt=uttt, legal_policy_logits=legal_policy_logits, state_value=state_value)
+        self._set_action_probabilities(
+            node=node,
+            legal_policy_logits=legal_policy_logits,
+            softmax_temperature=softmax_temperature,
+        )
+        node.state_value = state_value
+
+    def _evaluate_cached(self, node: Node, uttt: UltimateTicTacToe, softmax_temperature: float) -> bool:
+        if self.evaluation_cache is None:
+            return False
+        evaluation = self.evaluation_cache.get_evaluation(uttt=uttt)
+        if evaluation is None:
+            return False
+        legal_policy_logits, state_value = evaluation
+        self._set_action_probabilities(
+            node=node,
+            legal_policy_logits=torch.from_numpy(legal_policy_logits),
+            softmax_temperature=softmax_temperature,
+        )
         node.state_value = state_value
+        return True
+
+    def _cache_evaluation(
+        self, uttt: UltimateTicTacToe, legal_policy_logits: torch.Tensor, state_value: float
+    ) -> None:
+        if self.evaluation_cache is None:
+            return
+        self.evaluation_cache.put_evaluation(
+            uttt=uttt,
+            legal_policy_logits=legal_policy_logits.numpy().copy(),
+            state_value=state_value,
+        )
+
+    def _gather_legal_policy_logits(self, node: Node, policy_logits_tensor: torch.Tensor) -> torch.Tensor:
+        """Policy logits of node children, in the order of node.child_nodes."""
+        action_indexes = [child_node.action.index for child_node in node.child_nodes]
+        return policy_logits_tensor[
+            [row_index(action_index) for action_index in action_indexes],
+            [col_index(action_index) for action_index in action_indexes],
+        ]
+
+    def _set_action_probabilities(
+        self, node: Node, legal_policy_logits: torch.Tensor, softmax_temperature: float
+    ) -> None:
+        policy_probas_tensor = torch.softmax(legal_policy_logits / softmax_temperature, dim=0)
+        for child_node, action_probability in zip(node.child_nodes, policy_probas_tensor.tolist()):
+            child_node.action_probability = action_probability
 
     def _backprop(self, selected_path: List[Node], state_value: float) -> None:
         sign = 1
@@ -146,13 +270,17 @@ class NeuralMonteCarloTreeSearch:
             '{cls}(\n'
             '  tree: {tree}\n'
             '  num_simulations: {num_simulations}\n'
-            '  exploration_strength: {exploration_strength}\n)'
+            '  exploration_strength: {exploration_strength}\n'
+            '  batch_size: {batch_size}\n'
+            '  evaluation_cache: {evaluation_cache}\n)'
         )
         output = output.format(
             cls=self.__class__.__name__,
             tree=str(self.tree).replace('\n', '\n  '),
             num_simulations=self.num_simulations,
             exploration_strength=self.exploration_strength,
+            batch_size=self.batch_size,
+            evaluation_cache=str(self.evaluation_cache).replace('\n', '\n  '),
         )
         return output
 
@@ -167,35 +295,37 @@ class NeuralMonteCarloTreeSearchWorker(NeuralMonteCarloTreeSearch):
         worker_id: int,
         input_queue: Queue,
         prediction_queue: Queue,
+        evaluation_cache: Optional[EvaluationCache] = None,
     ):
-        self.tree = Tree(root=Node(uttt=uttt))
+        self.tree = Tree(root=Node(), uttt=uttt)
         self.num_simulations = num_simulations
         self.exploration_strength = exploration_strength
         self.worker_id = worker_id
         self.input_queue = input_queue
         self.prediction_queue = prediction_queue
+        self.batch_size = 1
+        self.evaluation_cache = evaluation_cache
 
-    def _evaluate(self, node: Node, softmax_temperature: float) -> None:
-        if node.is_terminal():
-            if node.uttt.is_result_draw():
+    def _evaluate(self, node: Node, uttt: UltimateTicTacToe, softmax_temperature: float) -> None:
+        if uttt.is_terminated():
+            if uttt.is_result_draw():
                 node.state_value = 0.0
             else:
                 node.state_value = -1.0
             return
-        input_4x9x9 = get_state_ndarray_4x9x9(uttt=node.uttt)
-        input_4x9x9 = torch.from_numpy(input_4x9x9).to(dtype=torch.float32)
-        self.input_queue.put((self.worker_id, input_4x9x9))
+        if self._evaluate_cached(node=node, uttt=uttt, softmax_temperature=softmax_temperature):
+            return
+        # the state is encoded together with states of other workers:
+        self.input_queue.put((self.worker_id, bytes(uttt.state)))
         prediction = self.prediction_queue.get()
         policy_logits_tensor, state_value = prediction
-        policy_logits_list = []
-        for child_node in node.child_nodes:
-            action_index = child_node.action.index
-            action_logit = policy_logits_tensor[row_index(action_index), col_index(action_index)].item()
-            policy_logits_list.append(action_logit)
-        policy_logits_tensor = torch.tensor(policy_logits_list)
-        policy_probas_tensor = torch.softmax(policy_logits_tensor / softmax_temperature, dim=0)
-        for i, child_node in enumerate(node.child_nodes):
-            child_node.action_probability = policy_probas_tensor[i].item()
+        legal_policy_logits = self._gather_legal_policy_logits(node=node, policy_logits_tensor=policy_logits_tensor)
+        self._cache_evaluation(uttt=uttt, legal_policy_logits=legal_policy_logits, state_value=state_value)
+        self._set_action_probabilities(
+            node=node,
+            legal_policy_logits=legal_policy_logits,
+            softmax_temperature=softmax_temperature,
+        )
         node.state_value = state_value
 
     def __str__(self):
@@ -216,10 +346,119 @@ class NeuralMonteCarloTreeSearchWorker(NeuralMonteCarloTreeSearch):
         return output
 
 
+class EvaluationCache:
+    """LRU cache of network evaluations keyed by position hash.
+
+    Holds policy logits of legal actions (in get_legal_indexes order) and the state value
+    of each position. Memory use is estimated per entry as the size of the logits array
+    plus a fixed overhead, and least recently used entries are evicted above max_memory_bytes.
+    """
+
+    ENTRY_OVERHEAD_BYTES = 256  # key, value tuple, float and OrderedDict link
+
+    def __init__(self, max_memory_bytes: int):
+        self.max_memory_bytes = max_memory_bytes
+        self.evaluations = OrderedDict()
+        self.memory_bytes = 0
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def get(self, key: int) -> Optional[Tuple[np.ndarray, float]]:
+        evaluation = self.evaluations.get(key)
+        if evaluation is None:
+            self.num_misses += 1
+            return None
+        self.evaluations.move_to_end(key)
+        self.num_hits += 1
+        return evaluation
+
+    def put(self, key: int, legal_policy_logits: np.ndarray, state_value: float) -> None:
+        if key in self.evaluations:
+            self.evaluations.move_to_end(key)
+            return
+        self.evaluations[key] = (legal_policy_logits, state_value)
+        self.memory_bytes += self._entry_memory_bytes(legal_policy_logits=legal_policy_logits)
+        while self.memory_bytes > self.max_memory_bytes and len(self.evaluations) > 0:
+            _, (evicted_legal_policy_logits, _) = self.evaluations.popitem(last=False)
+            self.memory_bytes -= self._entry_memory_bytes(legal_policy_logits=evicted_legal_policy_logits)
+            self.num_evictions += 1
+
+    def get_evaluation(self, uttt: UltimateTicTacToe) -> Optional[Tuple[np.ndarray, float]]:
+        return self.get(key=uttt.hash)
+
+    def put_evaluation(self, uttt: UltimateTicTacToe, legal_policy_logits: np.ndarray, state_value: float) -> None:
+        self.put(key=uttt.hash, legal_policy_logits=legal_policy_logits, state_value=state_value)
+
+    @property
+    def hit_rate(self) -> float:
+        num_lookups = self.num_hits + self.num_misses
+        return self.num_hits / num_lookups if num_lookups > 0 else 0.0
+
+    def _entry_memory_bytes(self, legal_policy_logits: np.ndarray) -> int:
+        return sys.getsizeof(legal_policy_logits) + self.ENTRY_OVERHEAD_BYTES
+
+    def __str__(self):
+        output = (
+            '{cls}(\n'
+            '  size: {size}\n'
+            '  memory_bytes: {memory_bytes}\n'
+            '  max_memory_bytes: {max_memory_bytes}\n'
+            '  num_hits: {num_hits}\n'
+            '  num_misses: {num_misses}\n'
+            '  num_evictions: {num_evictions}\n'
+            '  hit_rate: {hit_rate:.4f}\n)'
+        )
+        output = output.format(
+            cls=self.__class__.__name__,
+            size=len(self.evaluations),
+            memory_bytes=self.memory_bytes,
+            max_memory_bytes=self.max_memory_bytes,
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+            num_evictions=self.num_evictions,
+            hit_rate=self.hit_rate,
+        )
+        return output
+
+
+class SymmetricEvaluationCache(EvaluationCache):
+    """EvaluationCache keyed by the canonical form of a position among its 8 board symmetries.
+
+    Policy logits are stored in the canonical orientation and permuted back to the orientation
+    of the queried position. The network is not exactly equivariant, so a hit on a symmetric
+    position returns the evaluation of another orientation than a fresh network call would.
+    """
+
+    def get_evaluation(self, uttt: UltimateTicTacToe) -> Optional[Tuple[np.ndarray, float]]:
+        canonical_state, symmetry = canonicalize_state(uttt.state)
+        evaluation = self.get(key=zobrist_hash(canonical_state))
+        if evaluation is None:
+            return None
+        canonical_legal_policy_logits, state_value = evaluation
+        legal_policy_logits = np.empty_like(canonical_legal_policy_logits)
+        legal_policy_logits[self._canonical_order(uttt=uttt, symmetry=symmetry)] = canonical_legal_policy_logits
+        return legal_policy_logits, state_value
+
+    def put_evaluation(self, uttt: UltimateTicTacToe, legal_policy_logits: np.ndarray, state_value: float) -> None:
+        canonical_state, symmetry = canonicalize_state(uttt.state)
+        self.put(
+            key=zobrist_hash(canonical_state),
+            legal_policy_logits=legal_policy_logits[self._canonical_order(uttt=uttt, symmetry=symmetry)],
+            state_value=state_value,
+        )
+
+    def _canonical_order(self, uttt: UltimateTicTacToe, symmetry: int) -> np.ndarray:
+        """Permutation of legal indexes of uttt into the get_legal_indexes order of the canonical position."""
+        index_map = SYMMETRY_INDEX_MAPS[symmetry]
+        return np.argsort([index_map[l_i] for l_i in uttt.get_legal_indexes()])
+
+
 class Tree:
 
-    def __init__(self, root: Node):
+    def __init__(self, root: Node, uttt: UltimateTicTacToe):
         self.root = root
+        self.uttt = uttt.clone()  # root position, walked down and back up by simulations
 
     @property
     def size(self) -> int:
@@ -230,11 +469,16 @@ class Tree:
         return self._dfs_max_depth(node=self.root, depth=0)
 
     def synchronize(self, uttt: UltimateTicTacToe) -> None:
+        root = Node()
         for child_node in self.root.child_nodes:
-            if uttt.is_equal_to(child_node.uttt):
-                self.root = child_node
-                return
-        self.root = Node(uttt=uttt.clone())
+            self.uttt.execute(action=child_node.action, verify=False)
+            is_equal = uttt.hash == self.uttt.hash and uttt.is_equal_to(self.uttt)
+            self.uttt.undo()
+            if is_equal:
+                root = child_node
+                break
+        self.root = root
+        self.uttt = uttt.clone()
 
     def _bfs_count_nodes(self, node: Node) -> int:
         cnt = 0
@@ -258,12 +502,14 @@ class Tree:
     def __str__(self):
         output = (
             '{cls}(\n'
+            '  uttt: {uttt}\n'
             '  root: {root}\n'
             '  size: {size}\n'
             '  height: {height}\n)'
         )
         output = output.format(
             cls=self.__class__.__name__,
+            uttt=str(self.uttt).replace('\n', '\n  '),
             root=str(self.root).replace('\n', '\n  '),
             size=self.size,
             height=self.height,
@@ -273,12 +519,12 @@ class Tree:
 
 class Node:
 
-    def __init__(self, uttt: UltimateTicTacToe, action: Optional[Action] = None):
-        self.uttt = uttt
+    def __init__(self, action: Optional[Action] = None):
         self.action = action
         self.action_probability = None
         self.child_nodes = []
         self.visit_count = 0
+        self.virtual_loss_count = 0  # pending selections of batched simulations
         self.state_value = None
         self.state_value_sum = 0.0
         self.state_value_mean = 0.0
@@ -286,26 +532,19 @@ class Node:
     def is_leaf(self) -> bool:
         return len(self.child_nodes) == 0
 
-    def is_terminal(self) -> bool:
-        return self.uttt.is_terminated()
-
-    def expand(self) -> None:
+    def expand(self, uttt: UltimateTicTacToe) -> None:
         if not self.is_leaf():
             return
-        if self.is_terminal():
+        if uttt.is_terminated():
             return
-        legal_actions = self.uttt.get_legal_actions()
+        legal_actions = uttt.get_legal_actions()
         if len(legal_actions) == 0:
             raise NeuralMonteCarloTreeSearchError("expanding node with no legal actions")
-        for legal_action in legal_actions:
-            uttt = self.uttt.clone()
-            uttt.execute(action=legal_action, verify=False)
-            child_node = Node(uttt=uttt, action=legal_action)
-            self.child_nodes.append(child_node)
+        self.child_nodes = [Node(action=legal_action) for legal_action in legal_actions]
 
-    def get_evaluated_state(self) -> dict:
+    def get_evaluated_state(self, uttt: UltimateTicTacToe) -> dict:
         return {
-            "state": self.uttt.state.copy(),
+            "state": uttt.state.copy(),
             "visit_count": self.visit_count,
             "state_value_mean": self.state_value_mean,
         }
@@ -331,7 +570,6 @@ class Node:
             '{cls}(\n'
             '  action: {action}\n'
             '  action_probability: {action_probability}\n'
-            '  uttt: {uttt}\n'
             '  num_children: {num_children}\n'
             '  visit_count: {visit_count}\n'
             '  state_value: {state_value}\n'
@@ -340,7 +578,6 @@ class Node:
         )
         output = output.format(
             cls=self.__class__.__name__,
-            uttt=str(self.uttt).replace('\n', '\n  '),
             action=self.action,
             action_probability=self.action_probability,
             num_children=len(self.child_nodes),
@@ -0,0 +1,177 @@
+import multiprocessing
+import random
+from multiprocessing.connection import Connection
+from typing import Iterable, List, Optional
+
+from tqdm import tqdm
+
+from utttpy.game.action import Action
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.monte_carlo_tree_search import MonteCarloTreeSearch, select_action
+
+
+class RootParallelMonteCarloTreeSearch:
+    """Root parallelization of MonteCarloTreeSearch.
+
+    Each of num_workers processes keeps its own tree of the same root position,
+    seeded independently, and runs its share of num_simulations.
+    Root statistics of all trees are summed into one evaluation.
+    """
+
+    def __init__(
+        self,
+        uttt: UltimateTicTacToe,
+        num_simulations: int,
+        exploration_strength: float,
+        num_workers: int,
+        transposition_table_cache_size: Optional[int] = None,
+        tree_storage: str = "arrays",
+        num_playouts_per_leaf: int = 1,
+    ):
+        if num_workers < 1:
+            raise ValueError(f"invalid num_workers={num_workers}")
+        self.uttt = uttt.clone()
+        self.num_simulations = num_simulations
+        self.exploration_strength = exploration_strength
+        self.num_workers = num_workers
+        self.num_playouts_per_leaf = num_playouts_per_leaf
+        mcts_kwargs = {
+            "num_simulations": 0,
+            "exploration_strength": exploration_strength,
+            "transposition_table_cache_size": transposition_table_cache_size,
+            "tree_storage": tree_storage,
+            "num_playouts_per_leaf": num_playouts_per_leaf,
+        }
+        self.connections = []
+        self.processes = []
+        for worker_id in range(num_workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=root_parallel_worker,
+                args=(
+                    worker_connection,
+                    self.uttt.state.copy(),
+                    random.getrandbits(64),
+                    mcts_kwargs,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def run(self, progress_bar: bool = False) -> None:
+        for worker_id, connection in enumerate(self.connections):
+            num_worker_simulations = self.num_simulations // self.num_workers
+            if worker_id < self.num_simulations % self.num_workers:
+                num_worker_simulations += 1
+            connection.send(("run", num_worker_simulations))
+        self._recv_all(connections=tqdm(self.connections, disable=not progress_bar))
+
+    def get_evaluated_state(self) -> dict:
+        evaluated_state = None
+        for worker_evaluated_state in self._request("get_evaluated_state"):
+            if evaluated_state is None:
+                evaluated_state = worker_evaluated_state
+                continue
+            for key in ["num_visits", "num_wins", "num_draws", "num_losses"]:
+                evaluated_state[key] += worker_evaluated_state[key]
+        return evaluated_state
+
+    def get_evaluated_actions(self) -> List[dict]:
+        evaluated_actions = {}
+        for worker_evaluated_actions in self._request("get_evaluated_actions"):
+            for worker_evaluated_action in worker_evaluated_actions:
+                index = worker_evaluated_action["index"]
+                if index not in evaluated_actions:
+                    evaluated_actions[index] = worker_evaluated_action
+                    continue
+                for key in ["num_visits", "num_wins", "num_draws", "num_losses"]:
+                    evaluated_actions[index][key] += worker_evaluated_action[key]
+        return list(evaluated_actions.values())
+
+    def select_action(
+        self, evaluated_actions: List[dict], selection_method: str
+    ) -> Action:
+        return select_action(evaluated_actions=evaluated_actions, selection_method=selection_method)
+
+    def synchronize(self, uttt: UltimateTicTacToe) -> None:
+        self.uttt = uttt.clone()
+        self._request("synchronize", self.uttt.state.copy())
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def _request(self, command: str, arg: object = None) -> list:
+        for connection in self.connections:
+            connection.send((command, arg))
+        return self._recv_all(connections=self.connections)
+
+    def _recv_all(self, connections: Iterable[Connection]) -> list:
+        # read every reply before raising, so no stale reply is left in a pipe:
+        responses = [connection.recv() for connection in connections]
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+        return responses
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __str__(self):
+        output = (
+            '{cls}(\n'
+            '  uttt: {uttt}\n'
+            '  num_workers: {num_workers}\n'
+            '  num_simulations: {num_simulations}\n'
+            '  exploration_strength: {exploration_strength}\n'
+            '  num_playouts_per_leaf: {num_playouts_per_leaf}\n)'
+        )
+        output = output.format(
+            cls=self.__class__.__name__,
+            uttt=str(self.uttt).replace('\n', '\n  '),
+            num_workers=self.num_workers,
+            num_simulations=self.num_simulations,
+            exploration_strength=self.exploration_strength,
+            num_playouts_per_leaf=self.num_playouts_per_leaf,
+        )
+        return output
+
+
+def root_parallel_worker(
+    connection: Connection,
+    uttt_state: bytearray,
+    random_seed: int,
+    mcts_kwargs: dict,
+) -> None:
+    random.seed(random_seed)
+    mcts = MonteCarloTreeSearch(uttt=UltimateTicTacToe(state=uttt_state), **mcts_kwargs)
+    while True:
+        command, arg = connection.recv()
+        if command == "close":
+            return
+        try:
+            if command == "run":
+                mcts.num_simulations = arg
+                mcts.run()
+                response = None
+            elif command == "get_evaluated_state":
+                response = mcts.get_evaluated_state()
+            elif command == "get_evaluated_actions":
+                response = mcts.get_evaluated_actions()
+            elif command == "synchronize":
+                mcts.synchronize(uttt=UltimateTicTacToe(state=arg))
+                response = None
+            else:
+                raise ValueError(f"unknown command={repr(command)}")
+        except Exception as exception:
+            response = exception
+        connection.send(response)
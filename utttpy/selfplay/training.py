@@ -1,20 +1,32 @@
+from __future__ import annotations
+
 import json
+import multiprocessing
 import pathlib
+import queue
+import os
 import random
+import threading
+import time
+import zlib
 from collections import deque
-from typing import Dict, Iterator, List
+from functools import lru_cache
+from multiprocessing.queues import Queue
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import torch
 
 from utttpy.game.helpers import row_index, col_index, get_state_ndarray_4x9x9
+from utttpy.game.symmetry import NUM_SYMMETRIES, SYMMETRY_GATHER_POSITIONS_9x9
 from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.datatools import BinaryDatapoints, StreamingDatapoints
 from utttpy.selfplay.policy_value_network import PolicyValueNetwork
 
 
 def train_policy_value_net(
     policy_value_net: PolicyValueNetwork,
-    dataset: Dict[str, List[dict]],
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
     training_dirpath: pathlib.Path,
     num_train_iters: int,
     batch_size: int,
@@ -27,21 +39,73 @@ def train_policy_value_net(
     print_loss_iters: int,
     save_checkpoint_iters: int,
     automatic_mixed_precision: bool,
+    num_batch_workers: int = 0,
+    prefetch_size: int = 4,
+    pin_memory: bool = False,
+    channels_last: bool = False,
+    resume: bool = False,
 ) -> None:
+    """Trains policy_value_net, saving checkpoints and loss history to training_dirpath.
+
+    Every save_checkpoint_iters, policy_value_net_{iteration}.pt and training_state.pt
+    (full training state) are saved in the background. With resume, training continues
+    from training_state.pt in training_dirpath exactly as if it was not interrupted:
+    the training state includes the sampling state after the last trained batch
+    (see make_ndarray_batch_iterator), so batch generation continues from there.
+    """
     policy_value_net.train()
 
+    if channels_last:
+        policy_value_net.to(memory_format=torch.channels_last)
+
     optimizer = torch.optim.Adam(params=policy_value_net.parameters(), lr=lr_schedule[0])
 
-    if automatic_mixed_precision:
-        scaler = torch.cuda.amp.GradScaler()
+    scaler = torch.cuda.amp.GradScaler(enabled=automatic_mixed_precision)
 
-    train_batch_iterator = train_batch_generator(dataset, batch_size, policy_value_net.device)
-    loss_values = deque(maxlen=print_loss_iters)
     loss_history = []
+    last_iteration = 0
+    sampling_state = None
+    if resume:
+        training_state_path = training_dirpath / "training_state.pt"
+        training_state = torch.load(training_state_path, map_location=policy_value_net.device)
+        policy_value_net.load_state_dict(training_state["policy_value_net"])
+        optimizer.load_state_dict(training_state["optimizer"])
+        scaler.load_state_dict(training_state["scaler"])
+        loss_history = training_state["loss_history"]
+        last_iteration = training_state["iteration"]
+        sampling_state = training_state["sampling_state"]
+        set_random_state(training_state["random_state"])
+        del training_state
+        # learning rate is restored with the optimizer, batch norm momentum is not a part of state dicts:
+        bnm_iterations = [iteration for iteration in bnm_schedule if iteration <= last_iteration]
+        if bnm_iterations:
+            set_batch_norm_momentum(policy_value_net, bnm_value=bnm_schedule[max(bnm_iterations)])
+        print(f"training resumed from {training_state_path} at iteration={last_iteration} successfully!")
 
-    for iteration in range(1, num_train_iters + 1):
+    ndarray_batch_iterator = make_ndarray_batch_iterator(
+        dataset=dataset,
+        batch_size=batch_size,
+        num_batch_workers=num_batch_workers,
+        prefetch_size=prefetch_size,
+        sampling_state=sampling_state,
+    )
+    train_batch_iterator = BatchTransfer(
+        ndarray_batch_iterator=ndarray_batch_iterator,
+        device=policy_value_net.device,
+        pin_memory=pin_memory,
+    )
+    checkpoint_saver = BackgroundCheckpointSaver()
+    loss_values = deque(maxlen=print_loss_iters)
+    compute_time = 0.0
+
+    for iteration in range(last_iteration + 1, num_train_iters + 1):
 
         train_batch = next(train_batch_iterator)
+        compute_start_time = time.perf_counter()
+
+        train_batch = random_orientation_batch(train_batch)
+        if channels_last:
+            train_batch["inputs"] = train_batch["inputs"].contiguous(memory_format=torch.channels_last)
 
         optimizer.zero_grad()
 
@@ -53,16 +117,14 @@ def train_policy_value_net(
                 action_values_loss_weight=action_values_loss_weight,
                 state_value_loss_weight=state_value_loss_weight,
             )
-        if automatic_mixed_precision:
-            scaler.scale(loss).backward()
-            scaler.step(optimizer)
-            scaler.update()
-        else:
-            loss.backward()
-            optimizer.step()
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
 
+        # item() waits for the device, so compute time includes all queued kernels:
         loss_value = loss.item()
         loss_values.append(loss_value)
+        compute_time += time.perf_counter() - compute_start_time
 
         if iteration % print_loss_iters == 0:
             mean_loss_value = sum(loss_values) / len(loss_values)
@@ -76,53 +138,371 @@ def train_policy_value_net(
                 f" max={max_loss_value:.6f}"
                 f" min={min_loss_value:.6f}"
             )
+            # milliseconds per iteration, device_copy runs on a side stream and overlaps with compute:
+            times = train_batch_iterator.pop_times()
+            times["compute"] = compute_time
+            times = {key: 1000 * value / print_loss_iters for key, value in times.items()}
+            print(
+                f"train_time_ms(iteration={iteration}):"
+                f" data_wait={times['data_wait']:.2f}"
+                f" transfer={times['transfer']:.2f}"
+                f" device_copy={times['device_copy']:.2f}"
+                f" compute={times['compute']:.2f}"
+            )
             loss_history.append({
                 "iteration": iteration,
                 "mean_loss_value": mean_loss_value,
                 "std_loss_value": std_loss_value,
                 "max_loss_value": max_loss_value,
                 "min_loss_value": min_loss_value,
+                **{f"{key}_ms": value for key, value in times.items()},
             })
+            compute_time = 0.0
             with open(training_dirpath / "loss_history.json", "w") as f:
                 json.dump(loss_history, f, indent=4)
 
-        if iteration % save_checkpoint_iters == 0:
-            policy_value_net_savepath = training_dirpath / f"policy_value_net_{iteration}.pt"
-            torch.save(policy_value_net.state_dict(), policy_value_net_savepath)
-            print(f"policy_value_net saved to {policy_value_net_savepath} successfully!")
-
         if iteration in lr_schedule:
             set_learning_rate(optimizer, lr_value=lr_schedule[iteration])
 
         if iteration in bnm_schedule:
             set_batch_norm_momentum(policy_value_net, bnm_value=bnm_schedule[iteration])
 
+        if iteration % save_checkpoint_iters == 0:
+            policy_value_net_state_dict = clone_to_cpu(policy_value_net.state_dict())
+            training_state = {
+                "iteration": iteration,
+                "policy_value_net": policy_value_net_state_dict,
+                "optimizer": clone_to_cpu(optimizer.state_dict()),
+                "scaler": scaler.state_dict(),
+                "loss_history": list(loss_history),
+                "random_state": get_random_state(),
+                "sampling_state": train_batch_iterator.sampling_state,
+            }
+            checkpoint_saver.save([
+                (policy_value_net_state_dict, training_dirpath / f"policy_value_net_{iteration}.pt"),
+                (training_state, training_dirpath / "training_state.pt"),
+            ])
+
+    # stops prefetch workers:
+    ndarray_batch_iterator.close()
+    checkpoint_saver.wait()
+
+
+def make_ndarray_batch_iterator(
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
+    batch_size: int,
+    num_batch_workers: int,
+    prefetch_size: int,
+    sampling_state: Optional[dict] = None,
+) -> Iterator[dict]:
+    """ndarray batches, each with the sampling state after it in batch["sampling_state"].
+
+    The sampling state holds the seed and the states of samplers of all shards (one per batch worker),
+    batches continue from a sampling state exactly as they would after the batch it was taken from.
+    A new sampling state is seeded from the random state.
+    """
+    if num_batch_workers > 0:
+        return prefetch_ndarray_batch_generator(
+            dataset=dataset,
+            batch_size=batch_size,
+            num_workers=num_batch_workers,
+            prefetch_size=prefetch_size,
+            sampling_state=sampling_state,
+        )
+    return sampling_ndarray_batch_generator(dataset=dataset, batch_size=batch_size, sampling_state=sampling_state)
+
+
+def new_sampling_state(num_shards: int) -> dict:
+    return {
+        "seed": random.getrandbits(64),
+        "sampler_states": [None] * num_shards,
+        "next_shard": 0,
+    }
+
+
+def check_sampling_state(sampling_state: dict, num_shards: int) -> None:
+    if len(sampling_state["sampler_states"]) != num_shards:
+        raise ValueError(
+            f"invalid sampling_state with num_shards={len(sampling_state['sampler_states'])},"
+            f" expected num_shards={num_shards} (the number of batch workers must not change)"
+        )
+
+
+def sampling_ndarray_batch_generator(
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
+    batch_size: int,
+    sampling_state: Optional[dict] = None,
+) -> Iterator[dict]:
+    if sampling_state is None:
+        sampling_state = new_sampling_state(num_shards=1)
+    check_sampling_state(sampling_state, num_shards=1)
+    sampler = DatapointSampler(dataset=dataset, seed=sampling_state["seed"], state=sampling_state["sampler_states"][0])
+    for ndarray_batch in ndarray_batch_generator(dataset=dataset, batch_size=batch_size, sampler=sampler):
+        ndarray_batch["sampling_state"] = {
+            "seed": sampling_state["seed"],
+            "sampler_states": [sampler.get_state()],
+            "next_shard": 0,
+        }
+        yield ndarray_batch
+
 
 def train_batch_generator(
-    dataset: Dict[str, List[dict]], batch_size: int, device: torch.device
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]], batch_size: int, device: torch.device
 ) -> Iterator[dict]:
-    sample_datapoint_iterator = sample_datapoint_generator(dataset=dataset)
+    for ndarray_batch in ndarray_batch_generator(dataset=dataset, batch_size=batch_size):
+        yield batch_to_device(ndarray_batch, device=device)
+
+
+def ndarray_batch_generator(
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
+    batch_size: int,
+    sampler: Optional[DatapointSampler] = None,
+) -> Iterator[dict]:
+    """ndarray batches of datapoints sampled by sampler, seeded from the random state if not given."""
+    if sampler is None:
+        sampler = DatapointSampler(dataset=dataset, seed=random.getrandbits(64))
+    if is_encoded_dataset(dataset):
+        yield from encoded_ndarray_batch_generator(dataset=dataset, batch_size=batch_size, sampler=sampler)
     while True:
-        datapoints = [next(sample_datapoint_iterator) for i in range(batch_size)]
+        datapoints = [sampler.next_datapoint() for i in range(batch_size)]
         datapoints = [preprocessing(datapoint) for datapoint in datapoints]
-        for datapoint in datapoints:
-            random_orientation_inplace(datapoint)
-        yield make_batch(datapoints, device=device)
+        yield stack_datapoints(datapoints)
+
+
+def prefetch_ndarray_batch_generator(
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
+    batch_size: int,
+    num_workers: int,
+    prefetch_size: int,
+    sampling_state: Optional[dict] = None,
+) -> Iterator[dict]:
+    """ndarray batches built by num_workers forked processes ahead of training,
+    with sampling states as in make_ndarray_batch_iterator.
+
+    Each worker samples its own shard of the dataset and fills its own queue
+    of at most prefetch_size batches. Queues are read in turn, so the sequence
+    of batches depends only on the sampling state, not on worker timing.
+    Batches built ahead are not a part of sampling states, so they are built again after resume.
+    """
+    if num_workers < 1:
+        raise ValueError(f"invalid num_workers={num_workers}")
+    if sampling_state is None:
+        sampling_state = new_sampling_state(num_shards=num_workers)
+    check_sampling_state(sampling_state, num_shards=num_workers)
+    seed = sampling_state["seed"]
+    sampler_states = list(sampling_state["sampler_states"])
+    context = multiprocessing.get_context("fork")
+    batch_queues = [context.Queue(maxsize=prefetch_size) for _ in range(num_workers)]
+    processes = []
+    for worker_id, batch_queue in enumerate(batch_queues):
+        process = context.Process(
+            target=train_batch_worker,
+            args=(batch_queue, dataset, batch_size, seed, worker_id, num_workers, sampler_states[worker_id]),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    try:
+        worker_id = sampling_state["next_shard"]
+        while True:
+            batch_queue, process = batch_queues[worker_id], processes[worker_id]
+            while True:
+                try:
+                    ndarray_batch, sampler_states[worker_id] = batch_queue.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    if not process.is_alive():
+                        raise TrainingError(
+                            f"train batch worker_id={worker_id} failed with exitcode={process.exitcode}"
+                        )
+            worker_id = (worker_id + 1) % num_workers
+            ndarray_batch["sampling_state"] = {
+                "seed": seed,
+                "sampler_states": list(sampler_states),
+                "next_shard": worker_id,
+            }
+            yield ndarray_batch
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def train_batch_worker(
+    batch_queue: Queue,
+    dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
+    batch_size: int,
+    seed: int,
+    worker_id: int,
+    num_workers: int,
+    sampler_state: Optional[dict],
+) -> None:
+    sampler = DatapointSampler(
+        dataset=dataset,
+        seed=seed,
+        shard=worker_id,
+        num_shards=num_workers,
+        state=sampler_state,
+    )
+    for ndarray_batch in ndarray_batch_generator(dataset=dataset, batch_size=batch_size, sampler=sampler):
+        batch_queue.put((ndarray_batch, sampler.get_state()))
 
 
-def sample_datapoint_generator(dataset: Dict[str, List[dict]]) -> Iterator[dict]:
-    keys = list(dataset.keys())
-    for key in keys:
-        random.shuffle(dataset[key])
-    idxs = {key: 0 for key in keys}
+def encoded_ndarray_batch_generator(
+    dataset: Dict[str, BinaryDatapoints], batch_size: int, sampler: DatapointSampler
+) -> Iterator[dict]:
+    """Batches gathered from encoded rows of datapoints sampled by sampler."""
+    arrays = next(iter(dataset.values())).arrays
     while True:
-        random.shuffle(keys)
-        for key in keys:
-            yield dataset[key][idxs[key]]
-            idxs[key] += 1
-            if idxs[key] >= len(dataset[key]):
-                random.shuffle(dataset[key])
-                idxs[key] = 0
+        sampled_indexes = [sampler.next_index() for _ in range(batch_size)]
+        rows = np.array([dataset[key].rows[i] for key, i in sampled_indexes])
+        yield gather_encoded_batch(arrays=arrays, rows=rows)
+
+
+def is_encoded_dataset(dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]]) -> bool:
+    return all(
+        isinstance(datapoints, BinaryDatapoints) and "inputs_packed" in datapoints.arrays
+        for datapoints in dataset.values()
+    )
+
+
+# _SYMMETRY_POSITION_MAPS_9x9[symmetry][position] is the position on the 9x9 board that position is mapped to:
+_SYMMETRY_POSITION_MAPS_9x9 = np.argsort(SYMMETRY_GATHER_POSITIONS_9x9, axis=1)
+
+
+def gather_encoded_batch(
+    arrays: Dict[str, np.ndarray], rows: np.ndarray, symmetries: Optional[np.ndarray] = None
+) -> dict:
+    """The same batch as stack_datapoints of preprocessed datapoints in rows,
+    transformed by symmetries if given (see utttpy/game/symmetry.py).
+    """
+    num_rows = len(rows)
+    if symmetries is None:
+        symmetries = np.zeros(num_rows, dtype=np.intp)
+    inputs = np.unpackbits(arrays["inputs_packed"][rows], axis=1, count=4 * 81).view(np.int8)
+    inputs = inputs.reshape(num_rows, 4, 81)
+    inputs[:, 2] = 2 * inputs[:, 2] - 1
+    inputs = np.take_along_axis(inputs, SYMMETRY_GATHER_POSITIONS_9x9[symmetries][:, None, :], axis=2)
+    # actions of all rows are gathered at once, batch_ids[j] is the row of the j-th gathered action:
+    starts = arrays["actions_offsets"][rows]
+    lengths = arrays["actions_offsets"][rows + 1] - starts
+    batch_ids = np.repeat(np.arange(num_rows), lengths)
+    action_ids = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    positions = _SYMMETRY_POSITION_MAPS_9x9[symmetries[batch_ids], arrays["actions_position"][action_ids]]
+    policy_mask = np.zeros(shape=(num_rows, 81), dtype=bool)
+    policy_targets = np.zeros(shape=(num_rows, 81), dtype=np.float32)
+    action_values = np.zeros(shape=(num_rows, 81), dtype=np.float32)
+    policy_mask[batch_ids, positions] = True
+    policy_targets[batch_ids, positions] = arrays["actions_probability"][action_ids]
+    action_values[batch_ids, positions] = arrays["actions_value"][action_ids]
+    return {
+        "inputs": inputs.reshape(num_rows, 4, 9, 9),
+        "targets": {
+            "policy_mask": policy_mask.reshape(num_rows, 9, 9),
+            "policy_targets": policy_targets.reshape(num_rows, 9, 9),
+            "action_values": action_values.reshape(num_rows, 9, 9),
+            "state_value": arrays["values"][rows].astype(np.float32),
+        },
+    }
+
+
+class DatapointSampler:
+    """Samples keys in shuffled rounds over all keys with datapoints of dataset[key].
+
+    Datapoints of each key are sampled in epochs, each in a new random order of indexes,
+    so that read-only datasets can be sampled too. Orders depend only on seed, key and epoch,
+    with num_shards, each shard samples every num_shards-th index of the order,
+    so shards (e.g. batch workers) sample disjoint datapoints in each epoch.
+    Streaming datapoints are sharded and shuffled by their streams.
+    get_state returns the state (positions in orders and streams, random states),
+    which a sampler created with the same arguments continues from.
+    """
+
+    def __init__(
+        self,
+        dataset: Dict[str, Union[Sequence[dict], StreamingDatapoints]],
+        seed: int,
+        shard: int = 0,
+        num_shards: int = 1,
+        state: Optional[dict] = None,
+    ):
+        if not 0 <= shard < num_shards:
+            raise ValueError(f"invalid shard={shard} for num_shards={num_shards}")
+        for key, datapoints in dataset.items():
+            if not isinstance(datapoints, StreamingDatapoints) and len(datapoints) == 0:
+                raise ValueError(f"no datapoints in dataset[{repr(key)}]")
+        self.dataset = dataset
+        self.seed = seed
+        self.shard = shard
+        self.num_shards = num_shards
+        self.rng = random.Random(f"{seed}:{shard}")
+        self.keys = []
+        self.key_index = 0
+        self.epochs = {key: 0 for key, datapoints in dataset.items() if not isinstance(datapoints, StreamingDatapoints)}
+        self.positions = {key: 0 for key in self.epochs}
+        stream_positions = {}
+        if state is not None:
+            version, internal_state, gauss_next = state["rng"]
+            self.rng.setstate((version, tuple(internal_state), gauss_next))
+            self.keys = list(state["keys"])
+            self.key_index = state["key_index"]
+            self.epochs = dict(state["epochs"])
+            self.positions = dict(state["positions"])
+            stream_positions = state["streams"]
+        self.orders = {key: self._get_order(key) for key in self.epochs}
+        self.streams = {
+            key: datapoints.stream(
+                shard=shard,
+                num_shards=num_shards,
+                rng=random.Random(f"{seed}:{shard}:{key}"),
+                position=stream_positions.get(key),
+            )
+            for key, datapoints in dataset.items()
+            if isinstance(datapoints, StreamingDatapoints)
+        }
+
+    def next_index(self) -> Tuple[str, Optional[int]]:
+        """Next key with the index of its datapoint, None for streaming datapoints."""
+        if self.key_index >= len(self.keys):
+            self.keys = list(self.dataset.keys())
+            self.rng.shuffle(self.keys)
+            self.key_index = 0
+        key = self.keys[self.key_index]
+        self.key_index += 1
+        if key in self.streams:
+            return key, None
+        if self.positions[key] >= len(self.orders[key]):
+            self.epochs[key] += 1
+            self.positions[key] = 0
+            self.orders[key] = self._get_order(key)
+        i = int(self.orders[key][self.positions[key]])
+        self.positions[key] += 1
+        return key, i
+
+    def next_datapoint(self) -> dict:
+        key, i = self.next_index()
+        if i is None:
+            return next(self.streams[key])
+        return self.dataset[key][i]
+
+    def get_state(self) -> dict:
+        return {
+            "rng": self.rng.getstate(),
+            "keys": list(self.keys),
+            "key_index": self.key_index,
+            "epochs": dict(self.epochs),
+            "positions": dict(self.positions),
+            "streams": {key: stream.get_position() for key, stream in self.streams.items()},
+        }
+
+    def _get_order(self, key: str) -> np.ndarray:
+        num_datapoints = len(self.dataset[key])
+        rng = np.random.default_rng([self.seed, zlib.crc32(key.encode()), self.epochs[key]])
+        order = rng.permutation(num_datapoints)
+        # shards would be empty with fewer datapoints, so each shard samples all of them:
+        if num_datapoints >= self.num_shards:
+            order = order[self.shard::self.num_shards]
+        return order
 
 
 def preprocessing(datapoint: dict) -> dict:
@@ -152,35 +532,186 @@ def preprocessing(datapoint: dict) -> dict:
     }
 
 
-def random_orientation_inplace(datapoint: dict) -> None:
-    if random.randint(0, 1):
-        datapoint["input"] = np.flip(datapoint["input"], 1)
-        datapoint["target"]["policy_mask"] = np.flip(datapoint["target"]["policy_mask"], 0)
-        datapoint["target"]["policy_targets"] = np.flip(datapoint["target"]["policy_targets"], 0)
-        datapoint["target"]["action_values"] = np.flip(datapoint["target"]["action_values"], 0)
-    if random.randint(0, 1):
-        datapoint["input"] = np.flip(datapoint["input"], 2)
-        datapoint["target"]["policy_mask"] = np.flip(datapoint["target"]["policy_mask"], 1)
-        datapoint["target"]["policy_targets"] = np.flip(datapoint["target"]["policy_targets"], 1)
-        datapoint["target"]["action_values"] = np.flip(datapoint["target"]["action_values"], 1)
-    if random.randint(0, 1):
-        datapoint["input"] = np.rollaxis(datapoint["input"], 2, 1)
-        datapoint["target"]["policy_mask"] = np.rollaxis(datapoint["target"]["policy_mask"], 1, 0)
-        datapoint["target"]["policy_targets"] = np.rollaxis(datapoint["target"]["policy_targets"], 1, 0)
-        datapoint["target"]["action_values"] = np.rollaxis(datapoint["target"]["action_values"], 1, 0)
+def random_orientation_batch(batch: dict) -> dict:
+    """Batch with each datapoint transformed by a random symmetry, on the device of the batch."""
+    symmetries = torch.randint(NUM_SYMMETRIES, size=(batch["inputs"].shape[0],), device=batch["inputs"].device)
+    return orient_batch(batch, symmetries=symmetries)
+
+
+def orient_batch(batch: dict, symmetries: torch.Tensor) -> dict:
+    """Batch with each datapoint transformed by its symmetry with one gather per tensor."""
+    num_datapoints = batch["inputs"].shape[0]
+    positions = _symmetry_gather_positions(symmetries.device)[symmetries]
+    inputs = batch["inputs"].reshape(num_datapoints, -1, 81)
+    inputs = torch.gather(inputs, 2, positions.unsqueeze(1).expand(-1, inputs.shape[1], -1))
+    targets = {"state_value": batch["targets"]["state_value"]}
+    for key in ["policy_mask", "policy_targets", "action_values"]:
+        target = torch.gather(batch["targets"][key].reshape(num_datapoints, 81), 1, positions)
+        targets[key] = target.reshape(num_datapoints, 9, 9)
+    return {
+        "inputs": inputs.reshape(batch["inputs"].shape),
+        "targets": targets,
+    }
+
+
+@lru_cache(maxsize=None)
+def _symmetry_gather_positions(device: torch.device) -> torch.Tensor:
+    return torch.from_numpy(SYMMETRY_GATHER_POSITIONS_9x9).to(device=device, dtype=torch.int64)
 
 
 def make_batch(datapoints: List[dict], device: torch.device) -> dict:
-    inputs = np.stack([datapoint["input"] for datapoint in datapoints])
-    policy_mask = np.stack([datapoint["target"]["policy_mask"] for datapoint in datapoints])
-    policy_targets = np.stack([datapoint["target"]["policy_targets"] for datapoint in datapoints])
-    action_values = np.stack([datapoint["target"]["action_values"] for datapoint in datapoints])
-    state_value = np.array([datapoint["target"]["state_value"] for datapoint in datapoints], dtype=np.float32)
-    inputs = torch.from_numpy(inputs).to(device=device, dtype=torch.float32)
-    policy_mask = torch.from_numpy(policy_mask).to(device=device)
-    policy_targets = torch.from_numpy(policy_targets).to(device=device)
-    action_values = torch.from_numpy(action_values).to(device=device)
-    state_value = torch.from_numpy(state_value).to(device=device)
+    return batch_to_device(stack_datapoints(datapoints), device=device)
+
+
+def stack_datapoints(datapoints: List[dict]) -> dict:
+    return {
+        "inputs": np.stack([datapoint["input"] for datapoint in datapoints]),
+        "targets": {
+            "policy_mask": np.stack([datapoint["target"]["policy_mask"] for datapoint in datapoints]),
+            "policy_targets": np.stack([datapoint["target"]["policy_targets"] for datapoint in datapoints]),
+            "action_values": np.stack([datapoint["target"]["action_values"] for datapoint in datapoints]),
+            "state_value": np.array(
+                [datapoint["target"]["state_value"] for datapoint in datapoints], dtype=np.float32
+            ),
+        },
+    }
+
+
+def batch_to_device(ndarray_batch: dict, device: torch.device) -> dict:
+    targets = ndarray_batch["targets"]
+    return {
+        "inputs": torch.from_numpy(ndarray_batch["inputs"]).to(device=device, dtype=torch.float32),
+        "targets": {
+            "policy_mask": torch.from_numpy(targets["policy_mask"]).to(device=device),
+            "policy_targets": torch.from_numpy(targets["policy_targets"]).to(device=device),
+            "action_values": torch.from_numpy(targets["action_values"]).to(device=device),
+            "state_value": torch.from_numpy(targets["state_value"]).to(device=device),
+        },
+    }
+
+
+class BatchTransfer:
+    """Iterator of batches on the device made from an iterator of ndarray batches.
+
+    With pin_memory, ndarray batches are copied into reusable pinned host buffers
+    and sent with non_blocking copies on a side stream, one batch ahead, so that
+    the copy of the next batch overlaps with compute on the current one.
+    Inputs are converted to float32 on the device. Without cuda, buffers are not pinned
+    and copies are synchronous. Times are accumulated for pop_times.
+    sampling_state is the sampling state of the last returned batch (see make_ndarray_batch_iterator).
+    """
+
+    def __init__(
+        self,
+        ndarray_batch_iterator: Iterator[dict],
+        device: torch.device,
+        pin_memory: bool,
+        num_buffers: int = 2,
+    ):
+        self.ndarray_batch_iterator = ndarray_batch_iterator
+        self.device = device
+        self.pin_memory = pin_memory
+        self.num_buffers = num_buffers
+        self.cuda = pin_memory and device.type == "cuda"
+        self.stream = torch.cuda.Stream(device=device) if self.cuda else None
+        self._buffers = [None] * num_buffers
+        self._copy_end_events = [None] * num_buffers
+        self._copy_events = []
+        self._num_transfers = 0
+        self._next_batch = None
+        self.sampling_state = None
+        self._times = {"data_wait": 0.0, "transfer": 0.0, "device_copy": 0.0}
+
+    def __iter__(self) -> BatchTransfer:
+        return self
+
+    def __next__(self) -> dict:
+        if not self.pin_memory:
+            ndarray_batch = self._next_ndarray_batch()
+            start_time = time.perf_counter()
+            batch = batch_to_device(ndarray_batch, device=self.device)
+            self._times["transfer"] += time.perf_counter() - start_time
+            self.sampling_state = ndarray_batch.get("sampling_state")
+            return batch
+        if self._next_batch is None:
+            self._next_batch = self._transfer(self._next_ndarray_batch())
+        batch, copy_end_event, self.sampling_state = self._next_batch
+        self._next_batch = self._transfer(self._next_ndarray_batch())
+        if copy_end_event is not None:
+            # the current stream waits for the copy on the device, not on the host:
+            current_stream = torch.cuda.current_stream(device=self.device)
+            current_stream.wait_event(copy_end_event)
+            for tensor in _batch_tensors(batch):
+                tensor.record_stream(current_stream)
+        return batch
+
+    def pop_times(self) -> Dict[str, float]:
+        """Seconds spent since the last call waiting for ndarray batches, in host transfer work
+        and (with cuda) in device copies.
+        """
+        for copy_start_event, copy_end_event in self._copy_events:
+            copy_end_event.synchronize()
+            self._times["device_copy"] += copy_start_event.elapsed_time(copy_end_event) / 1000
+        self._copy_events = []
+        times = self._times
+        self._times = {key: 0.0 for key in times}
+        return times
+
+    def _next_ndarray_batch(self) -> dict:
+        start_time = time.perf_counter()
+        ndarray_batch = next(self.ndarray_batch_iterator)
+        self._times["data_wait"] += time.perf_counter() - start_time
+        return ndarray_batch
+
+    def _transfer(self, ndarray_batch: dict) -> Tuple[dict, Optional[torch.cuda.Event], Optional[dict]]:
+        start_time = time.perf_counter()
+        b_i = self._num_transfers % self.num_buffers
+        self._num_transfers += 1
+        arrays = _batch_tensors(ndarray_batch)
+        if self._copy_end_events[b_i] is not None:
+            # the buffer is still read by its previous copy:
+            self._copy_end_events[b_i].synchronize()
+        buffers = self._buffers[b_i]
+        if buffers is None or [buffer.shape for buffer in buffers] != [array.shape for array in arrays]:
+            buffers = [
+                torch.empty(array.shape, dtype=torch.from_numpy(array).dtype, pin_memory=self.cuda)
+                for array in arrays
+            ]
+            self._buffers[b_i] = buffers
+        for buffer, array in zip(buffers, arrays):
+            buffer.numpy()[...] = array
+        copy_end_event = None
+        if self.cuda:
+            copy_start_event = torch.cuda.Event(enable_timing=True)
+            copy_end_event = torch.cuda.Event(enable_timing=True)
+            with torch.cuda.stream(self.stream):
+                copy_start_event.record()
+                tensors = [buffer.to(device=self.device, non_blocking=True) for buffer in buffers]
+                tensors[0] = tensors[0].to(dtype=torch.float32)
+                copy_end_event.record()
+            self._copy_end_events[b_i] = copy_end_event
+            self._copy_events.append((copy_start_event, copy_end_event))
+        else:
+            # buffers are reused, so copies are needed even on the same device:
+            tensors = [buffer.to(device=self.device, copy=True) for buffer in buffers]
+            tensors[0] = tensors[0].to(dtype=torch.float32)
+        self._times["transfer"] += time.perf_counter() - start_time
+        return _make_batch_from_tensors(tensors), copy_end_event, ndarray_batch.get("sampling_state")
+
+
+def _batch_tensors(batch: dict) -> list:
+    targets = batch["targets"]
+    return [
+        batch["inputs"],
+        targets["policy_mask"],
+        targets["policy_targets"],
+        targets["action_values"],
+        targets["state_value"],
+    ]
+
+
+def _make_batch_from_tensors(tensors: list) -> dict:
+    inputs, policy_mask, policy_targets, action_values, state_value = tensors
     return {
         "inputs": inputs,
         "targets": {
@@ -192,6 +723,68 @@ def make_batch(datapoints: List[dict], device: torch.device) -> dict:
     }
 
 
+class BackgroundCheckpointSaver:
+    """Saves checkpoints with torch.save in a background thread, one save at a time.
+
+    Each file is written under a temporary name and renamed when complete,
+    so an interrupted save never leaves a truncated checkpoint.
+    Saved objects must not be modified by training, see clone_to_cpu.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._exception = None
+
+    def save(self, checkpoints: List[Tuple[object, pathlib.Path]]) -> None:
+        self.wait()
+        self._thread = threading.Thread(target=self._save, args=(checkpoints,), daemon=False)
+        self._thread.start()
+
+    def wait(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._exception is not None:
+            exception, self._exception = self._exception, None
+            raise TrainingError(f"saving checkpoints failed: {repr(exception)}") from exception
+
+    def _save(self, checkpoints: List[Tuple[object, pathlib.Path]]) -> None:
+        try:
+            for checkpoint, path in checkpoints:
+                tmp_path = path.with_name(f".{path.name}.tmp")
+                torch.save(checkpoint, tmp_path)
+                os.replace(tmp_path, path)
+                print(f"checkpoint saved to {path} successfully!")
+        except Exception as exception:
+            self._exception = exception
+
+
+def clone_to_cpu(obj: object) -> object:
+    """Copy of nested dicts, lists and tuples with tensors cloned to cpu."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to(device="cpu", copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((key, clone_to_cpu(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(clone_to_cpu(value) for value in obj)
+    return obj
+
+
+def get_random_state() -> dict:
+    return {
+        "random": random.getstate(),
+        "torch": torch.get_rng_state(),
+        "torch_cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+    }
+
+
+def set_random_state(random_state: dict) -> None:
+    random.setstate(random_state["random"])
+    torch.set_rng_state(random_state["torch"].cpu())
+    if random_state["torch_cuda"]:
+        torch.cuda.set_rng_state_all([state.cpu() for state in random_state["torch_cuda"]])
+
+
 def set_learning_rate(optimizer: torch.optim.Optimizer, lr_value: float) -> None:
     print(f"set_learning_rate({lr_value})")
     for param_group in optimizer.param_groups:
@@ -203,3 +796,7 @@ def set_batch_norm_momentum(nn_module: torch.nn.Module, bnm_value: float) -> Non
     for name, module in nn_module.named_modules():
         if str(module).startswith("BatchNorm"):
             module.momentum = bnm_value
+
+
+class TrainingError(Exception):
+    pass
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import multiprocessing
+import random
+import warnings
+from multiprocessing.synchronize import Lock
+from typing import List, Optional
+
+import numpy as np
+
+from utttpy.game.action import Action
+from utttpy.game.constants import X_STATE_VALUE
+from utttpy.game.ultimate_tic_tac_toe import UltimateTicTacToe
+from utttpy.selfplay.monte_carlo_tree_search import (
+    ArrayTree,
+    MonteCarloTreeSearch,
+    MonteCarloTreeSearchError,
+    playouts,
+)
+
+
+class TreeParallelMonteCarloTreeSearch(MonteCarloTreeSearch):
+    """Tree parallelization of MonteCarloTreeSearch.
+
+    num_workers forked processes run simulations on one SharedArrayTree.
+    Evaluation, action selection and synchronization happen in the parent
+    process between runs, exactly as in MonteCarloTreeSearch.
+    The tree holds at most capacity nodes, run warns when leaves were left unexpanded.
+    """
+
+    def __init__(
+        self,
+        uttt: UltimateTicTacToe,
+        num_simulations: int,
+        exploration_strength: float,
+        num_workers: int,
+        virtual_loss: int = 1,
+        capacity: int = 1 << 20,
+        num_playouts_per_leaf: int = 1,
+    ):
+        if num_workers < 1:
+            raise ValueError(f"invalid num_workers={num_workers}")
+        if virtual_loss < 1:
+            # a node expanded by one worker must not be selected through with zero visits by another:
+            raise ValueError(f"invalid virtual_loss={virtual_loss}")
+        self._context = multiprocessing.get_context("fork")
+        self._virtual_loss = virtual_loss
+        self._capacity = capacity
+        self.num_workers = num_workers
+        super().__init__(
+            uttt=uttt,
+            num_simulations=num_simulations,
+            exploration_strength=exploration_strength,
+            tree_storage="arrays",
+            num_playouts_per_leaf=num_playouts_per_leaf,
+        )
+
+    def _make_tree(
+        self,
+        uttt: UltimateTicTacToe,
+        transposition_table_cache_size: Optional[int],
+        tree_storage: str,
+    ) -> SharedArrayTree:
+        return SharedArrayTree(
+            uttt=uttt,
+            capacity=self._capacity,
+            lock=self._context.Lock(),
+            virtual_loss=self._virtual_loss,
+        )
+
+    def run(self, progress_bar: bool = False) -> None:
+        num_run_simulations = max(
+            0, -(-(self.num_simulations - self.tree.root_num_visits) // self.num_playouts_per_leaf)
+        )
+        num_unexpanded_leaves = self.tree.num_unexpanded_leaves
+        processes = []
+        for worker_id in range(self.num_workers):
+            num_worker_simulations = num_run_simulations // self.num_workers
+            if worker_id < num_run_simulations % self.num_workers:
+                num_worker_simulations += 1
+            process = self._context.Process(
+                target=tree_parallel_worker,
+                args=(
+                    self.tree,
+                    random.getrandbits(64),
+                    num_worker_simulations,
+                    self.exploration_strength,
+                    self.num_playouts_per_leaf,
+                ),
+            )
+            process.start()
+            processes.append(process)
+        for worker_id, process in enumerate(processes):
+            process.join()
+            if process.exitcode != 0:
+                raise MonteCarloTreeSearchError(
+                    f"worker_id={worker_id} failed with exitcode={process.exitcode}"
+                )
+        num_unexpanded_leaves = self.tree.num_unexpanded_leaves - num_unexpanded_leaves
+        if num_unexpanded_leaves > 0:
+            warnings.warn(
+                f"tree capacity={self.tree.capacity} is full,"
+                f" {num_unexpanded_leaves} leaves were evaluated without expansion"
+            )
+
+    def __str__(self):
+        output = (
+            '{cls}(\n'
+            '  tree: {tree}\n'
+            '  num_workers: {num_workers}\n'
+            '  num_simulations: {num_simulations}\n'
+            '  exploration_strength: {exploration_strength}\n'
+            '  num_playouts_per_leaf: {num_playouts_per_leaf}\n)'
+        )
+        output = output.format(
+            cls=self.__class__.__name__,
+            tree=str(self.tree).replace('\n', '\n  '),
+            num_workers=self.num_workers,
+            num_simulations=self.num_simulations,
+            exploration_strength=self.exploration_strength,
+            num_playouts_per_leaf=self.num_playouts_per_leaf,
+        )
+        return output
+
+
+class SharedArrayTree(ArrayTree):
+    """ArrayTree in shared memory, grown by several forked processes at once.
+
+    Each selection step, expansion and statistics update takes the lock.
+    Selection adds a virtual loss to each node as it enters it, held until backprop,
+    which steers concurrent selections towards other paths from the first step on.
+    The capacity is fixed: once the arrays are full, leaves are evaluated without expansion
+    and counted in num_unexpanded_leaves.
+    """
+
+    def __init__(
+        self,
+        uttt: UltimateTicTacToe,
+        capacity: int,
+        lock: Lock,
+        virtual_loss: int,
+    ):
+        self.lock = lock
+        self.virtual_loss = virtual_loss
+        self._counters = _shared_zeros(size=3, dtype=np.int64)
+        super().__init__(uttt=uttt, capacity=capacity)
+
+    @property
+    def num_nodes(self) -> int:
+        return int(self._counters[0])
+
+    @num_nodes.setter
+    def num_nodes(self, num_nodes: int) -> None:
+        self._counters[0] = num_nodes
+
+    @property
+    def max_depth(self) -> int:
+        return int(self._counters[1])
+
+    @max_depth.setter
+    def max_depth(self, max_depth: int) -> None:
+        self._counters[1] = max_depth
+
+    @property
+    def num_unexpanded_leaves(self) -> int:
+        """Number of leaves not expanded because the arrays were full."""
+        return int(self._counters[2])
+
+    def simulate(self, exploration_strength: float, num_playouts: int = 1) -> None:
+        root_symbol = self.uttt.next_symbol
+        selected_path = self._select_leaf_node(exploration_strength=exploration_strength)
+        with self.lock:
+            self._expand(node=selected_path[-1])
+        stats = playouts(uttt=self.uttt, num_playouts=num_playouts)
+        with self.lock:
+            # selection reads without the lock, so visits must not drop in between:
+            self._backprop(selected_path=selected_path, stats=stats)
+            self._add_virtual_loss(selected_path=selected_path, root_symbol=root_symbol, sign=-1)
+        for _ in range(len(selected_path) - 1):
+            self.uttt.undo()
+
+    def _allocate(self, capacity: int) -> None:
+        super()._allocate(capacity=capacity)
+        for name in self._arrays():
+            array = getattr(self, name)
+            shared_array = _shared_zeros(size=capacity, dtype=array.dtype)
+            shared_array[:] = array
+            setattr(self, name, shared_array)
+
+    def _select_leaf_node(self, exploration_strength: float) -> List[int]:
+        """Selects path from root to a leaf and executes its actions on uttt,
+        adding the virtual loss to each node of the path under the lock of its selection step.
+        """
+        uttt = self.uttt
+        root_symbol = uttt.next_symbol
+        node = 0
+        selected_path = [node]
+        with self.lock:
+            self._add_virtual_loss(selected_path=selected_path, root_symbol=root_symbol, sign=1)
+        while True:
+            with self.lock:
+                if self.num_children[node] == 0:
+                    break
+                node = self._select_child(node=node, exploration_strength=exploration_strength)
+                selected_path.append(node)
+                self._add_virtual_loss(selected_path=selected_path, root_symbol=root_symbol, sign=1, last_only=True)
+            uttt.execute(Action(symbol=uttt.next_symbol, index=int(self.action_index[node])), verify=False)
+        return selected_path
+
+    def _expand(self, node: int) -> None:
+        if self.num_children[node] > 0 or self.uttt.is_terminated():
+            return
+        if self.num_nodes + self.uttt.num_legal() > self.capacity:
+            self._counters[2] += 1
+            return
+        super()._expand(node=node)
+
+    def _add_virtual_loss(
+        self, selected_path: List[int], root_symbol: int, sign: int, last_only: bool = False
+    ) -> None:
+        # the root has no incoming action, nodes at odd depths were entered by root_symbol;
+        # the root gets virtual visits too, so that its log(num_visits) is defined once it has children:
+        virtual_loss = sign * self.virtual_loss
+        if root_symbol == X_STATE_VALUE:
+            root_symbol_losses, other_symbol_losses = self.num_O_wins, self.num_X_wins
+        else:
+            root_symbol_losses, other_symbol_losses = self.num_X_wins, self.num_O_wins
+        if last_only:
+            depth = len(selected_path) - 1
+            node = selected_path[-1]
+            self.num_visits[node] += virtual_loss
+            if depth % 2 == 1:
+                root_symbol_losses[node] += virtual_loss
+            elif depth > 0:
+                other_symbol_losses[node] += virtual_loss
+            return
+        self.num_visits[selected_path] += virtual_loss
+        root_symbol_losses[selected_path[1::2]] += virtual_loss
+        other_symbol_losses[selected_path[2::2]] += virtual_loss
+
+
+def tree_parallel_worker(
+    tree: SharedArrayTree,
+    random_seed: int,
+    num_simulations: int,
+    exploration_strength: float,
+    num_playouts: int,
+) -> None:
+    random.seed(random_seed)
+    for _ in range(num_simulations):
+        tree.simulate(exploration_strength=exploration_strength, num_playouts=num_playouts)
+
+
+def _shared_zeros(size: int, dtype: np.dtype) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    shared_buffer = multiprocessing.RawArray("b", size * dtype.itemsize)
+    return np.frombuffer(shared_buffer, dtype=dtype)